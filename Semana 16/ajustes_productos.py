@@ -0,0 +1,64 @@
+"""
+Ajustes masivos de stock y precio desde un archivo, en una sola transacción.
+
+    python ajustes_productos.py recuento.csv --modo fijar      # id_producto,cantidad   (valores nuevos)
+    python ajustes_productos.py precios.json                   # [{"id_producto": 1, "precio": 0.5}, ...] (deltas)
+    python ajustes_productos.py ajustes.csv --simular          # valida y revierte
+
+Columnas/claves: id_producto y cantidad y/o precio (vacío = sin cambio). Mismos formatos que
+importacion.py (CSV, NDJSON, JSON). El SQL está en modelos/model_producto.py (tabla temporal + UPDATE ... JOIN).
+"""
+import argparse
+import time
+
+import mysql.connector
+
+from conexion.conexion import DB_CONFIG
+from importacion import FORMATOS, LECTORES, abrir_texto, formato_de
+from modelos.model_producto import MODOS, AjustesProducto
+import versiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ajusta stock/precio de muchos productos en una transacción.')
+    parser.add_argument('archivo')
+    parser.add_argument('--formato', choices=FORMATOS, help='por defecto, según la extensión')
+    parser.add_argument('--modo', choices=MODOS, default='sumar', help='sumar deltas o fijar valores nuevos')
+    parser.add_argument('--simular', action='store_true', help='aplica, informa y hace rollback')
+    args = parser.parse_args()
+
+    formato = args.formato or formato_de(args.archivo)
+    if formato is None:
+        parser.error('No se reconoce el formato: usa --formato csv|ndjson|json')
+
+    t0 = time.perf_counter()
+    with open(args.archivo, 'rb') as binario:
+        items = [fila for _, fila in LECTORES[formato](abrir_texto(binario))]
+    try:
+        ajustes = AjustesProducto.validar_ajustes(items)
+    except ValueError as e:
+        raise SystemExit(f'Archivo inválido: {e}')
+    leido = time.perf_counter() - t0
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        filas = AjustesProducto.ajustar_lote(conn, ajustes, args.modo)
+        if args.simular:
+            conn.rollback()
+        else:
+            conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        raise SystemExit(f'Sin cambios: {e}')
+    finally:
+        conn.close()
+    total = time.perf_counter() - t0
+
+    if not args.simular and filas:
+        versiones.tocar('productos')   # listados y autocompletar de la app en esta máquina
+    print(f"{len(ajustes)} ajustes, {len(filas)} productos {'validados (simulación)' if args.simular else 'actualizados'} "
+          f"en {total:.2f} s (lectura {leido:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
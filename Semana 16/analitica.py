@@ -0,0 +1,414 @@
+"""
+Motor de reportes en memoria por columnas (NumPy) sobre facturas y factura_detalle.
+- Cada tabla se guarda como arrays paralelos (una posición = una fila): día, cliente, producto,
+  cantidades e importes. Los días son enteros (días desde 1970-01-01, calculados en MySQL) y las
+  filas se mantienen ordenadas por día: un rango de fechas es un slice (np.searchsorted), sin copiar.
+- Agrupar es np.bincount sobre el id (o sobre el número de periodo) con los importes como pesos:
+  sin bucles en Python ni consultas a MySQL por reporte. Top-N con np.argpartition.
+- Refresco incremental cada ANALITICA_TTL segundos, si la versión de facturas (versiones.py) cambió:
+  sólo filas con id mayor al último cargado (se releen MARGEN ids hacia atrás por transacciones
+  que confirman tarde un id menor).
+- Cada ANALITICA_VERIFICAR segundos se compara el conteo de facturas con MySQL; si alguna se
+  eliminó se recarga todo.
+- Las facturas ANULADAS no se cargan.
+- Columnas compartidas entre workers: el proceso que refresca (el que toma el lock
+  ANALITICA_DIR/refresco.lock; los demás no esperan y siguen con la instantánea que tienen) guarda
+  cada columna como .npy en ANALITICA_DIR/g<generación>/ y publica la generación en actual.json.
+  Los workers las abren con np.load(mmap_mode='r'): las páginas son las del cache del sistema,
+  una sola copia para todos. Se conservan la generación actual y la anterior.
+  Sin fcntl (Windows) o con ANALITICA_COMPARTIDA=0 cada proceso carga las suyas en memoria.
+Memoria: ~40 bytes por línea de detalle y por factura (10M líneas ≈ 400 MB), una vez por máquina;
+el proceso que refresca arma en su memoria las columnas nuevas mientras escribe la generación.
+La primera carga lee todo el historial (o los últimos ANALITICA_DIAS días); los workers que llegan
+mientras tanto la esperan en el lock. gunicorn.conf.py vacía ANALITICA_DIR al arrancar.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:      # Windows: cada proceso con sus columnas
+    fcntl = None
+
+from conexion.conexion import conexion, cerrar_conexion, obtener_pool
+import versiones
+
+TTL = int(os.environ.get('ANALITICA_TTL', 30))
+VERIFICAR = int(os.environ.get('ANALITICA_VERIFICAR', 300))
+DIAS = int(os.environ.get('ANALITICA_DIAS', 0))       # 0 = todo el historial
+DIRECTORIO = os.environ.get('ANALITICA_DIR', os.path.join(tempfile.gettempdir(), 'inventario_analitica'))
+COMPARTIDA = fcntl is not None and os.environ.get('ANALITICA_COMPARTIDA', '1') == '1'
+ESTADO = 'actual.json'
+MARGEN = 1000
+LOTE = 50000
+_EPOCA = date(1970, 1, 1)
+PERIODOS = ('dia', 'semana', 'mes', 'anio')
+
+FACTURAS = {
+    'id_factura': np.int64, 'dia': np.int32, 'id_cliente': np.int32,
+    'subtotal': np.float64, 'iva': np.float64, 'total': np.float64,
+}
+DETALLE = {
+    'id_detalle': np.int64, 'id_factura': np.int64, 'dia': np.int32, 'id_cliente': np.int32,
+    'id_producto': np.int32, 'cantidad': np.int32, 'subtotal': np.float64,
+}
+# TO_DAYS('1970-01-01') = 719528; CAST AS DOUBLE evita convertir Decimal fila por fila en Python
+_SQL_FACTURAS = """
+    SELECT id_factura, TO_DAYS(fecha) - 719528, id_cliente,
+           CAST(subtotal AS DOUBLE), CAST(iva AS DOUBLE), CAST(total AS DOUBLE)
+    FROM facturas
+    WHERE id_factura > %s AND estado <> 'ANULADA' AND fecha >= %s
+    ORDER BY id_factura
+"""
+_SQL_DETALLE = """
+    SELECT d.id_detalle, d.id_factura, TO_DAYS(f.fecha) - 719528, f.id_cliente,
+           d.id_producto, d.cantidad, CAST(d.subtotal AS DOUBLE)
+    FROM factura_detalle d
+    JOIN facturas f ON f.id_factura = d.id_factura
+    WHERE d.id_detalle > %s AND f.estado <> 'ANULADA' AND f.fecha >= %s
+    ORDER BY d.id_detalle
+"""
+
+
+def a_dia(d: date) -> int:
+    return (d - _EPOCA).days
+
+
+def de_dia(n) -> date:
+    return _EPOCA + timedelta(days=int(n))
+
+
+def _vacias(tipos):
+    return {c: np.empty(0, dtype=t) for c, t in tipos.items()}
+
+
+def _leer(sql, tipos, desde_id, desde_fecha):
+    """Lee las filas nuevas por lotes y las convierte en un dict de arrays."""
+    pool = obtener_pool()
+    conn = pool.obtener()   # conexión propia: la carga inicial puede ser larga
+    completo = False
+    cur = None
+    partes = {c: [] for c in tipos}
+    try:
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql, (desde_id, desde_fecha))
+        while True:
+            filas = cur.fetchmany(LOTE)
+            if not filas:
+                break
+            for c, valores in zip(tipos, zip(*filas)):
+                partes[c].append(np.array(valores, dtype=tipos[c]))
+        completo = True
+    finally:
+        if completo and cur is not None:
+            cur.close()
+        pool.devolver(conn, descartar=not completo)
+    return {c: np.concatenate(v) if v else np.empty(0, dtype=tipos[c]) for c, v in partes.items()}
+
+
+def _anexar(actual, nuevas, id_col):
+    """Concatena descartando los ids releídos por el margen (ya presentes)."""
+    if not len(nuevas[id_col]):
+        return actual
+    ids = actual[id_col]
+    if len(ids):
+        cola = ids[ids > nuevas[id_col].min() - 1]
+        nuevos = ~np.isin(nuevas[id_col], cola)
+        nuevas = {c: v[nuevos] for c, v in nuevas.items()}
+    return {c: np.concatenate((actual[c], nuevas[c])) for c in actual}
+
+
+def _por_dia(cols):
+    """Ordena por día (estable) si hace falta: un rango de fechas queda como un slice contiguo."""
+    dia = cols['dia']
+    if len(dia) > 1 and (dia[1:] < dia[:-1]).any():
+        orden = np.argsort(dia, kind='stable')
+        cols = {c: v[orden] for c, v in cols.items()}
+    return cols
+
+
+def _top(valores, n):
+    """Índices de los n mayores valores (> 0), de mayor a menor."""
+    candidatos = np.flatnonzero(valores > 0)
+    if len(candidatos) > n:
+        candidatos = candidatos[np.argpartition(-valores[candidatos], n - 1)[:n]]
+    return candidatos[np.argsort(-valores[candidatos], kind='stable')]
+
+
+class Analitica:
+    def __init__(self, ttl=TTL, verificar=VERIFICAR, dias=DIAS, directorio=DIRECTORIO if COMPARTIDA else None):
+        self.ttl = ttl
+        self.verificar = verificar
+        self.dias = dias
+        self.directorio = directorio    # None: columnas propias de este proceso
+        self._lock = threading.Lock()
+        self._facturas = _vacias(FACTURAS)
+        self._detalle = _vacias(DETALLE)
+        self._refrescado = None         # time.monotonic() de la última revisión en este proceso
+        self._verificado = None         # time.time(): compartido entre procesos vía actual.json
+        self._datos_de = None           # time.time() del último refresco de las columnas
+        self._duracion_carga = None
+        self._version = None
+        self._generacion = None
+        self._turno = (None, None)      # (pid, fd) del lock de refresco
+
+    # --- carga ---
+    def _desde_fecha(self):
+        return date.today() - timedelta(days=self.dias) if self.dias else _EPOCA
+
+    def _ultimo(self, cols, id_col):
+        ids = cols[id_col]
+        return int(ids.max()) if len(ids) else 0
+
+    def recargar(self):
+        t0 = time.perf_counter()
+        self._version = versiones.version('facturas')
+        facturas = _leer(_SQL_FACTURAS, FACTURAS, 0, self._desde_fecha())
+        detalle = _leer(_SQL_DETALLE, DETALLE, 0, self._desde_fecha())
+        self._facturas, self._detalle = _por_dia(facturas), _por_dia(detalle)
+        self._verificado = time.time()
+        self._duracion_carga = time.perf_counter() - t0
+
+    def _incremental(self):
+        desde = self._desde_fecha()
+        self._version = versiones.version('facturas')
+        nuevas_f = _leer(_SQL_FACTURAS, FACTURAS, max(0, self._ultimo(self._facturas, 'id_factura') - MARGEN), desde)
+        nuevas_d = _leer(_SQL_DETALLE, DETALLE, max(0, self._ultimo(self._detalle, 'id_detalle') - MARGEN), desde)
+        # se reemplazan los dicts completos: las consultas en curso siguen con su versión
+        self._facturas = _por_dia(_anexar(self._facturas, nuevas_f, 'id_factura'))
+        self._detalle = _por_dia(_anexar(self._detalle, nuevas_d, 'id_detalle'))
+
+    def _hubo_eliminaciones(self):
+        conn = conexion()
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COUNT(*) FROM facturas WHERE id_factura <= %s AND estado <> 'ANULADA' AND fecha >= %s",
+                        (self._ultimo(self._facturas, 'id_factura'), self._desde_fecha()))
+            return cur.fetchone()[0] != len(self._facturas['id_factura'])
+        finally:
+            cur.close()
+            cerrar_conexion(conn)
+
+    def _refrescar(self):
+        """Una pasada sobre las columnas actuales (o la primera carga). True si cambiaron."""
+        if self._version is None:
+            self.recargar()
+            return True
+        if time.time() - self._verificado >= self.verificar:
+            self._verificado = time.time()
+            if self._hubo_eliminaciones():
+                self.recargar()
+                return True
+        if versiones.version('facturas') != self._version:
+            self._incremental()
+            return True
+        return False
+
+    # --- columnas compartidas (ANALITICA_DIR) ---
+    def _estado(self):
+        try:
+            with open(os.path.join(self.directorio, ESTADO), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _tomar_turno(self, esperar):
+        """Lock exclusivo sobre refresco.lock: un solo proceso consulta MySQL y escribe las columnas."""
+        pid, fd = self._turno
+        if pid != os.getpid():
+            os.makedirs(self.directorio, exist_ok=True)
+            fd = os.open(os.path.join(self.directorio, 'refresco.lock'), os.O_CREAT | os.O_RDWR, 0o600)
+            self._turno = (os.getpid(), fd)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if esperar else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _mapear(self, estado):
+        """Abre (sin copiar) las columnas de la generación publicada, si no son las que ya tiene."""
+        if estado['generacion'] != self._generacion:
+            carpeta = os.path.join(self.directorio, f"g{estado['generacion']}")
+            cargar = lambda tabla, tipos: {c: np.load(os.path.join(carpeta, f'{tabla}.{c}.npy'), mmap_mode='r')
+                                           for c in tipos}
+            self._facturas, self._detalle = cargar('facturas', FACTURAS), cargar('detalle', DETALLE)
+            self._generacion = estado['generacion']
+        self._version = tuple(estado['version'])
+        self._verificado = estado['verificado']
+        self._datos_de = estado['refrescado']
+        self._duracion_carga = estado['carga_s']
+
+    def _publicar(self, estado):
+        """Refresca sobre la generación publicada y, si cambió, escribe la siguiente. Con el lock tomado."""
+        if estado is not None:
+            self._mapear(estado)
+        generacion = self._generacion or 0
+        if self._refrescar():
+            generacion += 1
+            carpeta = os.path.join(self.directorio, f'g{generacion}')
+            os.makedirs(carpeta, exist_ok=True)
+            for tabla, cols in (('facturas', self._facturas), ('detalle', self._detalle)):
+                for c, v in cols.items():
+                    np.save(os.path.join(carpeta, f'{tabla}.{c}.npy'), v)
+        nuevo = {'generacion': generacion, 'version': list(self._version), 'verificado': self._verificado,
+                 'refrescado': time.time(), 'carga_s': self._duracion_carga}
+        temporal = os.path.join(self.directorio, f'{ESTADO}.{os.getpid()}')
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(nuevo, f)
+        os.replace(temporal, os.path.join(self.directorio, ESTADO))
+        # quien tenga mapeada una generación borrada la sigue leyendo: el archivo vive hasta que la suelte
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith('g') and nombre[1:].isdigit() and int(nombre[1:]) < generacion - 1:
+                shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+        return nuevo
+
+    def _asegurar_compartida(self):
+        estado = self._estado()
+        if estado is None or time.time() - estado['refrescado'] >= self.ttl:
+            # sin instantánea se espera a quien la está cargando; con una, se sigue con ella
+            if self._tomar_turno(esperar=estado is None):
+                try:
+                    estado = self._estado()   # otro proceso pudo refrescar mientras tanto
+                    if estado is None or time.time() - estado['refrescado'] >= self.ttl:
+                        estado = self._publicar(estado)
+                finally:
+                    fcntl.flock(self._turno[1], fcntl.LOCK_UN)
+        self._mapear(estado)
+
+    def asegurar(self):
+        """Carga la primera vez; luego refresca si pasó el TTL."""
+        ahora = time.monotonic()
+        if self._refrescado is not None and ahora - self._refrescado < self.ttl:
+            return
+        with self._lock:
+            if self._refrescado is not None and time.monotonic() - self._refrescado < self.ttl:
+                return
+            if self.directorio is None:
+                self._refrescar()
+                self._datos_de = time.time()
+            else:
+                self._asegurar_compartida()
+            self._refrescado = time.monotonic()
+
+    # --- consultas ---
+    def _columnas(self, desde: date, hasta: date):
+        self.asegurar()
+        f, d = self._facturas, self._detalle
+        return self._rango(f, desde, hasta), self._rango(d, desde, hasta)
+
+    @staticmethod
+    def _rango(cols, desde, hasta):
+        """Vistas (sin copia) de las filas entre desde y hasta, inclusive."""
+        i, j = np.searchsorted(cols['dia'], [a_dia(desde), a_dia(hasta) + 1])
+        return {c: v[i:j] for c, v in cols.items()}
+
+    def resumen(self, desde: date, hasta: date):
+        f, d = self._columnas(desde, hasta)
+        n = len(f['total'])
+        total = float(f['total'].sum())
+        return {
+            'facturas': n, 'subtotal': float(f['subtotal'].sum()), 'iva': float(f['iva'].sum()), 'total': total,
+            'ticket_promedio': total / n if n else 0.0,
+            'unidades': int(d['cantidad'].sum()),
+            'clientes': int(np.count_nonzero(np.bincount(f['id_cliente']))) if n else 0,
+        }
+
+    def por_periodo(self, desde: date, hasta: date, periodo='mes'):
+        """Ingresos, facturas y ticket promedio por día/semana (lunes)/mes/año, incluidos los periodos vacíos."""
+        if periodo not in PERIODOS:
+            raise ValueError(f'Periodo inválido: {periodo}')
+        f, _ = self._columnas(desde, hasta)
+        cubo = lambda dias: self._cubos(dias, periodo)
+        inicio, fin = cubo(np.array([a_dia(desde)]))[0], cubo(np.array([a_dia(hasta)]))[0]
+        indice = cubo(f['dia']) - inicio
+        largo = int(fin - inicio) + 1
+        facturas = np.bincount(indice, minlength=largo)
+        total = np.bincount(indice, weights=f['total'], minlength=largo)
+        subtotal = np.bincount(indice, weights=f['subtotal'], minlength=largo)
+        iva = np.bincount(indice, weights=f['iva'], minlength=largo)
+        ticket = np.divide(total, facturas, out=np.zeros(largo), where=facturas > 0)
+        return [{'periodo': self._etiqueta(inicio + i, periodo), 'facturas': int(facturas[i]),
+                 'subtotal': float(subtotal[i]), 'iva': float(iva[i]), 'total': float(total[i]),
+                 'ticket_promedio': float(ticket[i])} for i in range(largo)]
+
+    @staticmethod
+    def _cubos(dias, periodo):
+        dias = dias.astype(np.int64)
+        if periodo == 'dia':
+            return dias
+        if periodo == 'semana':
+            return (dias + 3) // 7          # 1970-01-01 fue jueves: semanas de lunes a domingo
+        meses = dias.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        return meses if periodo == 'mes' else meses // 12
+
+    @staticmethod
+    def _etiqueta(cubo, periodo):
+        cubo = int(cubo)
+        if periodo == 'dia':
+            return de_dia(cubo).isoformat()
+        if periodo == 'semana':
+            return de_dia(cubo * 7 - 3).isoformat()
+        if periodo == 'mes':
+            return f'{1970 + cubo // 12}-{cubo % 12 + 1:02d}'
+        return str(1970 + cubo)
+
+    def top_productos(self, desde: date, hasta: date, n=10, por='ingresos'):
+        _, d = self._columnas(desde, hasta)
+        if not len(d['id_producto']):
+            return []
+        ingresos = np.bincount(d['id_producto'], weights=d['subtotal'])
+        unidades = np.bincount(d['id_producto'], weights=d['cantidad'], minlength=len(ingresos))
+        facturas = np.bincount(d['id_producto'], minlength=len(ingresos))   # un producto aparece una vez por factura
+        orden = _top(ingresos if por == 'ingresos' else unidades, n)
+        return [{'id_producto': int(i), 'ingresos': float(ingresos[i]), 'unidades': int(unidades[i]),
+                 'facturas': int(facturas[i])} for i in orden]
+
+    def top_clientes(self, desde: date, hasta: date, n=10):
+        f, _ = self._columnas(desde, hasta)
+        if not len(f['id_cliente']):
+            return []
+        total = np.bincount(f['id_cliente'], weights=f['total'])
+        facturas = np.bincount(f['id_cliente'], minlength=len(total))
+        return [{'id_cliente': int(i), 'total': float(total[i]), 'facturas': int(facturas[i]),
+                 'ticket_promedio': float(total[i] / facturas[i])} for i in _top(total, n)]
+
+    def estadisticas(self):
+        return {
+            'facturas': len(self._facturas['id_factura']), 'lineas': len(self._detalle['id_detalle']),
+            'bytes': sum(v.nbytes for v in self._facturas.values()) + sum(v.nbytes for v in self._detalle.values()),
+            'carga_s': None if self._duracion_carga is None else round(self._duracion_carga, 2),
+            'edad_s': None if self._datos_de is None else round(time.time() - self._datos_de, 1),
+            'compartida': self.directorio is not None, 'generacion': self._generacion,
+        }
+
+
+def nombres(tabla, ids):
+    """{id: nombre} sólo para los ids mostrados (top-N), en una consulta."""
+    if not ids:
+        return {}
+    columnas = {'productos': ("id_producto", "nombre"),
+                'clientes': ("id_cliente", "CONCAT(nombre, ' ', apellido)")}[tabla]
+    conn = conexion()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT {columnas[0]}, {columnas[1]} FROM {tabla} WHERE {columnas[0]} IN "
+                    f"({', '.join(['%s'] * len(ids))})", list(ids))
+        return dict(cur.fetchall())
+    finally:
+        cur.close()
+        cerrar_conexion(conn)
+
+
+def limpiar():
+    """Borra las columnas compartidas de una ejecución anterior (gunicorn on_starting)."""
+    shutil.rmtree(DIRECTORIO, ignore_errors=True)
+
+
+motor = Analitica()
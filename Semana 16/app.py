@@ -1,20 +1,55 @@
 # app.py (sin SQLAlchemy, usando mysql.connector)
-from datetime import datetime
+import secrets
+import time
+from datetime import date, datetime, timedelta
 
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, abort
 from flask_login import (
     LoginManager, login_user, logout_user, login_required, current_user
 )
 from flask_wtf.csrf import CSRFProtect
 from werkzeug.security import generate_password_hash
 
-from conexion.conexion import conexion, cerrar_conexion
+from conexion.conexion import (conexion, cerrar_conexion, estadisticas_pool, liberar_conexion_peticion,
+                               init_app as init_pool)
+import analitica
+import assets
+import autocompletar as ac
+import cola_facturas
+from busqueda import buscar_productos
+import exportar as exp
+import fragmentos
+import importacion
+import metricas
 from forms import ClienteForm, ProductoForm
-from modelos.model_login import Usuario
+from modelos.model_factura import Factura
+from modelos import model_factura
+from modelos.model_factura import StockInsuficiente
+from modelos.model_idempotencia import ClaveReutilizada, ClavesIdempotencia
+from modelos.model_login import Usuario, cache_usuarios
+from modelos.model_producto import AjustesProducto
+from modelos.model_ventas import Ventas
+from paginacion import paginar
+import seguridad
+from seguridad import HashSaturado
+import versiones
+from versiones import condicional
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-secret-key'   # En producción usa variable de entorno
 
+# --- Pool de conexiones: una conexión por petición, devuelta al pool en el teardown ---
+init_pool(app)
+
+# --- Métricas por endpoint (tiempo total, MySQL, plantillas, tamaño) -> /metrics ---
+metricas.init_app(app)
+
+# --- Estáticos con huella y precomprimidos (static/dist, generado con python assets.py) ---
+assets.init_app(app)
+
+# --- Facturas asíncronas: escritores de la cola en segundo plano (ver cola_facturas.py) ---
+cola_facturas.init_app(app)
+
 # --- CSRF global ---
 csrf = CSRFProtect(app)
 
@@ -26,10 +61,15 @@ login_manager.login_view = 'login'  # adonde redirigir si no hay sesión
 def load_user(id_usuario: str):
     # Flask-Login guarda id_usuario como string
     try:
-        return Usuario.obtener_por_id(int(id_usuario))
+        return Usuario.cargar_por_id(int(id_usuario))
     except Exception:
         return None
 
+def _saturado(plantilla, **contexto):
+    # pool de hashing lleno: se responde de inmediato en vez de encolar más trabajo
+    flash('El servidor está ocupado. Inténtalo de nuevo en unos segundos.', 'warning')
+    return render_template(plantilla, **contexto), 503, {'Retry-After': '2'}
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -37,33 +77,31 @@ def login():
             email = request.form.get('email', '').strip().lower()
             password = request.form.get('password', '')
 
-            print("\n--- DEBUG LOGIN ---")
-            print("email:", repr(email))
-            print("password_len:", len(password))
-
+            # sin cupo de hashing se rechaza antes de pedir una conexión del pool
+            if seguridad.saturado():
+                raise HashSaturado('Demasiadas solicitudes de autenticación en curso.')
             user = Usuario.obtener_por_mail(email)
             if not user:
-                print("user: None (no existe ese email en la DB)")
                 flash('Credenciales inválidas. Inténtalo de nuevo.', 'danger')
                 return render_template('login.html', title='Iniciar Sesión')
+            # la conexión de la petición vuelve al pool: no queda retenida durante el PBKDF2
+            liberar_conexion_peticion()
 
-            print("user.id:", user.id_usuario if hasattr(user, 'id_usuario') else user.id)
-            print("hash_prefix:", user.password_hash.split('$', 1)[0])  # ej: pbkdf2:sha256:600000
-
-            from werkzeug.security import check_password_hash
-            ok = check_password_hash(user.password_hash, password)
-            print("check_password_hash:", ok)
-            print("hash_len:", len(user.password_hash))
-
+            ok = seguridad.verificar(user.password_hash, password)
             if ok:
+                if seguridad.necesita_rehash(user.password_hash):
+                    # el costo configurado cambió: se guarda el hash nuevo ahora que tenemos la clave en claro
+                    Usuario.actualizar_password(user.id_usuario, seguridad.generar_hash(password))
                 login_user(user)
                 flash('Has iniciado sesión correctamente.', 'success')
                 return redirect(request.args.get('next') or url_for('index'))
             else:
                 flash('Credenciales inválidas. Inténtalo de nuevo.', 'danger')
 
+        except HashSaturado:
+            return _saturado('login.html', title='Iniciar Sesión')
         except Exception:
-            import traceback; traceback.print_exc()
+            app.logger.exception('Error al iniciar sesión')
             flash('Error al iniciar sesión (revisa la consola).', 'danger')
 
     return render_template('login.html', title='Iniciar Sesión')
@@ -83,8 +121,6 @@ def registro():
         password  = request.form.get('password','')
         password2 = request.form.get('password2','')
 
-        print(password)
-
         if not nombre or not email or not password:
             flash('Todos los campos son obligatorios.', 'danger')
             return render_template('registro.html', title='Registro', nombre=nombre, email=email)
@@ -93,12 +129,18 @@ def registro():
             flash('Las contraseñas no coinciden.', 'danger')
             return render_template('registro.html', title='Registro', nombre=nombre, email=email)
 
+        if seguridad.saturado():
+            return _saturado('registro.html', title='Registro', nombre=nombre, email=email)
         if Usuario.obtener_por_mail(email):
             flash('El correo ya está registrado.', 'warning')
             return render_template('registro.html', title='Registro', nombre=nombre, email=email)
+        liberar_conexion_peticion()   # crear_usuario hashea antes de pedir otra conexión
 
-        # 👉 crea con PBKDF2:sha256:600000 gracias al modelo
-        user = Usuario.crear_usuario(email=email, password_plano=password, nombre=nombre)
+        # 👉 crea con PBKDF2 (seguridad.METODO) en el pool de procesos
+        try:
+            user = Usuario.crear_usuario(email=email, password_plano=password, nombre=nombre)
+        except HashSaturado:
+            return _saturado('registro.html', title='Registro', nombre=nombre, email=email)
         if user:
             flash('Usuario creado. Ahora inicia sesión.', 'success')
             return redirect(url_for('login'))
@@ -145,6 +187,21 @@ def test_db():
     finally:
         cerrar_conexion(conn)
 
+@app.route("/estadisticas")
+@login_required
+def estadisticas():
+    # estado del pool y de la cache de usuarios de este worker (para dimensionar DB_POOL_SIZE x workers de gunicorn)
+    return jsonify(pool=estadisticas_pool(), cache_usuarios=cache_usuarios.estadisticas(),
+                   autocompletar={'productos': ac.productos.estadisticas(), 'clientes': ac.clientes.estadisticas()},
+                   hash_password=seguridad.estadisticas(), analitica=analitica.motor.estadisticas(),
+                   fragmentos=fragmentos.cache.estadisticas(), reintentos_factura=model_factura.reintentos,
+                   cola_facturas=cola_facturas.cola.estadisticas())
+
+@app.route("/metrics")
+def metrics():
+    # formato Prometheus; suma lo registrado por todos los workers (ver metricas.py)
+    return Response(metricas.exponer(), mimetype='text/plain; version=0.0.4')
+
 
 # ========================================================================================================================
 #  PRODUCTOS (CRUD)
@@ -152,23 +209,22 @@ def test_db():
 # Listar / Buscar
 @app.route('/productos')
 @login_required
+@condicional('productos')
 def listar_productos():
     q = request.args.get('q', '').strip()
-    conn = conexion()
-    cur = conn.cursor(dictionary=True)
-    try:
-        if q:
-            cur.execute(
-                "SELECT id_producto, nombre, cantidad, precio FROM productos WHERE nombre LIKE %s",
-                (f"%{q}%",)
-            )
-        else:
-            cur.execute("SELECT id_producto, nombre, cantidad, precio FROM productos")
-        productos = cur.fetchall()
-        return render_template('products/list.html', title='Productos', productos=productos, q=q)
-    finally:
-        cur.close()
-        cerrar_conexion(conn)
+
+    def calcular():
+        conn = conexion()
+        cur = conn.cursor(dictionary=True)
+        try:
+            pagina = buscar_productos(cur, q, request.args)
+        finally:
+            cur.close()
+            cerrar_conexion(conn)
+        return 'products/_tabla.html', {'productos': pagina.items}, pagina._replace(items=[])
+
+    tabla, pagina = fragmentos.tabla('productos', ('productos',), calcular)
+    return render_template('products/list.html', title='Productos', tabla=tabla, pagina=pagina, q=q)
 
 # Crear
 @app.route('/productos/nuevo', methods=['GET', 'POST'])
@@ -179,11 +235,14 @@ def crear_producto():
         conn = conexion()
         cur = conn.cursor()
         try:
+            nombre, precio = form.nombre.data.strip(), float(form.precio.data)
             cur.execute(
                 "INSERT INTO productos (nombre, cantidad, precio) VALUES (%s, %s, %s)",
-                (form.nombre.data.strip(), form.cantidad.data, float(form.precio.data))
+                (nombre, form.cantidad.data, precio)
             )
             conn.commit()
+            versiones.tocar('productos')
+            ac.productos.guardar({'id_producto': cur.lastrowid, 'nombre': nombre, 'precio': precio})
             flash('Producto agregado correctamente.', 'success')
             return redirect(url_for('listar_productos'))
         except Exception as e:
@@ -220,6 +279,8 @@ def editar_producto(pid):
                     (nombre, cantidad, precio, pid)
                 )
                 conn.commit()
+                versiones.tocar('productos')
+                ac.productos.guardar({'id_producto': pid, 'nombre': nombre, 'precio': precio})
                 flash('Producto actualizado correctamente.', 'success')
                 return redirect(url_for('listar_productos'))
             except Exception as e:
@@ -243,6 +304,8 @@ def eliminar_producto(pid):
         cur.execute("DELETE FROM productos WHERE id_producto = %s", (pid,))
         if cur.rowcount > 0:
             conn.commit()
+            versiones.tocar('productos')
+            ac.productos.quitar(pid)
             flash('Producto eliminado correctamente.', 'success')
         else:
             flash('Producto no encontrado.', 'warning')
@@ -251,31 +314,57 @@ def eliminar_producto(pid):
         cur.close()
         cerrar_conexion(conn)
 
+# Importar catálogo (CSV / NDJSON / JSON), ver importacion.py
+@app.route('/productos/importar', methods=['GET', 'POST'])
+@login_required
+def importar_productos():
+    reporte = None
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        formato = importacion.formato_de(archivo.filename) if archivo and archivo.filename else None
+        if formato is None:
+            flash('Sube un archivo .csv, .ndjson/.jsonl o .json.', 'warning')
+            return redirect(url_for('importar_productos'))
+        conn = conexion()
+        try:
+            reporte = importacion.importar(conn, importacion.abrir_texto(archivo.stream), formato)
+        finally:
+            cerrar_conexion(conn)
+        if reporte.confirmadas:
+            versiones.tocar('productos')   # autocompletar se reconstruye al ver la versión nueva
+    return render_template('products/importar.html', reporte=reporte)
+
 # ========================================================================================================================
 #  CLIENTES (CRUD)
 # ========================================================================================================================
 
+def consulta_clientes(q='', columnas='id_cliente, nombre, apellido, email, telefono, direccion, fecha_registro'):
+    """(select_from, where, params, orden) para paginacion.paginar."""
+    where, params = None, ()
+    if q:
+        where = "(nombre LIKE %s OR apellido LIKE %s OR email LIKE %s)"
+        params = (f"%{q}%", f"%{q}%", f"%{q}%")
+    return f"SELECT {columnas} FROM clientes", where, params, [('id_cliente', 'ASC', 'id_cliente', ())]
+
 # Listar / Buscar
 @app.route('/clientes')
 @login_required
+@condicional('clientes')
 def listar_clientes():
     q = request.args.get('q', '').strip()
-    conn = conexion()
-    cur = conn.cursor(dictionary=True)
-    try:
-        if q:
-            cur.execute(
-                "SELECT id_cliente, nombre, apellido, email, telefono, direccion, fecha_registro "
-                "FROM clientes WHERE nombre LIKE %s OR apellido LIKE %s OR email LIKE %s",
-                (f"%{q}%", f"%{q}%", f"%{q}%")
-            )
-        else:
-            cur.execute("SELECT id_cliente, nombre, apellido, email, telefono, direccion, fecha_registro FROM clientes")
-        clientes = cur.fetchall()
-        return render_template('clientes/list.html', title='Clientes', clientes=clientes, q=q)
-    finally:
-        cur.close()
-        cerrar_conexion(conn)
+
+    def calcular():
+        conn = conexion()
+        cur = conn.cursor(dictionary=True)
+        try:
+            pagina = paginar(cur, *consulta_clientes(q), request.args)
+        finally:
+            cur.close()
+            cerrar_conexion(conn)
+        return 'clientes/_tabla.html', {'clientes': pagina.items}, pagina._replace(items=[])
+
+    tabla, pagina = fragmentos.tabla('clientes', ('clientes',), calcular)
+    return render_template('clientes/list.html', title='Clientes', tabla=tabla, pagina=pagina, q=q)
 
 
 # Crear
@@ -296,6 +385,9 @@ def crear_cliente():
                  form.direccion.data.strip() if form.direccion.data else None)
             )
             conn.commit()
+            versiones.tocar('clientes')
+            ac.clientes.guardar({'id_cliente': cur.lastrowid, 'nombre': form.nombre.data.strip(),
+                                 'apellido': form.apellido.data.strip(), 'email': form.email.data.strip()})
             flash('Cliente agregado correctamente.', 'success')
             return redirect(url_for('listar_clientes'))
         except Exception as e:
@@ -329,8 +421,7 @@ def editar_cliente(cid):
         })
 
         if form.validate_on_submit():
-            conn2 = conexion()
-            cur2 = conn2.cursor()
+            cur2 = conn.cursor()
             try:
                 cur2.execute(
                     "UPDATE clientes SET nombre=%s, apellido=%s, email=%s, telefono=%s, direccion=%s WHERE id_cliente=%s",
@@ -341,15 +432,17 @@ def editar_cliente(cid):
                      form.direccion.data.strip() if form.direccion.data else None,
                      cid)
                 )
-                conn2.commit()
+                conn.commit()
+                versiones.tocar('clientes')
+                ac.clientes.guardar({'id_cliente': cid, 'nombre': form.nombre.data.strip(),
+                                     'apellido': form.apellido.data.strip(), 'email': form.email.data.strip()})
                 flash('Cliente actualizado correctamente.', 'success')
                 return redirect(url_for('listar_clientes'))
             except Exception as e:
-                conn2.rollback()
+                conn.rollback()
                 form.nombre.errors.append('Error al actualizar: ' + str(e))
             finally:
                 cur2.close()
-                cerrar_conexion(conn2)
 
         return render_template('clientes/form.html', title='Editar cliente', form=form, modo='editar', cid=cid)
     finally:
@@ -364,9 +457,13 @@ def eliminar_cliente(cid):
     conn = conexion()
     cur = conn.cursor()
     try:
+        # ON DELETE CASCADE borra sus facturas: antes se restan de los resúmenes de ventas
+        Ventas.quitar_cliente(cur, cid)
         cur.execute("DELETE FROM clientes WHERE id_cliente = %s", (cid,))
         if cur.rowcount > 0:
             conn.commit()
+            versiones.tocar('clientes', 'facturas')   # ON DELETE CASCADE se lleva sus facturas
+            ac.clientes.quitar(cid)
             flash('Cliente eliminado correctamente.', 'success')
         else:
             flash('Cliente no encontrado.', 'warning')
@@ -378,67 +475,76 @@ def eliminar_cliente(cid):
 # Listar facturas
 @app.route('/facturas')
 @login_required
+@condicional('facturas', 'clientes')
 def listar_facturas():
-    conn = conexion()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute("""
-            SELECT f.id_factura, f.fecha, f.subtotal, f.iva, f.total, f.estado,
-                   c.nombre, c.apellido
-            FROM facturas f
-            JOIN clientes c ON f.id_cliente = c.id_cliente
-            ORDER BY f.fecha DESC
-        """)
-        facturas = cur.fetchall()
-        return render_template('facturas/list.html', facturas=facturas)
-    finally:
-        cur.close()
-        cerrar_conexion(conn)
-
+    def calcular():
+        conn = conexion()
+        cur = conn.cursor(dictionary=True)
+        try:
+            # más recientes primero; índice (fecha, id_factura) de la migración 002
+            pagina = paginar(cur, """
+                SELECT f.id_factura, f.fecha, f.subtotal, f.iva, f.total, f.estado,
+                       c.nombre, c.apellido
+                FROM facturas f
+                JOIN clientes c ON f.id_cliente = c.id_cliente
+            """, None, (), [('f.fecha', 'DESC', 'fecha', ()), ('f.id_factura', 'DESC', 'id_factura', ())],
+                request.args)
+        finally:
+            cur.close()
+            cerrar_conexion(conn)
+        return 'facturas/_tabla.html', {'facturas': pagina.items}, pagina._replace(items=[])
+
+    tabla, pagina = fragmentos.tabla('facturas', ('facturas', 'clientes'), calcular)
+    return render_template('facturas/list.html', tabla=tabla, pagina=pagina)
+
+
+def _registrar_factura(conn, clave, id_cliente, lineas):
+    """
+    (id_factura, repetida). Con clave, un envío repetido devuelve la factura original sin tocar stock
+    (ver modelos/model_idempotencia.py); sin clave (formulario viejo en cache) se registra siempre.
+    Commit incluido; reintenta si la transacción queda como víctima de un deadlock.
+    """
+    if not clave:
+        id_factura, repetida = Factura.registrar(conn, id_cliente, lineas), False
+    else:
+        id_factura, repetida = Factura.registrar_una_vez(conn, current_user.id_usuario,
+                                                         ClavesIdempotencia.validar(clave), id_cliente, lineas)
+    if not repetida:
+        versiones.tocar('facturas', 'productos')   # también descuenta stock
+        ClavesIdempotencia.limpiar_si_toca(conn)
+    return id_factura, repetida
 
 # Crear factura
 @app.route('/facturas/nueva', methods=['GET', 'POST'])
 @login_required
 def crear_factura():
-    conn = conexion()
-    cur = conn.cursor(dictionary=True)
-
     if request.method == 'POST':
         id_cliente = request.form['id_cliente']
         productos = request.form.getlist('productos[]')
         cantidades = request.form.getlist('cantidades[]')
+        clave = request.form.get('clave_idempotencia')
 
-        try:
-            # Calcular totales
-            subtotal = 0
-            detalle = []
-            for pid, cant in zip(productos, cantidades):
-                cur.execute("SELECT precio FROM productos WHERE id_producto=%s", (pid,))
-                prod = cur.fetchone()
-                precio = float(prod['precio'])
-                cantidad = int(cant)
-                st = precio * cantidad
-                subtotal += st
-                detalle.append((pid, cantidad, precio, st))
-
-            iva = subtotal * 0.12
-            total = subtotal + iva
-
-            # Insertar factura
-            cur.execute("INSERT INTO facturas (id_cliente, subtotal, iva, total, estado) VALUES (%s,%s,%s,%s,%s)",
-                        (id_cliente, subtotal, iva, total, 'PAGADA'))
-            id_factura = cur.lastrowid
-
-            # Insertar detalle
-            for pid, cantidad, precio, st in detalle:
-                cur.execute("""INSERT INTO factura_detalle 
-                               (id_factura, id_producto, cantidad, precio_unitario, subtotal)
-                               VALUES (%s,%s,%s,%s,%s)""",
-                            (id_factura, pid, cantidad, precio, st))
-                # Actualizar stock
-                cur.execute("UPDATE productos SET cantidad = cantidad - %s WHERE id_producto=%s", (cantidad, pid))
+        if cola_facturas.ACTIVA:
+            # modo asíncrono: se valida, se encola y se responde sin tocar MySQL; un escritor la registra
+            try:
+                lineas = Factura.agrupar_lineas(productos, cantidades)
+                id_cola, _ = cola_facturas.cola.encolar(current_user.id_usuario,
+                                                        clave and ClavesIdempotencia.validar(clave),
+                                                        int(id_cliente), lineas)
+                flash('Factura recibida; se registrará en unos segundos (seguimiento: '
+                      f"{url_for('estado_factura_cola', id_cola=id_cola)}).", 'info')
+                return redirect(url_for('listar_facturas'))
+            except ValueError as e:
+                flash(f'Error al registrar la factura: {str(e)}', 'danger')
+                return render_template('facturas/form.html', clave_idempotencia=secrets.token_urlsafe(24))
 
-            conn.commit()
+        conn = conexion()
+        try:
+            lineas = Factura.agrupar_lineas(productos, cantidades)
+            id_factura, repetida = _registrar_factura(conn, clave, id_cliente, lineas)
+            if repetida:
+                flash(f'La factura #{id_factura} ya estaba registrada (envío repetido).', 'info')
+                return redirect(url_for('detalle_factura', fid=id_factura))
             flash('Factura registrada correctamente ✅', 'success')
             return redirect(url_for('listar_facturas'))
 
@@ -446,35 +552,27 @@ def crear_factura():
             conn.rollback()
             flash(f'Error al registrar la factura: {str(e)}', 'danger')
 
-    # GET: mostrar formulario
-    cur.execute("SELECT * FROM clientes ORDER BY nombre")
-    clientes = cur.fetchall()
-    cur.execute("SELECT * FROM productos ORDER BY nombre")
-    productos = cur.fetchall()
-    cur.close()
-    cerrar_conexion(conn)
-    return render_template('facturas/form.html', clientes=clientes, productos=productos)
+    # GET: el formulario no trae datos; clientes y productos se piden por /api/... al escribir.
+    # Clave nueva por formulario: reenviarlo (doble clic, F5, reintento) no crea otra factura
+    return render_template('facturas/form.html', clave_idempotencia=secrets.token_urlsafe(24))
 
 @app.route('/facturas/<int:fid>/eliminar', methods=['POST'])
 @login_required
 def eliminar_factura(fid):
     conn = conexion()
-    cur = conn.cursor()
     try:
-        # Primero eliminar detalle
-        cur.execute("DELETE FROM factura_detalle WHERE id_factura = %s", (fid,))
-        # Luego eliminar la factura
-        cur.execute("DELETE FROM facturas WHERE id_factura = %s", (fid,))
-        if cur.rowcount > 0:
+        # detalle, cabecera y resúmenes de ventas en una transacción
+        if Factura.eliminar(conn, fid):
             conn.commit()
+            versiones.tocar('facturas')
             flash(f'Factura #{fid} eliminada correctamente ✅', 'success')
         else:
+            conn.rollback()
             flash('Factura no encontrada ⚠️', 'warning')
     except Exception as e:
         conn.rollback()
         flash(f'Error al eliminar factura: {str(e)}', 'danger')
     finally:
-        cur.close()
         cerrar_conexion(conn)
 
     return redirect(url_for('listar_facturas'))
@@ -483,6 +581,7 @@ def eliminar_factura(fid):
 # Ver detalle de factura
 @app.route('/facturas/<int:fid>')
 @login_required
+@condicional('facturas', 'clientes', 'productos')
 def detalle_factura(fid):
     conn = conexion()
     cur = conn.cursor(dictionary=True)
@@ -508,6 +607,222 @@ def detalle_factura(fid):
         cur.close()
         cerrar_conexion(conn)
 
+# ========================================================================================================================
+#  REPORTES (motor en memoria por columnas, ver analitica.py)
+# ========================================================================================================================
+def _fecha_param(nombre, defecto):
+    try:
+        return date.fromisoformat(request.args.get(nombre, ''))
+    except ValueError:
+        return defecto
+
+@app.route('/reportes')
+@login_required
+def reportes():
+    hasta = _fecha_param('hasta', date.today())
+    desde = _fecha_param('desde', hasta - timedelta(days=364))
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    periodo = request.args.get('periodo', 'mes')
+    if periodo not in analitica.PERIODOS:
+        periodo = 'mes'
+
+    motor = analitica.motor
+    motor.asegurar()   # fuera de la medición: la primera carga o el refresco no son parte del cálculo
+    t0 = time.perf_counter()
+    resumen = motor.resumen(desde, hasta)
+    periodos = motor.por_periodo(desde, hasta, periodo)
+    productos = motor.top_productos(desde, hasta, 10)
+    clientes = motor.top_clientes(desde, hasta, 10)
+    calculo_ms = 1000 * (time.perf_counter() - t0)
+
+    nombres_p = analitica.nombres('productos', [p['id_producto'] for p in productos])
+    nombres_c = analitica.nombres('clientes', [c['id_cliente'] for c in clientes])
+    for p in productos:
+        p['nombre'] = nombres_p.get(p['id_producto'], f"#{p['id_producto']}")
+    for c in clientes:
+        c['nombre'] = nombres_c.get(c['id_cliente'], f"#{c['id_cliente']}")
+
+    return render_template('reportes/index.html', desde=desde, hasta=hasta, periodo=periodo,
+                           periodos_validos=analitica.PERIODOS, resumen=resumen, periodos=periodos,
+                           productos=productos, clientes=clientes, calculo_ms=calculo_ms,
+                           motor=motor.estadisticas())
+
+# Tablero diario: lee los resúmenes por día (modelos/model_ventas.py), O(días) filas en vez de factura_detalle
+@app.route('/reportes/diario')
+@login_required
+def reportes_diario():
+    hasta = _fecha_param('hasta', date.today())
+    desde = _fecha_param('desde', hasta - timedelta(days=29))
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    conn = conexion()
+    cur = conn.cursor(dictionary=True)
+    try:
+        t0 = time.perf_counter()
+        dias = Ventas.por_dia(cur, desde, hasta)
+        productos = Ventas.top_productos(cur, desde, hasta, 10)
+        clientes = Ventas.top_clientes(cur, desde, hasta, 10)
+        consulta_ms = 1000 * (time.perf_counter() - t0)
+    finally:
+        cur.close()
+        cerrar_conexion(conn)
+    totales = {campo: sum(d[campo] for d in dias) for campo in ('facturas', 'unidades', 'subtotal', 'iva', 'total')}
+    return render_template('reportes/diario.html', desde=desde, hasta=hasta, dias=dias, totales=totales,
+                           productos=productos, clientes=clientes, consulta_ms=consulta_ms)
+
+# ========================================================================================================================
+#  API: AUTOCOMPLETAR (índices en memoria, sin consulta por tecla)
+# ========================================================================================================================
+# /api/autocomplete/productos?q=lap&k=10
+@app.route('/api/autocomplete/productos')
+@login_required
+def autocompletar_productos():
+    return jsonify(ac.productos.sugerir(request.args.get('q', ''), request.args.get('k', 10, type=int)))
+
+@app.route('/api/autocomplete/clientes')
+@login_required
+def autocompletar_clientes():
+    return jsonify(ac.clientes.sugerir(request.args.get('q', ''), request.args.get('k', 10, type=int)))
+
+# Listados paginados en JSON (para el formulario de factura): ?q=&despues=&por_pagina=
+@app.route('/api/productos')
+@login_required
+def api_productos():
+    conn = conexion()
+    cur = conn.cursor(dictionary=True)
+    try:
+        q = request.args.get('q', '').strip()
+        pagina = buscar_productos(cur, q, request.args, 'id_producto, nombre, precio')
+        items = [{'id_producto': p['id_producto'], 'nombre': p['nombre'], 'precio': p['precio']}
+                 for p in pagina.items]
+        return jsonify(items=items, siguiente=pagina.siguiente)
+    finally:
+        cur.close()
+        cerrar_conexion(conn)
+
+# Ajustes masivos de stock/precio en una transacción (ver modelos/model_producto.py). Con sesión y
+# cabecera X-CSRFToken; cuerpo: {"modo": "sumar"|"fijar", "ajustes": [{"id_producto": 1, "cantidad": -2, "precio": 0.5}]}
+@app.route('/api/productos/ajustes', methods=['POST'])
+@login_required
+def api_ajustar_productos():
+    datos = request.get_json(silent=True) or {}
+    t0 = time.perf_counter()
+    conn = conexion()
+    try:
+        ajustes = AjustesProducto.validar_ajustes(datos.get('ajustes') or [])
+        filas = AjustesProducto.ajustar_lote(conn, ajustes, datos.get('modo', 'sumar'))
+        conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        return jsonify(error=str(e)), 400
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cerrar_conexion(conn)
+    versiones.tocar('productos')
+    ac.productos.guardar_lote([{'id_producto': id_, 'nombre': nombre, 'precio': precio}
+                               for id_, nombre, _, precio in filas])
+    return jsonify(actualizados=len(filas), segundos=round(time.perf_counter() - t0, 3))
+
+# Crear factura por API. Con sesión y cabecera X-CSRFToken; cabecera Idempotency-Key recomendada
+# (un reintento con la misma clave devuelve la misma factura con 200 e Idempotent-Replayed: true).
+# Cuerpo: {"id_cliente": 1, "lineas": [{"id_producto": 3, "cantidad": 2}, ...]}
+# Con `Prefer: respond-async` (o FACTURAS_ASINCRONAS=1) se encola: 202 y Location de seguimiento.
+@app.route('/api/facturas', methods=['POST'])
+@login_required
+def api_crear_factura():
+    datos = request.get_json(silent=True) or {}
+    clave = request.headers.get('Idempotency-Key')
+    try:
+        lineas = datos.get('lineas') or []
+        lineas = Factura.agrupar_lineas([l.get('id_producto') for l in lineas], [l.get('cantidad') for l in lineas])
+        id_cliente = int(datos.get('id_cliente'))
+        clave = clave and ClavesIdempotencia.validar(clave)
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify(error=str(e) or 'Datos inválidos'), 400
+    if cola_facturas.ACTIVA or 'respond-async' in request.headers.get('Prefer', ''):
+        try:
+            id_cola, _ = cola_facturas.cola.encolar(current_user.id_usuario, clave, id_cliente, lineas)
+        except ClaveReutilizada as e:
+            return jsonify(error=str(e)), 422
+        # con una clave repetida, el estado actual de la primera (puede estar ya REGISTRADA)
+        estado = cola_facturas.cola.consultar(id_cola, current_user.id_usuario)
+        url = url_for('estado_factura_cola', id_cola=id_cola)
+        return jsonify(url=url, **estado), 202, {'Location': url, 'Retry-After': '1'}
+    conn = conexion()
+    try:
+        id_factura, repetida = _registrar_factura(conn, clave, id_cliente, lineas)
+    except ClaveReutilizada as e:
+        conn.rollback()
+        return jsonify(error=str(e)), 422
+    except StockInsuficiente as e:
+        conn.rollback()
+        return jsonify(error=str(e), faltantes=[{'id_producto': pid, 'disponible': disponible, 'pedido': pedido}
+                                                for pid, _, disponible, pedido in e.faltantes]), 409
+    except (AttributeError, TypeError, ValueError) as e:
+        conn.rollback()
+        return jsonify(error=str(e) or 'Datos inválidos'), 400
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cerrar_conexion(conn)
+    headers = {'Location': url_for('detalle_factura', fid=id_factura)}
+    if repetida:
+        headers['Idempotent-Replayed'] = 'true'
+    return jsonify(id_factura=id_factura, repetida=repetida), 200 if repetida else 201, headers
+
+# Seguimiento de una factura encolada: PENDIENTE / PROCESANDO / REGISTRADA (con id_factura) / ERROR
+@app.route('/api/facturas/cola/<id_cola>')
+@login_required
+def estado_factura_cola(id_cola):
+    estado = cola_facturas.cola.consultar(id_cola, current_user.id_usuario)
+    if estado is None:
+        return jsonify(error='No encontrada'), 404
+    headers = {}
+    if estado['estado'] == 'REGISTRADA':
+        estado['url'] = url_for('detalle_factura', fid=estado['id_factura'])
+    elif estado['estado'] != 'ERROR':
+        headers['Retry-After'] = '1'
+    return jsonify(estado), 200, headers
+
+@app.route('/api/clientes')
+@login_required
+def api_clientes():
+    conn = conexion()
+    cur = conn.cursor(dictionary=True)
+    try:
+        q = request.args.get('q', '').strip()
+        pagina = paginar(cur, *consulta_clientes(q, 'id_cliente, nombre, apellido, email'), request.args)
+        return jsonify(items=pagina.items, siguiente=pagina.siguiente)
+    finally:
+        cur.close()
+        cerrar_conexion(conn)
+
+# ========================================================================================================================
+#  EXPORTACIÓN (CSV / NDJSON en streaming)
+# ========================================================================================================================
+# /export/productos.csv, /export/clientes.ndjson, /export/facturas.csv?desde=2025-01-01&hasta=2025-01-31&gzip=1
+@app.route('/export/<tabla>.<formato>')
+@login_required
+def exportar(tabla, formato):
+    if tabla not in exp.CONSULTAS or formato not in exp.FORMATOS:
+        abort(404)
+    try:
+        desde, hasta = exp.rango_fechas(request.args)
+    except ValueError:
+        abort(400, 'Fechas inválidas: use AAAA-MM-DD.')
+    comprimir = request.args.get('gzip') == '1'
+
+    nombre = f"{tabla}.{formato}" + ('.gz' if comprimir else '')
+    return Response(
+        exp.exportar(tabla, formato, desde, hasta, comprimir),
+        mimetype='application/gzip' if comprimir else exp.FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename={nombre}'},
+    )
+
 # ========================
 #  MAIN
 # ========================
@@ -0,0 +1,147 @@
+"""
+Archivos estáticos con huella en el nombre, precomprimidos y con cache de larga duración.
+
+    python assets.py            # genera static/dist/ (correr en cada despliegue, antes de arrancar gunicorn)
+
+- Cada archivo de static/ se copia a static/dist/<nombre>.<hash>.<ext>; si el contenido cambia,
+  cambia el nombre, así que el navegador puede guardarlo para siempre (Cache-Control: immutable)
+  y en visitas repetidas no pide nada.
+- Los de texto (css, js, svg, ...) se guardan además en .gz y .br (`brotli`, en requirements.txt;
+  si faltara sólo se genera .gz y el build lo avisa); sólo cuando comprimen.
+- static/dist/manifest.json: {"styles.css": "styles.<hash>.css", ...}.
+init_app(app) hace que url_for('static', filename='styles.css') apunte a dist/ y sirve la variante
+comprimida que acepte el navegador. Sin manifest (desarrollo) todo sigue como antes; una entrada
+cuyo original cambió después del build se ignora (se sirve el original).
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import request, send_from_directory
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRIMIBLES = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.ico'}
+UN_ANIO = 365 * 24 * 3600
+
+
+def _destino(relativo, ruta):
+    """styles.css -> styles.<12 hex del sha256>.css"""
+    with open(ruta, 'rb') as f:
+        huella = hashlib.sha256(f.read()).hexdigest()[:12]
+    base, ext = os.path.splitext(relativo)
+    return f'{base}.{huella}{ext}'
+
+
+def _originales(carpeta):
+    for raiz, dirs, archivos in os.walk(carpeta):
+        dirs[:] = [d for d in dirs if os.path.join(raiz, d) != os.path.join(carpeta, DIST)]
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            yield os.path.relpath(ruta, carpeta).replace(os.sep, '/'), ruta
+
+
+def construir(carpeta, informar=print):
+    """Regenera carpeta/dist completo y devuelve el manifest."""
+    dist = os.path.join(carpeta, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    os.makedirs(dist)
+    manifest = {}
+    for relativo, ruta in sorted(_originales(carpeta)):
+        ext = os.path.splitext(relativo)[1]
+        destino = _destino(relativo, ruta)
+        salida = os.path.join(dist, destino)
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+        shutil.copyfile(ruta, salida)
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+        tamanos = [f'{len(datos)} B']
+        if ext.lower() in COMPRIMIBLES:
+            variantes = [('.gz', gzip.compress(datos, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variantes.append(('.br', brotli.compress(datos, quality=11)))
+            for sufijo, comprimido in variantes:
+                if len(comprimido) < len(datos):
+                    with open(salida + sufijo, 'wb') as f:
+                        f.write(comprimido)
+                    tamanos.append(f'{sufijo[1:]} {len(comprimido)} B')
+        manifest[relativo] = destino
+        informar(f'{relativo} -> {DIST}/{destino} ({", ".join(tamanos)})')
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def _cargar(carpeta, logger):
+    try:
+        with open(os.path.join(carpeta, DIST, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    vigentes = {}
+    for original, destino in manifest.items():
+        ruta = os.path.join(carpeta, original)
+        if os.path.exists(ruta) and _destino(original, ruta) == destino:
+            vigentes[original] = destino
+        else:
+            logger.warning('assets: %s cambió después del build; se sirve sin huella (correr python assets.py)',
+                           original)
+    return vigentes
+
+
+def init_app(app):
+    carpeta = app.static_folder
+    manifest = _cargar(carpeta, app.logger)
+    if not manifest:
+        return
+    con_huella = {f'{DIST}/{d}' for d in manifest.values()}
+    servir_original = app.view_functions['static']
+
+    @app.url_defaults
+    def _con_huella(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = f"{DIST}/{manifest[values['filename']]}"
+
+    def servir(filename):
+        if filename not in con_huella:
+            return servir_original(filename=filename)
+        aceptadas = request.accept_encodings
+        ruta = os.path.join(carpeta, filename)
+        codificacion = None
+        for sufijo, nombre in (('.br', 'br'), ('.gz', 'gzip')):
+            if aceptadas[nombre] and os.path.exists(ruta + sufijo):
+                codificacion = nombre
+                break
+        archivo = filename + ('.br' if codificacion == 'br' else '.gz' if codificacion else '')
+        # el tipo es el del original (styles.css), no el del .gz
+        tipo = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        resp = send_from_directory(carpeta, archivo, max_age=UN_ANIO, mimetype=tipo)
+        if codificacion:
+            resp.headers['Content-Encoding'] = codificacion
+        resp.vary.add('Accept-Encoding')
+        resp.headers['Cache-Control'] = f'public, max-age={UN_ANIO}, immutable'
+        return resp
+
+    app.view_functions['static'] = servir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera static/dist con huellas y versiones comprimidas.')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+    if brotli is None:
+        print('brotli no está instalado: sólo se genera .gz (pip install -r requirements.txt)')
+    construir(args.static)
+
+
+if __name__ == '__main__':
+    main()
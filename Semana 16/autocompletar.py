@@ -0,0 +1,133 @@
+"""
+Índices en memoria para autocompletar productos y clientes (type-ahead) sin ir a MySQL por tecla.
+- Se construyen con una sola consulta la primera vez que se usan.
+- Las vistas CRUD de este proceso los actualizan en cada alta/edición/baja.
+- Los cambios hechos por otros workers se recogen al reconstruir (cada AUTOCOMPLETAR_TTL segundos),
+  sólo si la versión de la tabla (versiones.py) cambió desde la última construcción.
+Cada fila se indexa por varias claves (nombre completo, cada palabra, apellido, email) en un
+IndiceOrdenado; una sugerencia es bisect + recorrer k elementos.
+"""
+import os
+import threading
+import time
+
+from busqueda import IndiceOrdenado
+from conexion.conexion import conexion, cerrar_conexion
+import versiones
+
+TTL = int(os.environ.get('AUTOCOMPLETAR_TTL', 60))
+MAX_SUGERENCIAS = 50
+
+
+def _palabras(texto):
+    """'Laptop Dell XPS' -> ['laptop dell xps', 'dell xps', 'xps'] (prefijo de cualquier palabra)."""
+    partes = (texto or '').split()
+    return [' '.join(partes[i:]) for i in range(len(partes))]
+
+
+class IndiceAutocompletar:
+    def __init__(self, tabla, consulta, id_campo, claves, ttl=TTL):
+        self.tabla = tabla
+        self.consulta = consulta      # SELECT que trae todas las filas
+        self.id_campo = id_campo
+        self.claves = claves          # fila -> lista de textos a indexar
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._filas = {}              # dict[int, dict]
+        self._orden = IndiceOrdenado()
+        self._cargado_en = None
+        self._version = None
+
+    def _construir(self):
+        version = versiones.version(self.tabla)   # antes de leer: un cambio concurrente fuerza otra vuelta
+        conn = conexion()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(self.consulta)
+            filas = {f[self.id_campo]: f for f in cur.fetchall()}
+        finally:
+            cur.close()
+            cerrar_conexion(conn)
+        orden = IndiceOrdenado(((id_, n), texto)
+                               for id_, f in filas.items()
+                               for n, texto in enumerate(self.claves(f)))
+        with self._lock:
+            self._filas, self._orden = filas, orden
+            self._cargado_en = time.monotonic()
+            self._version = version
+
+    def _asegurar(self):
+        if self._cargado_en is None:
+            self._construir()
+        elif time.monotonic() - self._cargado_en > self.ttl:
+            if versiones.version(self.tabla) == self._version:
+                self._cargado_en = time.monotonic()
+            else:
+                self._construir()
+
+    def guardar(self, fila):
+        """Alta o edición de una fila (llamar después del commit)."""
+        if self._cargado_en is None:
+            return   # todavía no se construyó: se leerá completo de la BD
+        id_ = fila[self.id_campo]
+        with self._lock:
+            self._quitar(id_)
+            self._filas[id_] = fila
+            for n, texto in enumerate(self.claves(fila)):
+                self._orden.agregar((id_, n), texto)
+
+    def guardar_lote(self, filas):
+        """Varias altas/ediciones con un solo lock (ajustes masivos)."""
+        if self._cargado_en is None:
+            return
+        with self._lock:
+            for fila in filas:
+                id_ = fila[self.id_campo]
+                self._quitar(id_)
+                self._filas[id_] = fila
+                for n, texto in enumerate(self.claves(fila)):
+                    self._orden.agregar((id_, n), texto)
+
+    def quitar(self, id_):
+        with self._lock:
+            self._quitar(id_)
+
+    def _quitar(self, id_):
+        fila = self._filas.pop(id_, None)
+        if fila is not None:
+            for n in range(len(self.claves(fila))):
+                self._orden.quitar((id_, n))
+
+    def sugerir(self, q, k=10):
+        """Hasta k filas cuyo alguna clave empieza con q, en orden alfabético de la clave."""
+        self._asegurar()
+        k = max(1, min(k, MAX_SUGERENCIAS))
+        q = ' '.join(q.lower().split())
+        with self._lock:
+            vistos, resultado = set(), []
+            for id_, _ in self._orden.prefijo(q, k * 4):
+                if id_ not in vistos:
+                    vistos.add(id_)
+                    resultado.append(self._filas[id_])
+                    if len(resultado) >= k:
+                        break
+            return resultado
+
+    def estadisticas(self):
+        return {'filas': len(self._filas), 'claves': len(self._orden),
+                'edad_s': None if self._cargado_en is None else round(time.monotonic() - self._cargado_en, 1)}
+
+
+productos = IndiceAutocompletar(
+    'productos',
+    "SELECT id_producto, nombre, precio FROM productos",
+    'id_producto',
+    lambda f: _palabras(f['nombre']),
+)
+
+clientes = IndiceAutocompletar(
+    'clientes',
+    "SELECT id_cliente, nombre, apellido, email FROM clientes",
+    'id_cliente',
+    lambda f: _palabras(f"{f['nombre']} {f['apellido']}") + [f['email']],
+)
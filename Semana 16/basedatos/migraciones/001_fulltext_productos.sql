@@ -0,0 +1,23 @@
+-- Búsqueda de productos por nombre (listar_productos)
+-- LIKE '%q%' no puede usar el índice UNIQUE `nombre`; un índice FULLTEXT con
+-- parser ngram sí permite buscar subcadenas (tokens de ngram_token_size = 2).
+--
+-- Stopwords: con el parser ngram InnoDB descarta todo token que CONTENGA una stopword
+-- de la lista por defecto ('a', 'i', 'de', 'en', 'la', 'to', ...). En nombres en español
+-- eso deja fuera casi todos los bigramas ("camisa" no tendría ninguno). Por eso el índice
+-- se crea con una lista propia y VACÍA (innodb_ft_user_stopword_table, sólo en esta sesión):
+-- InnoDB guarda con el índice qué lista usó y la aplica también a los términos de búsqueda,
+-- así que no se toca la configuración global del servidor.
+-- (busqueda.py además confirma cada resultado con LIKE '%q%').
+-- Si el índice ya existía, volver a crearlo: ALTER TABLE productos DROP INDEX ft_nombre; y esto.
+
+CREATE TABLE IF NOT EXISTS `ft_stopwords_vacia` (
+  `value` VARCHAR(30) NOT NULL DEFAULT ''
+) ENGINE=InnoDB;
+
+SET SESSION innodb_ft_user_stopword_table = CONCAT(DATABASE(), '/ft_stopwords_vacia');
+
+ALTER TABLE `productos`
+  ADD FULLTEXT KEY `ft_nombre` (`nombre`) WITH PARSER ngram;
+
+SET SESSION innodb_ft_user_stopword_table = DEFAULT;
@@ -0,0 +1,5 @@
+-- Paginación por cursor de listar_facturas: ORDER BY fecha DESC, id_factura DESC
+-- (productos usa el índice UNIQUE `nombre` y clientes la PRIMARY KEY)
+
+ALTER TABLE `facturas`
+  ADD KEY `idx_fecha` (`fecha`, `id_factura`);
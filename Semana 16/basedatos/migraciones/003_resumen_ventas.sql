@@ -0,0 +1,29 @@
+-- Resúmenes diarios de ventas (modelos/model_ventas.py)
+-- Se actualizan en la misma transacción que crea o elimina la factura; los reportes
+-- leen una fila por día y producto/cliente en vez de recorrer factura_detalle.
+-- Las facturas ANULADAS no se cuentan.
+-- Después de crear las tablas (o de una carga masiva) llenarlas con:
+--   python reconstruir_resumen.py
+
+CREATE TABLE `ventas_diarias_producto` (
+  `dia` date NOT NULL,
+  `id_producto` int NOT NULL,
+  `unidades` int NOT NULL DEFAULT '0',
+  `ingresos` decimal(14,2) NOT NULL DEFAULT '0.00',
+  `iva` decimal(14,2) NOT NULL DEFAULT '0.00',
+  `facturas` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`dia`, `id_producto`),
+  KEY `idx_producto_dia` (`id_producto`, `dia`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE `ventas_diarias_cliente` (
+  `dia` date NOT NULL,
+  `id_cliente` int NOT NULL,
+  `facturas` int NOT NULL DEFAULT '0',
+  `unidades` int NOT NULL DEFAULT '0',
+  `subtotal` decimal(14,2) NOT NULL DEFAULT '0.00',
+  `iva` decimal(14,2) NOT NULL DEFAULT '0.00',
+  `total` decimal(14,2) NOT NULL DEFAULT '0.00',
+  PRIMARY KEY (`dia`, `id_cliente`),
+  KEY `idx_cliente_dia` (`id_cliente`, `dia`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
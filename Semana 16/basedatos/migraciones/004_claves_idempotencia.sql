@@ -0,0 +1,18 @@
+-- Claves de idempotencia de facturas (modelos/model_idempotencia.py)
+-- Cada envío del formulario de factura (campo oculto) o de POST /api/facturas (cabecera
+-- Idempotency-Key) trae una clave; se inserta en la misma transacción que la factura.
+-- Un doble clic o un reintento con la misma clave encuentra la fila y devuelve el id_factura
+-- original sin volver a descontar stock. `huella` (sha256 del cliente y las líneas) detecta
+-- una clave reutilizada con otros datos.
+-- Vencen a las IDEMPOTENCIA_HORAS (24 por defecto): la app borra las viejas cada tanto
+-- (ClavesIdempotencia.limpiar); `idx_creada` hace que ese DELETE no recorra la tabla.
+
+CREATE TABLE `claves_idempotencia` (
+  `id_usuario` int NOT NULL,
+  `clave` varchar(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+  `huella` char(64) CHARACTER SET ascii COLLATE ascii_bin NOT NULL,
+  `id_factura` int DEFAULT NULL,
+  `creada` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id_usuario`, `clave`),
+  KEY `idx_creada` (`creada`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
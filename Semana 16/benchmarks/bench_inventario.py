@@ -0,0 +1,93 @@
+"""
+Compara el listado de Inventario antes (sorted() en cada lectura) y después (IndiceOrdenado).
+
+    python benchmarks/bench_inventario.py               # 10k, 100k y 1M productos
+    python benchmarks/bench_inventario.py 50000 200000  # tamaños a elección
+
+No usa la base de datos: trabaja sobre registros en memoria como los de Inventario.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from busqueda import IndiceOrdenado                  # noqa: E402
+from catalogo_compartido import ProductoCache        # noqa: E402
+
+PAGINA = 50
+REPETICIONES = 5
+SILABAS = ['ma', 'mo', 'la', 'te', 'cla', 'dor', 'pan', 'ta', 'lla', 'mou', 'se', 'ca', 'ble', 'rin', 'to']
+
+
+def nombre_aleatorio(rnd, i):
+    return ''.join(rnd.choice(SILABAS) for _ in range(rnd.randint(2, 4))).capitalize() + f' {i}'
+
+
+def medir(fn, repeticiones=REPETICIONES):
+    """Mejor tiempo de varias repeticiones, en milisegundos."""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor * 1000
+
+
+def correr(n, rnd):
+    productos = {i: ProductoCache(i, nombre_aleatorio(rnd, i), rnd.randint(0, 500), round(rnd.uniform(1, 999), 2))
+                 for i in range(1, n + 1)}
+
+    t0 = time.perf_counter()
+    orden = IndiceOrdenado((p.id_producto, p.nombre) for p in productos.values())
+    construir = (time.perf_counter() - t0) * 1000
+
+    # --- antes: sorted() sobre todo el dict en cada lectura ---
+    def listar_antes():
+        return sorted(productos.values(), key=lambda x: x.nombre)[:PAGINA]
+
+    def prefijo_antes():
+        return sorted((p for p in productos.values() if p.nombre.lower().startswith('mou')),
+                      key=lambda x: x.nombre)[:PAGINA]
+
+    # --- después: corte / bisect sobre el índice mantenido ---
+    def listar_despues():
+        return [productos[i] for i in orden.ids(0, PAGINA)]
+
+    def prefijo_despues():
+        return [productos[i] for i in orden.prefijo('mou', PAGINA)]
+
+    siguiente = [n + 1]
+
+    def alta_baja():
+        i = siguiente[0]
+        siguiente[0] += 1
+        orden.agregar(i, nombre_aleatorio(rnd, i))
+        orden.quitar(i)
+
+    return {
+        'n': n,
+        'construir_indice_ms': construir,
+        'listar_antes_ms': medir(listar_antes),
+        'listar_despues_ms': medir(listar_despues),
+        'prefijo_antes_ms': medir(prefijo_antes),
+        'prefijo_despues_ms': medir(prefijo_despues),
+        'alta_baja_indice_ms': medir(alta_baja, 100),
+    }
+
+
+def main():
+    tamanos = [int(x) for x in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    rnd = random.Random(42)
+    print(f"{'productos':>10} {'construir':>10} {'listar antes':>13} {'listar desp.':>13} "
+          f"{'prefijo antes':>14} {'prefijo desp.':>14} {'alta+baja':>10}   (ms)")
+    for n in tamanos:
+        r = correr(n, rnd)
+        print(f"{r['n']:>10} {r['construir_indice_ms']:>10.1f} {r['listar_antes_ms']:>13.2f} "
+              f"{r['listar_despues_ms']:>13.3f} {r['prefijo_antes_ms']:>14.2f} {r['prefijo_despues_ms']:>14.3f} "
+              f"{r['alta_baja_indice_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
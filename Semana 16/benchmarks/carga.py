@@ -0,0 +1,344 @@
+"""
+Prueba de carga del flujo de facturación: usuarios virtuales concurrentes que hacen
+login -> buscar productos (listar_productos?q=) -> crear_factura -> detalle_factura.
+
+    python benchmarks/carga.py                                  # siembra y corre 20 usuarios x 60 s
+    python benchmarks/carga.py --usuarios 50 --duracion 120 --productos 50000 --clientes 20000
+    python benchmarks/carga.py --sin-sembrar --comparar benchmarks/resultados/anterior.json
+    python benchmarks/carga.py --url http://127.0.0.1:8000      # contra gunicorn ya levantado
+    python benchmarks/carga.py --escenario checkout --usuarios 200 --calientes 10
+
+Escenario `checkout`: cada usuario sólo crea facturas con 1-3 de los --calientes productos más
+vendidos del escenario, en orden aleatorio en el formulario, para medir contención de locks sobre
+las mismas filas de productos (deadlocks, reintentos, esperas). Sin --url, el pool de conexiones
+del proceso se dimensiona a --usuarios (DB_POOL_SIZE) para que la espera sea en MySQL y no en el pool.
+
+Sin --url la app corre dentro del proceso con el cliente de pruebas de Flask (CSRF apagado) y
+usa la MySQL local de conexion/conexion.py (DB_HOST, DB_NAME, ...). app.py usa SQL de MySQL
+(FULLTEXT, UPDATE ... CASE), así que no hay modo SQLite para este flujo.
+Con --url se habla HTTP real (cookies por usuario y csrf_token leído del formulario).
+
+Reporta por ruta p50/p95/p99, máximo, errores (estado distinto del esperado) y peticiones por
+segundo, y guarda todo en benchmarks/resultados/carga_<fecha>_<commit>.json para comparar entre
+commits (--comparar).
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+EMAIL = 'carga@benchmark.local'
+CLAVE = 'carga-benchmark'
+# ruta -> estado esperado (login y crear_factura redirigen si salen bien; si fallan re-muestran el formulario)
+RUTAS = {'login': 302, 'listar_productos': 200, 'crear_factura': 302, 'detalle_factura': 200}
+_CSRF = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+# --- datos de prueba ---
+def sembrar(productos, clientes, facturas, semilla):
+    """Completa la BD hasta la escala pedida (sólo genera lo que falta) con generar_datos.py."""
+    from conexion.conexion import conexion, cerrar_conexion
+    from werkzeug.security import generate_password_hash
+    import generar_datos
+    import seguridad
+
+    conn = conexion()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT 1 FROM usuarios WHERE email = %s", (EMAIL,))
+        if cur.fetchone() is None:
+            cur.execute("INSERT INTO usuarios (nombre, email, password) VALUES (%s, %s, %s)",
+                        ('Benchmark', EMAIL, generate_password_hash(CLAVE, seguridad.METODO, seguridad.LARGO_SAL)))
+            conn.commit()
+        faltan = {}
+        for tabla, objetivo in (('productos', productos), ('clientes', clientes), ('facturas', facturas)):
+            cur.execute(f"SELECT COUNT(*) FROM {tabla}")
+            faltan[tabla] = max(0, objetivo - cur.fetchone()[0])
+    finally:
+        cur.close()
+        cerrar_conexion(conn)
+    if any(faltan.values()):
+        # stock alto: el benchmark descuenta inventario en cada factura
+        generar_datos.generar(**faltan, stock=(10 ** 6, 10 ** 6), semilla=semilla, informar=lambda _: None)
+
+
+def _ids(cur, tabla, columna, limite=None):
+    cur.execute(f"SELECT {columna} FROM {tabla} ORDER BY {columna} DESC" + (f" LIMIT {int(limite)}" if limite else ""))
+    return [f[0] for f in cur.fetchall()]
+
+
+def _lineas(rnd, ids_productos):
+    return {pid: rnd.randint(1, 3) for pid in rnd.sample(ids_productos, min(len(ids_productos), rnd.randint(1, 5)))}
+
+
+def datos_escenario():
+    """Ids y términos de búsqueda que usan los usuarios virtuales."""
+    from conexion.conexion import conexion, cerrar_conexion
+    conn = conexion()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT nombre FROM productos ORDER BY id_producto DESC LIMIT 2000")
+        terminos = sorted({w.lower() for (n,) in cur.fetchall() for w in n.split() if len(w) >= 3 and not w.isdigit()})
+        return {
+            'productos': _ids(cur, 'productos', 'id_producto', 20000),
+            'clientes': _ids(cur, 'clientes', 'id_cliente', 20000),
+            'facturas': _ids(cur, 'facturas', 'id_factura', 20000),
+            'terminos': terminos or ['a'],
+        }
+    finally:
+        cur.close()
+        cerrar_conexion(conn)
+
+
+# --- clientes HTTP ---
+class ClientePruebas:
+    """Cliente de pruebas de Flask: sin red, la app corre en este proceso."""
+    def __init__(self, app):
+        self.c = app.test_client()
+
+    def get(self, ruta):
+        r = self.c.get(ruta)
+        return r.status_code, r.get_data()
+
+    def csrf(self, formulario):
+        return {}   # CSRF apagado en la app de pruebas
+
+    def post(self, ruta, datos):
+        r = self.c.post(ruta, data=datos)
+        return r.status_code, r.get_data()
+
+
+class ClienteHTTP:
+    """HTTP real contra --url; los redirects no se siguen (se mide sólo la ruta pedida)."""
+    class _SinRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base):
+        self.base = base.rstrip('/')
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                   self._SinRedirect())
+
+    def _pedir(self, req):
+        try:
+            with self.abridor.open(req, timeout=60) as r:
+                return r.status, r.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, ruta):
+        return self._pedir(self.base + ruta)
+
+    def csrf(self, formulario):
+        """Token del formulario (este GET no se mide)."""
+        _, html = self.get(formulario)
+        m = _CSRF.search(html.decode('utf-8', 'replace'))
+        return {'csrf_token': m.group(1)} if m else {}
+
+    def post(self, ruta, datos):
+        cuerpo = urllib.parse.urlencode(datos, doseq=True).encode()
+        return self._pedir(urllib.request.Request(self.base + ruta, data=cuerpo, method='POST'))
+
+
+# --- ejecución ---
+class Resultados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {r: [] for r in RUTAS}
+        self.estados = {r: {} for r in RUTAS}
+        self.excepciones = {r: 0 for r in RUTAS}
+
+    def anotar(self, ruta, ms, estado):
+        with self._lock:
+            self.latencias[ruta].append(ms)
+            self.estados[ruta][estado] = self.estados[ruta].get(estado, 0) + 1
+
+    def fallo(self, ruta):
+        with self._lock:
+            self.excepciones[ruta] += 1
+
+
+def medir(resultados, ruta, fn, contar):
+    t0 = time.perf_counter()
+    try:
+        estado, cuerpo = fn()
+    except Exception:
+        resultados.fallo(ruta)
+        return None
+    if contar():
+        resultados.anotar(ruta, (time.perf_counter() - t0) * 1000, estado)
+    return estado, cuerpo
+
+
+def comprador(n, cliente, datos, resultados, inicio_medicion, fin, semilla, calientes):
+    """Escenario checkout: sólo crear_factura sobre pocos productos compartidos por todos."""
+    rnd = random.Random(semilla * 1000 + n)
+    contar = lambda: time.monotonic() >= inicio_medicion
+    credenciales = {'email': EMAIL, 'password': CLAVE, **cliente.csrf('/login')}
+    r = medir(resultados, 'login', lambda: cliente.post('/login', credenciales), contar)
+    if r is None or r[0] != 302:
+        return
+    while time.monotonic() < fin:
+        lineas = _lineas(rnd, calientes)   # rnd.sample: orden aleatorio, el servidor debe ordenar
+        formulario = {'id_cliente': rnd.choice(datos['clientes']),
+                      'productos[]': list(lineas), 'cantidades[]': list(lineas.values()),
+                      **cliente.csrf('/facturas/nueva')}
+        medir(resultados, 'crear_factura', lambda: cliente.post('/facturas/nueva', formulario), contar)
+
+
+def usuario_virtual(n, cliente, datos, resultados, inicio_medicion, fin, semilla):
+    rnd = random.Random(semilla * 1000 + n)
+    contar = lambda: time.monotonic() >= inicio_medicion
+    credenciales = {'email': EMAIL, 'password': CLAVE, **cliente.csrf('/login')}
+    r = medir(resultados, 'login', lambda: cliente.post('/login', credenciales), contar)
+    if r is None or r[0] != 302:
+        return   # sin sesión el resto del flujo sólo mediría redirects al login
+    while time.monotonic() < fin:
+        termino = rnd.choice(datos['terminos'])
+        medir(resultados, 'listar_productos', lambda: cliente.get(f'/productos?q={urllib.parse.quote(termino)}'), contar)
+
+        lineas = _lineas(rnd, datos['productos'])
+        formulario = {'id_cliente': rnd.choice(datos['clientes']),
+                      'productos[]': list(lineas), 'cantidades[]': list(lineas.values()),
+                      **cliente.csrf('/facturas/nueva')}
+        medir(resultados, 'crear_factura', lambda: cliente.post('/facturas/nueva', formulario), contar)
+
+        if datos['facturas']:
+            fid = rnd.choice(datos['facturas'])
+            medir(resultados, 'detalle_factura', lambda: cliente.get(f'/facturas/{fid}'), contar)
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))], 2)
+
+
+def resumen(resultados, segundos):
+    rutas = {}
+    for ruta in RUTAS:
+        lat = sorted(resultados.latencias[ruta])
+        errores = sum(n for e, n in resultados.estados[ruta].items() if e != RUTAS[ruta]) + resultados.excepciones[ruta]
+        rutas[ruta] = {
+            'n': len(lat), 'errores': errores, 'estados': {str(k): v for k, v in resultados.estados[ruta].items()},
+            'p50_ms': percentil(lat, 50), 'p95_ms': percentil(lat, 95), 'p99_ms': percentil(lat, 99),
+            'max_ms': round(lat[-1], 2) if lat else None,
+            'rps': round(len(lat) / segundos, 2) if segundos else None,
+        }
+    total = sum(r['n'] for r in rutas.values())
+    return {'rutas': rutas, 'total': {'n': total, 'rps': round(total / segundos, 2) if segundos else None}}
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'sin-git'
+
+
+def imprimir(informe, anterior=None):
+    print(f"\n{'ruta':18} {'n':>7} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'rps':>8}")
+    for ruta, r in informe['rutas'].items():
+        linea = (f"{ruta:18} {r['n']:7d} {r['errores']:5d} {r['p50_ms'] or 0:8.1f} {r['p95_ms'] or 0:8.1f} "
+                 f"{r['p99_ms'] or 0:8.1f} {r['max_ms'] or 0:8.1f} {r['rps'] or 0:8.1f}")
+        previo = (anterior or {}).get('rutas', {}).get(ruta) or {}
+        if previo.get('p95_ms') and r['p95_ms']:
+            linea += f"   p95 {100 * (r['p95_ms'] - previo['p95_ms']) / previo['p95_ms']:+.1f}% vs {anterior['commit']}"
+        print(linea)
+    print(f"{'total':18} {informe['total']['n']:7d} {'':5} {'':8} {'':8} {'':8} {'':8} {informe['total']['rps'] or 0:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del flujo de facturación.')
+    parser.add_argument('--escenario', choices=('flujo', 'checkout'), default='flujo')
+    parser.add_argument('--calientes', type=int, default=10, help='productos compartidos en el escenario checkout')
+    parser.add_argument('--usuarios', type=int, default=20, help='usuarios virtuales concurrentes')
+    parser.add_argument('--duracion', type=float, default=60, help='segundos medidos')
+    parser.add_argument('--calentamiento', type=float, default=5, help='segundos iniciales sin medir')
+    parser.add_argument('--productos', type=int, default=5000)
+    parser.add_argument('--clientes', type=int, default=2000)
+    parser.add_argument('--facturas', type=int, default=1000)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--sin-sembrar', action='store_true')
+    parser.add_argument('--url', help='servidor ya levantado (si no, cliente de pruebas de Flask)')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior')
+    parser.add_argument('--salida', help='ruta del JSON de resultados')
+    args = parser.parse_args()
+
+    if not args.url:
+        # antes de importar conexion/conexion.py (lo hace sembrar): un hilo por usuario virtual
+        os.environ.setdefault('DB_POOL_SIZE', str(args.usuarios))
+    if not args.sin_sembrar:
+        print(f'Sembrando: {args.productos} productos, {args.clientes} clientes, {args.facturas} facturas...')
+        sembrar(args.productos, args.clientes, args.facturas, args.semilla)
+    datos = datos_escenario()
+
+    if args.url:
+        nuevo_cliente = lambda: ClienteHTTP(args.url)
+    else:
+        from app import app
+        app.config.update(WTF_CSRF_ENABLED=False, TESTING=True)
+        nuevo_cliente = lambda: ClientePruebas(app)
+
+    resultados = Resultados()
+    inicio_medicion = time.monotonic() + args.calentamiento
+    fin = inicio_medicion + args.duracion
+    if args.escenario == 'checkout':
+        calientes = datos['productos'][:args.calientes]
+        hilos = [threading.Thread(target=comprador, args=(n, nuevo_cliente(), datos, resultados,
+                                                          inicio_medicion, fin, args.semilla, calientes))
+                 for n in range(args.usuarios)]
+    else:
+        hilos = [threading.Thread(target=usuario_virtual, args=(n, nuevo_cliente(), datos, resultados,
+                                                                inicio_medicion, fin, args.semilla))
+                 for n in range(args.usuarios)]
+    print(f'{args.usuarios} usuarios virtuales, {args.calentamiento:.0f} s de calentamiento + {args.duracion:.0f} s medidos...')
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('comparar', 'salida')},
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                    'db_host': os.environ.get('DB_HOST', 'localhost')},
+        **resumen(resultados, args.duracion),
+    }
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+    imprimir(informe, anterior)
+    if not args.url:
+        from modelos import model_factura
+        informe['reintentos_factura'] = dict(model_factura.reintentos)
+        print(f"Reintentos de facturas (deadlock/espera/agotados): {informe['reintentos_factura']}")
+
+    salida = args.salida or os.path.join(
+        RESULTADOS, f"carga_{datetime.now():%Y%m%d_%H%M%S}_{informe['commit']}.json")
+    os.makedirs(os.path.dirname(salida), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f'\nResultados en {salida}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Búsqueda de productos por nombre.
+- MySQL (app.py): primero los que EMPIEZAN con el texto, paginados por cursor sobre el índice
+  UNIQUE `nombre` (un rango: cuesta lo mismo con 10 coincidencias que con 100k). En la última
+  página de esos se agregan los que lo CONTIENEN en otra posición: los BUSQUEDA_CONTIENE_MAX más
+  relevantes según el índice FULLTEXT ngram (ver basedatos/migraciones/001_fulltext_productos.sql),
+  con ORDER BY MATCH ... DESC LIMIT sin más condiciones, que InnoDB resuelve con un top-N en el
+  índice sin leer ni ordenar todas las filas que coinciden.
+- Memoria / SQLite (app_alchemy.py): índice invertido de trigramas y lista ordenada
+  por nombre que Inventario mantiene en cada alta, edición y baja.
+En ambos casos: coincidencia por prefijo o por subcadena, primero los prefijos.
+"""
+import os
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from paginacion import paginar
+
+NGRAM = 2   # ngram_token_size de MySQL (valor por defecto)
+CONTIENE_MAX = int(os.environ.get('BUSQUEDA_CONTIENE_MAX', 100))
+_OPERADORES = re.compile(r'[+\-<>()~*"@]')
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def consulta_productos(q: str = '', columnas='id_producto, nombre, cantidad, precio'):
+    """
+    Devuelve (select_from, where, params, orden) para paginar.paginar: todo el catálogo por nombre o,
+    con texto, los que empiezan con él (rango LIKE 'q%' sobre el índice `nombre`).
+    """
+    q = ' '.join(q.split())
+    por_nombre = [('nombre', 'ASC', 'nombre', ())]
+    if not q:
+        return f"SELECT {columnas} FROM productos", None, (), por_nombre
+    return f"SELECT {columnas} FROM productos", "nombre LIKE %s", (_escapar_like(q) + '%',), por_nombre
+
+
+def consulta_contiene(q: str, columnas='id_producto, nombre, cantidad, precio', limite=None):
+    """
+    (sql, params) de los que contienen q sin empezar con él, por relevancia, o None si q es más corto
+    que un ngram. La subconsulta es el caso que InnoDB optimiza (sólo MATCH, ORDER BY MATCH DESC, LIMIT);
+    afuera, sobre esas filas como mucho, se descartan los prefijos (ya listados) y se confirma con
+    LIKE '%q%' (si el servidor tokeniza distinto, el índice puede devolver filas ajenas).
+    """
+    q = ' '.join(q.split())
+    frase = ' '.join(_OPERADORES.sub(' ', q).split())
+    if len(frase) < NGRAM:
+        return None
+    frase = f'"{frase}"'
+    sql = f"""
+        SELECT {columnas} FROM (
+            SELECT {columnas}, MATCH(nombre) AGAINST (%s IN BOOLEAN MODE) AS relevancia FROM productos
+            WHERE MATCH(nombre) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY MATCH(nombre) AGAINST (%s IN BOOLEAN MODE) DESC
+            LIMIT %s
+        ) AS r
+        WHERE nombre LIKE %s AND nombre NOT LIKE %s
+        ORDER BY relevancia DESC, id_producto
+    """
+    return sql, (frase, frase, frase, limite or CONTIENE_MAX,
+                 '%' + _escapar_like(q) + '%', _escapar_like(q) + '%')
+
+
+def buscar_productos(cur, q, args, columnas='id_producto, nombre, cantidad, precio'):
+    """
+    Página (paginacion.Pagina) de productos para ?q=&despues=&antes=&por_pagina=. `cur` dictionary=True.
+    La última página de los que empiezan con q trae además los que lo contienen (consulta_contiene).
+    """
+    pagina = paginar(cur, *consulta_productos(q, columnas), args)
+    contiene = consulta_contiene(q, columnas) if pagina.siguiente is None else None
+    if contiene is None:
+        return pagina
+    cur.execute(*contiene)
+    return pagina._replace(items=pagina.items + cur.fetchall())
+
+
+def trigramas(texto: str) -> set:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Índice invertido {trigrama: {id}} para buscar subcadenas sin recorrer todo el catálogo.
+    Los candidatos son la intersección de los trigramas de la consulta (empezando por el
+    conjunto más pequeño) y luego se confirman con `q in texto`.
+    """
+    def __init__(self):
+        self._postings = defaultdict(set)   # dict[str, set[int]]
+        self._textos = {}                   # dict[int, str] (en minúsculas)
+
+    def __len__(self):
+        return len(self._textos)
+
+    def agregar(self, id_, texto: str):
+        texto = texto.lower()
+        self._textos[id_] = texto
+        for t in trigramas(texto):
+            self._postings[t].add(id_)
+
+    def quitar(self, id_):
+        texto = self._textos.pop(id_, None)
+        if texto is None:
+            return
+        for t in trigramas(texto):
+            ids = self._postings.get(t)
+            if ids is not None:
+                ids.discard(id_)
+                if not ids:
+                    del self._postings[t]
+
+    def actualizar(self, id_, texto: str):
+        self.quitar(id_)
+        self.agregar(id_, texto)
+
+    def buscar(self, q: str, limite=None):
+        """ids que contienen `q`, ordenados por relevancia (prefijo, posición, texto)."""
+        q = q.lower().strip()
+        if not q:
+            return []
+        if len(q) < 3:
+            candidatos = self._textos.keys()   # consulta muy corta: no hay trigramas que usar
+        else:
+            conjuntos = sorted((self._postings.get(t, set()) for t in trigramas(q)), key=len)
+            candidatos = set.intersection(*conjuntos) if conjuntos[0] else set()
+        encontrados = []
+        for id_ in candidatos:
+            pos = self._textos[id_].find(q)
+            if pos >= 0:
+                encontrados.append((pos, self._textos[id_], id_))
+        encontrados.sort()
+        ids = [id_ for _, _, id_ in encontrados]
+        return ids[:limite] if limite else ids
+
+
+class IndiceOrdenado:
+    """
+    Lista de claves (texto en minúsculas, id) ordenada con bisect, mantenida en cada alta/baja.
+    - listar: recorrer o cortar la lista, sin ordenar en cada lectura
+    - prefijo: bisect hasta el primer candidato y avanzar k elementos -> O(log n + k)
+    Insertar/quitar es O(log n) para ubicar + un corrimiento de memoria de la lista (memmove),
+    mucho más barato que reordenar todo en cada petición.
+    """
+    def __init__(self, pares=()):
+        self._claves = {}   # dict[int, str]
+        self._lista = []    # list[tuple[str, int]] ordenada
+        for id_, texto in pares:
+            self._claves[id_] = texto.lower()
+        self._lista = sorted((t, i) for i, t in self._claves.items())
+
+    def __len__(self):
+        return len(self._lista)
+
+    def agregar(self, id_, texto: str):
+        if id_ in self._claves:
+            self.quitar(id_)
+        clave = texto.lower()
+        self._claves[id_] = clave
+        insort(self._lista, (clave, id_))
+
+    def quitar(self, id_):
+        clave = self._claves.pop(id_, None)
+        if clave is None:
+            return
+        i = bisect_left(self._lista, (clave, id_))
+        if i < len(self._lista) and self._lista[i] == (clave, id_):
+            del self._lista[i]
+
+    actualizar = agregar
+
+    def ids(self, inicio=0, limite=None):
+        fin = None if limite is None else inicio + limite
+        return [id_ for _, id_ in self._lista[inicio:fin]]
+
+    def prefijo(self, texto: str, limite=None):
+        """ids cuyo texto empieza con `texto`, en orden."""
+        texto = texto.lower()
+        i = bisect_left(self._lista, (texto,))
+        ids = []
+        while i < len(self._lista) and self._lista[i][0].startswith(texto):
+            ids.append(self._lista[i][1])
+            if limite and len(ids) >= limite:
+                break
+            i += 1
+        return ids
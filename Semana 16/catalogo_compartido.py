@@ -0,0 +1,372 @@
+"""
+Catálogo de productos en memoria compartida para todos los workers de gunicorn.
+
+Distribución del segmento (multiprocessing.shared_memory):
+    cabecera : magia(4s) | maestro(I) | capacidad(I) | usados(I) | versión(Q) | cambios(Q)
+    registro de cambios: slot(I) x LOG_TAMANO (anillo; la posición es `cambios` % LOG_TAMANO)
+    registros: ocupado(B) | id_producto(I) | cantidad(i) | precio(d) | largo(H) | nombre(480s)   x capacidad
+
+- Registros de ancho fijo: el slot i está en INICIO_REGISTROS + i * REGISTRO.
+- Escrituras serializadas entre procesos con un lock de archivo (fcntl) y entre hilos con un Lock.
+  Cada escritura anota en el anillo los slots que tocó: un worker atrasado lee sólo esos slots
+  (cambios()) y actualiza sus índices de a un producto; si se atrasó más de LOG_TAMANO escrituras
+  de slots, vuelve a leer todo (registros()).
+- Lecturas sin lock (seqlock): la versión es impar mientras se escribe; el lector copia y reintenta
+  si la versión cambió. Si sigue impar más de ESPERA_ESCRITOR segundos, el escritor murió a mitad:
+  se toma el lock de archivo (el kernel lo liberó al morir) y se recarga el segmento desde la BD.
+- Dueño explícito: `maestro` es el pid del master de gunicorn, que gunicorn.conf.py publica en
+  INVENTARIO_MAESTRO al arrancar (sin gunicorn, el propio proceso). Un segmento de otro maestro es de
+  una ejecución anterior y se rehace; sólo el maestro lo borra al salir (on_exit / atexit).
+- Capacidad: INVENTARIO_CAPACIDAD o, por defecto, la cantidad de productos en la BD + HOLGURA.
+"""
+import atexit
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+try:
+    import fcntl
+except ImportError:      # Windows: sólo servidor de desarrollo (un proceso)
+    fcntl = None
+
+NOMBRE = os.environ.get('INVENTARIO_SHM', 'inventario_catalogo')
+CAPACIDAD = int(os.environ.get('INVENTARIO_CAPACIDAD', 0))   # 0 = según la BD
+HOLGURA = 0.25          # altas posibles antes de llenarse, sobre los productos actuales
+CAPACIDAD_MIN = 1000
+LOG_TAMANO = 4096       # slots recordados en el registro de cambios
+ESPERA_ESCRITOR = 1.0   # segundos con la versión impar antes de darlo por muerto
+LARGO_NOMBRE = 480   # varchar(120) en utf8mb4 ocupa hasta 4 bytes por carácter
+
+_MAGIA = b'INV2'
+_CABECERA = struct.Struct('<4sIIIQQ')
+_REGISTRO = struct.Struct(f'<BIidH{LARGO_NOMBRE}s')
+_ENTRADA = struct.Struct('<I')
+_POS_USADOS = 12     # desplazamientos dentro de la cabecera
+_POS_VERSION = 16
+_POS_CAMBIOS = 24
+_INICIO_LOG = _CABECERA.size
+_INICIO_REGISTROS = _INICIO_LOG + LOG_TAMANO * _ENTRADA.size
+
+ProductoCache = namedtuple('ProductoCache', 'id_producto nombre cantidad precio')
+
+_log = logging.getLogger('catalogo_compartido')
+
+
+class CatalogoLleno(RuntimeError):
+    pass
+
+
+def maestro():
+    """pid dueño del segmento: el master de gunicorn (ver gunicorn.conf.py) o este mismo proceso."""
+    return int(os.environ.get('INVENTARIO_MAESTRO') or os.getpid())
+
+
+def capacidad_para(productos):
+    return CAPACIDAD or max(CAPACIDAD_MIN, int(productos * (1 + HOLGURA)) + 1)
+
+
+def _sin_rastreo(shm):
+    # el segmento debe sobrevivir a cada worker: que resource_tracker no lo borre al salir el proceso
+    if os.name == 'posix':
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+
+def _borrar(shm):
+    # unlink() vuelve a quitarlo de resource_tracker (que ya no lo tiene): se registra antes para que no avise
+    if os.name == 'posix':
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+def eliminar_segmento(nombre=NOMBRE, pid=None):
+    """Borra el segmento si pertenece al maestro `pid` (por defecto, este proceso). Para on_exit de gunicorn."""
+    pid = pid or os.getpid()
+    try:
+        shm = shared_memory.SharedMemory(nombre)
+    except FileNotFoundError:
+        return False
+    _sin_rastreo(shm)
+    try:
+        magia, dueno = _CABECERA.unpack_from(shm.buf, 0)[:2]
+        if magia != _MAGIA or dueno != pid:
+            return False
+        _borrar(shm)
+        return True
+    finally:
+        shm.close()
+
+
+class CatalogoCompartido:
+    def __init__(self, nombre=NOMBRE):
+        self.nombre = nombre
+        self.capacidad = 0
+        self._shm = None
+        self._cargar = None
+        self._lock_hilos = threading.Lock()
+        self._ruta_lock = os.path.join(tempfile.gettempdir(), f'{nombre}.lock')
+        # índice local (por proceso) id_producto -> slot para escribir, al día hasta `_pos_indice`
+        self._slots = {}
+        self._ids = {}      # slot -> id_producto
+        self._libres = []
+        self._pos_indice = None
+
+    # --- sincronización ---
+    @contextmanager
+    def _bloqueo(self):
+        with self._lock_hilos:
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self._ruta_lock, os.O_CREAT | os.O_RDWR, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _version_cruda(self):
+        return struct.unpack_from('<Q', self._shm.buf, _POS_VERSION)[0]
+
+    @contextmanager
+    def _escribiendo(self):
+        """Marca la versión como impar durante la escritura (los lectores reintentan)."""
+        v = self._version_cruda()
+        struct.pack_into('<Q', self._shm.buf, _POS_VERSION, v + 1)
+        try:
+            yield
+        finally:
+            struct.pack_into('<Q', self._shm.buf, _POS_VERSION, v + 2)
+
+    def _anotar(self, slot):
+        # dentro de _escribiendo: los lectores no ven la entrada hasta que la versión vuelve a ser par
+        pos = struct.unpack_from('<Q', self._shm.buf, _POS_CAMBIOS)[0]
+        _ENTRADA.pack_into(self._shm.buf, _INICIO_LOG + (pos % LOG_TAMANO) * _ENTRADA.size, slot)
+        struct.pack_into('<Q', self._shm.buf, _POS_CAMBIOS, pos + 1)
+
+    @property
+    def version(self):
+        return self._version_cruda() // 2
+
+    @property
+    def posicion(self):
+        """Escrituras de slots hasta ahora; si no cambió, no hay nada nuevo que leer."""
+        return struct.unpack_from('<Q', self._shm.buf, _POS_CAMBIOS)[0]
+
+    @property
+    def dueno(self):
+        return self._shm is not None and _CABECERA.unpack_from(self._shm.buf, 0)[1] == os.getpid()
+
+    # --- apertura ---
+    def abrir(self, cargar, contar):
+        """
+        Se une al segmento del maestro actual o, si no existe (o es de una ejecución anterior), lo crea
+        con capacidad para contar() productos + HOLGURA y lo llena con cargar(): filas
+        (id_producto, nombre, cantidad, precio). `cargar` se guarda para recuperar el segmento si un
+        escritor muere a mitad de una escritura.
+        """
+        self._cargar = cargar
+        pid_maestro = maestro()
+        with self._bloqueo():
+            try:
+                self._shm = shared_memory.SharedMemory(self.nombre)
+                _sin_rastreo(self._shm)
+                magia, dueno, capacidad = _CABECERA.unpack_from(self._shm.buf, 0)[:3]
+                if magia == _MAGIA and dueno == pid_maestro:
+                    self.capacidad = capacidad
+                    return self
+                # de otra ejecución (otro master): se descarta
+                _borrar(self._shm)
+                self._shm.close()
+            except FileNotFoundError:
+                pass
+            self.capacidad = capacidad_para(contar())
+            tamano = _INICIO_REGISTROS + self.capacidad * _REGISTRO.size
+            self._shm = shared_memory.SharedMemory(self.nombre, create=True, size=tamano)
+            _sin_rastreo(self._shm)
+            self._llenar(cargar(), pid_maestro)
+        if pid_maestro == os.getpid():
+            atexit.register(eliminar_segmento, self.nombre, pid_maestro)
+        return self
+
+    def _llenar(self, filas, pid_maestro):
+        """Reescribe todos los registros. Con el lock tomado. Los lectores atrasados releen todo."""
+        buf = self._shm.buf
+        v = self._version_cruda()
+        inicio = v if v & 1 else v + 1        # impar: sigue marcada si el escritor anterior murió
+        struct.pack_into('<Q', buf, _POS_VERSION, inicio)
+        # saltar el anillo completo: cambios(desde) de cualquier lector devuelve None (leer todo)
+        posicion = struct.unpack_from('<Q', buf, _POS_CAMBIOS)[0] + LOG_TAMANO + 1
+        n = 0
+        try:
+            for id_, nombre, cantidad, precio in filas:
+                if n >= self.capacidad:
+                    raise CatalogoLleno(f'El catálogo compartido admite {self.capacidad} productos (INVENTARIO_CAPACIDAD).')
+                self._empaquetar(n, id_, nombre, cantidad, precio)
+                n += 1
+            for slot in range(n, self.capacidad):
+                struct.pack_into('<B', buf, _INICIO_REGISTROS + slot * _REGISTRO.size, 0)
+        finally:
+            _CABECERA.pack_into(buf, 0, _MAGIA, pid_maestro, self.capacidad, n, inicio + 1, posicion)
+            self._pos_indice = None
+
+    def _reparar_si_corrupto(self):
+        """Con el lock tomado nadie escribe: una versión impar es de un escritor que murió a mitad."""
+        if not self._version_cruda() & 1:
+            return
+        _log.warning('catalogo_compartido: escritura interrumpida; se recarga el catálogo desde la BD')
+        self._llenar(self._cargar(), _CABECERA.unpack_from(self._shm.buf, 0)[1])
+
+    def cerrar(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+    # --- registros ---
+    def _empaquetar(self, slot, id_, nombre, cantidad, precio):
+        datos = nombre.encode('utf-8')
+        if len(datos) > LARGO_NOMBRE:
+            raise ValueError('Nombre demasiado largo para el catálogo compartido.')
+        _REGISTRO.pack_into(self._shm.buf, _INICIO_REGISTROS + slot * _REGISTRO.size,
+                            1, id_, int(cantidad), float(precio), len(datos), datos)
+
+    def _consistente(self, leer):
+        """leer(buf) sin escritura en medio (seqlock): devuelve (version_cruda, resultado)."""
+        limite = time.monotonic() + ESPERA_ESCRITOR
+        while True:
+            v1 = self._version_cruda()
+            if not v1 & 1:
+                resultado = leer(self._shm.buf)
+                if self._version_cruda() == v1:
+                    return v1, resultado
+            if time.monotonic() > limite:
+                # escritor lento: esperamos su lock; escritor muerto: el lock está libre y se repara
+                with self._bloqueo():
+                    self._reparar_si_corrupto()
+                limite = time.monotonic() + ESPERA_ESCRITOR
+            else:
+                time.sleep(0)
+
+    @staticmethod
+    def _producto(registro):
+        ocupado, id_, cantidad, precio, largo, nombre = _REGISTRO.unpack(registro)
+        return ProductoCache(id_, nombre[:largo].decode('utf-8'), cantidad, precio) if ocupado else None
+
+    def registros(self):
+        """(posicion, [(slot, ProductoCache)]): copia completa, leída sin bloquear a los escritores."""
+        def leer(buf):
+            usados = _CABECERA.unpack_from(buf, 0)[3]
+            posicion = struct.unpack_from('<Q', buf, _POS_CAMBIOS)[0]
+            return posicion, bytes(buf[_INICIO_REGISTROS:_INICIO_REGISTROS + usados * _REGISTRO.size])
+
+        _, (posicion, datos) = self._consistente(leer)
+        productos = ((slot, self._producto(datos[i:i + _REGISTRO.size]))
+                     for slot, i in enumerate(range(0, len(datos), _REGISTRO.size)))
+        return posicion, [(slot, p) for slot, p in productos if p is not None]
+
+    def cambios(self, desde):
+        """
+        (posicion, [(slot, ProductoCache | None)]) con el estado actual de los slots escritos desde
+        `desde` (None = slot libre). Devuelve None si el anillo ya los pisó: hay que leer registros().
+        """
+        def leer(buf):
+            posicion = struct.unpack_from('<Q', buf, _POS_CAMBIOS)[0]
+            if desde is None or desde > posicion or posicion - desde > LOG_TAMANO:
+                return None
+            slots = {_ENTRADA.unpack_from(buf, _INICIO_LOG + (i % LOG_TAMANO) * _ENTRADA.size)[0]
+                     for i in range(desde, posicion)}
+            return posicion, [(slot, bytes(buf[_INICIO_REGISTROS + slot * _REGISTRO.size:
+                                                _INICIO_REGISTROS + (slot + 1) * _REGISTRO.size]))
+                              for slot in sorted(slots)]
+
+        _, leido = self._consistente(leer)
+        if leido is None:
+            return None
+        posicion, registros = leido
+        return posicion, [(slot, self._producto(registro)) for slot, registro in registros]
+
+    def _asegurar_indice(self):
+        # se llama con el lock tomado (y el segmento reparado): nadie más escribe mientras se lee
+        if self._pos_indice == self.posicion:
+            return
+        cambios = self.cambios(self._pos_indice)
+        if cambios is None:
+            posicion, ocupados = self.registros()
+            usados = _CABECERA.unpack_from(self._shm.buf, 0)[3]
+            self._ids = {slot: p.id_producto for slot, p in ocupados}
+            self._slots = {id_: slot for slot, id_ in self._ids.items()}
+            self._libres = sorted(set(range(usados)) - self._ids.keys(), reverse=True)
+        else:
+            posicion, escritos = cambios
+            libres = set(self._libres)
+            # primero se sueltan los ids que ocupaban estos slots (un producto pudo mudarse de slot)
+            for slot, _ in escritos:
+                anterior = self._ids.pop(slot, None)
+                if anterior is not None and self._slots.get(anterior) == slot:
+                    del self._slots[anterior]
+            for slot, p in escritos:
+                if p is None:
+                    libres.add(slot)
+                else:
+                    libres.discard(slot)
+                    self._slots[p.id_producto] = slot
+                    self._ids[slot] = p.id_producto
+            self._libres = sorted(libres, reverse=True)
+        self._pos_indice = posicion
+
+    def _slot_para(self, id_, usados):
+        """Slot del producto o uno libre. Devuelve (slot, usados)."""
+        slot = self._slots.get(id_)
+        if slot is not None:
+            return slot, usados
+        if self._libres:
+            return self._libres.pop(), usados
+        if usados < self.capacidad:
+            return usados, usados + 1
+        raise CatalogoLleno(f'El catálogo compartido admite {self.capacidad} productos (INVENTARIO_CAPACIDAD).')
+
+    def guardar(self, id_, nombre, cantidad, precio):
+        """Alta o modificación."""
+        self.guardar_lote([(id_, nombre, cantidad, precio)])
+
+    def guardar_lote(self, filas):
+        """Altas/modificaciones [(id, nombre, cantidad, precio)] con un solo lock y un solo cambio de versión."""
+        with self._bloqueo():
+            self._reparar_si_corrupto()
+            self._asegurar_indice()
+            usados = _CABECERA.unpack_from(self._shm.buf, 0)[3]
+            with self._escribiendo():
+                try:
+                    for id_, nombre, cantidad, precio in filas:
+                        slot, usados = self._slot_para(id_, usados)
+                        self._empaquetar(slot, id_, nombre, cantidad, precio)
+                        self._anotar(slot)
+                        self._slots[id_] = slot
+                        self._ids[slot] = id_
+                finally:
+                    struct.pack_into('<I', self._shm.buf, _POS_USADOS, usados)
+            self._pos_indice = self.posicion
+
+    def quitar(self, id_):
+        """Libera el slot del producto."""
+        with self._bloqueo():
+            self._reparar_si_corrupto()
+            self._asegurar_indice()
+            slot = self._slots.pop(id_, None)
+            if slot is None:
+                return
+            del self._ids[slot]
+            with self._escribiendo():
+                struct.pack_into('<B', self._shm.buf, _INICIO_REGISTROS + slot * _REGISTRO.size, 0)
+                self._anotar(slot)
+            self._libres.append(slot)
+            self._pos_indice = self.posicion
@@ -0,0 +1,357 @@
+"""
+Registro asíncrono de facturas: cola durable local (SQLite) + escritores en segundo plano.
+
+    FACTURAS_ASINCRONAS=1 gunicorn ...                  # el formulario encola en vez de registrar
+    POST /api/facturas con `Prefer: respond-async`      # la API encola aunque el modo esté apagado
+    python cola_facturas.py --escritores 4               # escritores en un proceso aparte
+    python cola_facturas.py --estado                     # cuántas hay en cada estado
+
+- La petición sólo valida el formulario, inserta una fila en COLA_FACTURAS_ARCHIVO (WAL,
+  synchronous=FULL: confirmada = en disco) y responde 202 con la URL de seguimiento
+  (/api/facturas/cola/<id>). No toma una conexión de MySQL ni locks de productos.
+- Cada escritor toma hasta COLA_LOTE pendientes y las registra en UNA transacción de MySQL
+  (un SAVEPOINT por factura: una sin stock se marca ERROR sin arrastrar al resto). Un commit por
+  lote en vez de uno por factura; si el lote cae en un deadlock se reintenta entero (Factura.con_reintentos).
+- Toda factura de la cola lleva clave de idempotencia (la del cliente o `cola-<id>`): si el proceso
+  muere entre el commit de MySQL y la marca en SQLite, la fila vuelve a PENDIENTE pasados
+  COLA_VISIBILIDAD segundos y el reintento encuentra la factura ya creada en vez de duplicarla.
+  Una fila que falla COLA_MAX_INTENTOS veces queda en ERROR.
+- Los escritores (COLA_ESCRITORES hilos) corren en UN solo worker web: el que toma el lock de
+  `<archivo>.escritor`; si ese worker muere, el kernel suelta el lock y lo toma otro en su próximo
+  encolar() o al arrancar. Con FACTURAS_ASINCRONAS=1 arrancan con el worker; si no, recién con la primera
+  factura encolada (Prefer: respond-async). 0 para dejarlos sólo en `python cola_facturas.py`.
+  Usan el pool de conexiones de ese worker: DB_POOL_SIZE debe contarlos.
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from mysql.connector import Error
+
+try:
+    import fcntl
+except ImportError:      # Windows: sólo servidor de desarrollo (un proceso)
+    fcntl = None
+
+from conexion.conexion import obtener_pool
+from modelos.model_factura import ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT, Factura
+from modelos.model_idempotencia import ClaveReutilizada, ClavesIdempotencia
+import versiones
+
+ARCHIVO = os.environ.get('COLA_FACTURAS_ARCHIVO',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos', 'cola_facturas.sqlite3'))
+ACTIVA = os.environ.get('FACTURAS_ASINCRONAS', '0') == '1'
+ESCRITORES = int(os.environ.get('COLA_ESCRITORES', 2))     # hilos del proceso escritor
+LOTE = int(os.environ.get('COLA_LOTE', 50))                # facturas por transacción
+VISIBILIDAD = int(os.environ.get('COLA_VISIBILIDAD', 300))  # segundos en PROCESANDO antes de recuperarla
+MAX_INTENTOS = int(os.environ.get('COLA_MAX_INTENTOS', 5))
+RETENER_HORAS = int(os.environ.get('COLA_RETENER_HORAS', 24))   # terminadas, para consultar su estado
+ESPERA_VACIA = 0.5       # segundos entre consultas con la cola vacía (otros procesos no avisan)
+MANTENIMIENTO = 60       # segundos entre recuperaciones / purgas
+
+ESTADOS = ('PENDIENTE', 'PROCESANDO', 'REGISTRADA', 'ERROR')
+Item = namedtuple('Item', 'id id_usuario clave id_cliente lineas estado')
+
+_log = logging.getLogger('cola_facturas')
+
+
+class ColaFacturas:
+    def __init__(self, ruta=ARCHIVO):
+        self.ruta = ruta
+        self._local = threading.local()   # sqlite3: una conexión por hilo
+        self._lock = threading.Lock()
+        self._aviso = threading.Event()
+        self._pid = None
+        self._turno = (None, None)   # (pid, descriptor del lock de escritor)
+        self._hilos = []
+        self._ultimo_mantenimiento = 0.0
+        self.lotes = 0
+        self.registradas = 0
+        self.errores = 0
+        self.fallos_lote = 0
+
+    # --- SQLite ---
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            db = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)   # transacciones explícitas
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=FULL')
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS cola (
+                    id TEXT PRIMARY KEY,
+                    id_usuario INTEGER NOT NULL,
+                    clave TEXT NOT NULL,
+                    datos TEXT NOT NULL,
+                    estado TEXT NOT NULL DEFAULT 'PENDIENTE',
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    id_factura INTEGER,
+                    error TEXT,
+                    creada REAL NOT NULL,
+                    actualizada REAL NOT NULL,
+                    UNIQUE (id_usuario, clave)
+                )
+            """)
+            db.execute('CREATE INDEX IF NOT EXISTS idx_estado ON cola (estado, creada)')
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    # --- lado de la petición ---
+    def encolar(self, id_usuario, clave, id_cliente, lineas, estado='PAGADA'):
+        """
+        Guarda la factura (ya validada por Factura.agrupar_lineas) y devuelve (id, nueva).
+        Con la misma clave devuelve la fila existente; con otros datos lanza ClaveReutilizada.
+        """
+        id_ = uuid.uuid4().hex
+        clave = clave or f'cola-{id_}'
+        datos = json.dumps({'id_cliente': int(id_cliente), 'lineas': sorted(lineas.items()), 'estado': estado})
+        ahora = time.time()
+        db = self._db()
+        db.execute("""
+            INSERT OR IGNORE INTO cola (id, id_usuario, clave, datos, creada, actualizada)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (id_, id_usuario, clave, datos, ahora, ahora))
+        existente, datos_existentes = db.execute("SELECT id, datos FROM cola WHERE id_usuario = ? AND clave = ?",
+                                                 (id_usuario, clave)).fetchone()
+        if datos_existentes != datos:
+            raise ClaveReutilizada('La clave de idempotencia ya se usó con otros datos.')
+        self.iniciar()
+        self._aviso.set()
+        return existente, existente == id_
+
+    def consultar(self, id_, id_usuario):
+        """Estado de una factura encolada por `id_usuario`, o None."""
+        fila = self._db().execute("""
+            SELECT estado, id_factura, error, intentos, creada, actualizada
+            FROM cola WHERE id = ? AND id_usuario = ?
+        """, (id_, id_usuario)).fetchone()
+        if fila is None:
+            return None
+        estado, id_factura, error, intentos, creada, actualizada = fila
+        return {'id': id_, 'estado': estado, 'id_factura': id_factura, 'error': error, 'intentos': intentos,
+                'creada': creada, 'actualizada': actualizada}
+
+    # --- lado de los escritores ---
+    def tomar(self, n=LOTE):
+        """Marca hasta n pendientes como PROCESANDO (BEGIN IMMEDIATE: un solo escritor a la vez) y las devuelve."""
+        db = self._db()
+        ahora = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if ahora - self._ultimo_mantenimiento > MANTENIMIENTO:
+                self._mantenimiento(db, ahora)
+            filas = db.execute("""
+                SELECT id, id_usuario, clave, datos, intentos FROM cola
+                WHERE estado = 'PENDIENTE' ORDER BY creada LIMIT ?
+            """, (n,)).fetchall()
+            # tomadas MAX_INTENTOS veces sin terminar (p. ej. tumban al escritor): no se insiste más
+            db.executemany("UPDATE cola SET estado = 'ERROR', error = 'demasiados intentos', actualizada = ? "
+                           "WHERE id = ?", [(ahora, fila[0]) for fila in filas if fila[4] >= MAX_INTENTOS])
+            lote = []
+            for id_, id_usuario, clave, datos, intentos in filas:
+                if intentos < MAX_INTENTOS:
+                    d = json.loads(datos)
+                    lote.append(Item(id_, id_usuario, clave, d['id_cliente'],
+                                     {pid: cant for pid, cant in d['lineas']}, d['estado']))
+            db.executemany("UPDATE cola SET estado = 'PROCESANDO', intentos = intentos + 1, actualizada = ? "
+                           "WHERE id = ?", [(ahora, item.id) for item in lote])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return lote
+
+    def _mantenimiento(self, db, ahora):
+        # PROCESANDO hace demasiado: el proceso que la tomó murió (o se colgó). Reintentarla es seguro
+        # porque lleva clave de idempotencia
+        recuperadas = db.execute("UPDATE cola SET estado = 'PENDIENTE', actualizada = ? "
+                                 "WHERE estado = 'PROCESANDO' AND actualizada < ?",
+                                 (ahora, ahora - VISIBILIDAD)).rowcount
+        if recuperadas:
+            _log.warning('cola_facturas: %d facturas recuperadas de escritores caídos', recuperadas)
+        db.execute("DELETE FROM cola WHERE estado IN ('REGISTRADA', 'ERROR') AND actualizada < ?",
+                   (ahora - RETENER_HORAS * 3600,))
+        self._ultimo_mantenimiento = ahora
+
+    def liberar(self, ids):
+        """El lote no se pudo registrar (conexión caída, deadlocks agotados): vuelve a PENDIENTE."""
+        self._db().executemany("UPDATE cola SET estado = 'PENDIENTE', actualizada = ? WHERE id = ?",
+                               [(time.time(), id_) for id_ in ids])
+
+    def terminar(self, resultados):
+        """resultados: {id: (estado, id_factura, error)}, en una transacción."""
+        db = self._db()
+        ahora = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany("UPDATE cola SET estado = ?, id_factura = ?, error = ?, actualizada = ? WHERE id = ?",
+                           [(estado, id_factura, error, ahora, id_)
+                            for id_, (estado, id_factura, error) in resultados.items()])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def registrar_lote(conn, lote):
+        """
+        Crea las facturas del lote dentro de la transacción de `conn` (sin commit) y devuelve
+        ({id: (estado, id_factura, error)}, cuántas son nuevas). Deadlocks y errores de conexión
+        se propagan: el lote entero se reintenta o se libera.
+
+        Antes de la primera factura bloquea TODOS los productos del lote en orden de id: factura por
+        factura, dos lotes tomarían los mismos productos en órdenes distintos (A,B en un lote; B,A
+        repartidos en dos facturas del otro) y se esperarían en ciclo. ROLLBACK TO SAVEPOINT no suelta
+        esos locks, así que duran hasta el commit del lote.
+        """
+        resultados, nuevas = {}, 0
+        cur = conn.cursor()
+        try:
+            ids = sorted({pid for item in lote for pid in item.lineas})
+            if ids:
+                cur.execute(f"SELECT id_producto FROM productos WHERE id_producto IN ({', '.join(['%s'] * len(ids))}) "
+                            "ORDER BY id_producto FOR UPDATE", ids)
+                cur.fetchall()
+            for item in lote:
+                cur.execute('SAVEPOINT factura')
+                try:
+                    id_factura, repetida = Factura.crear_una_vez(conn, item.id_usuario, item.clave,
+                                                                 item.id_cliente, item.lineas, item.estado)
+                    resultados[item.id] = ('REGISTRADA', id_factura, None)
+                    nuevas += not repetida
+                except Error as e:
+                    # 1452 (cliente inexistente) y similares sólo deshacen la sentencia: se descarta esta factura
+                    if e.errno in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT) or e.errno is None or e.errno >= 2000:
+                        raise
+                    cur.execute('ROLLBACK TO SAVEPOINT factura')
+                    resultados[item.id] = ('ERROR', None, str(e))
+                except ValueError as e:   # StockInsuficiente, producto inexistente, ClaveReutilizada
+                    cur.execute('ROLLBACK TO SAVEPOINT factura')
+                    resultados[item.id] = ('ERROR', None, str(e))
+            return resultados, nuevas
+        finally:
+            cur.close()
+
+    def procesar(self, n=LOTE):
+        """Toma y registra un lote; devuelve cuántas facturas tomó (0 = cola vacía)."""
+        lote = self.tomar(n)
+        if not lote:
+            return 0
+        pool = obtener_pool()
+        conn = pool.obtener()
+        descartar = False
+        try:
+            resultados, nuevas = Factura.con_reintentos(conn, lambda: self.registrar_lote(conn, lote))
+            if nuevas:
+                ClavesIdempotencia.limpiar_si_toca(conn)
+        except Exception:
+            descartar = True
+            self.fallos_lote += 1
+            self.liberar([item.id for item in lote])
+            raise
+        finally:
+            pool.devolver(conn, descartar=descartar)
+        self.terminar(resultados)
+        if nuevas:
+            versiones.tocar('facturas', 'productos')
+        errores = sum(1 for estado, _, _ in resultados.values() if estado == 'ERROR')
+        self.lotes += 1
+        self.registradas += len(resultados) - errores
+        self.errores += errores
+        return len(lote)
+
+    def _escritor(self):
+        while True:
+            try:
+                if self.procesar():
+                    continue
+            except Exception:
+                _log.exception('cola_facturas: lote no registrado, se reintenta')
+                time.sleep(1)
+                continue
+            self._aviso.wait(ESPERA_VACIA)
+            self._aviso.clear()
+
+    def _tomar_turno(self):
+        """Lock exclusivo sin espera sobre `<ruta>.escritor`: un solo proceso escribe."""
+        if fcntl is None:
+            return True
+        pid, fd = self._turno
+        if pid != os.getpid():
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            fd = os.open(f'{self.ruta}.escritor', os.O_CREAT | os.O_RDWR, 0o600)
+            self._turno = (os.getpid(), fd)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def iniciar(self, escritores=ESCRITORES, exclusivo=True):
+        """
+        Arranca los escritores en este proceso si le toca (exclusivo) y no los tiene ya.
+        Si otro proceso tiene el turno no hace nada: se vuelve a intentar en el próximo encolar().
+        """
+        if self._pid == os.getpid() or escritores <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if exclusivo and not self._tomar_turno():
+                return
+            self._hilos = [threading.Thread(target=self._escritor, name=f'cola-facturas-{n}', daemon=True)
+                           for n in range(escritores)]
+            for hilo in self._hilos:
+                hilo.start()
+            self._pid = os.getpid()
+
+    def estadisticas(self):
+        por_estado = dict.fromkeys(ESTADOS, 0)
+        if os.path.exists(self.ruta):
+            por_estado.update(self._db().execute("SELECT estado, COUNT(*) FROM cola GROUP BY estado").fetchall())
+        return {'activa': ACTIVA, 'escritores': sum(h.is_alive() for h in self._hilos), 'por_estado': por_estado,
+                'lotes': self.lotes, 'registradas': self.registradas, 'errores': self.errores,
+                'fallos_lote': self.fallos_lote}
+
+
+cola = ColaFacturas()
+
+
+def init_app(app):
+    """
+    Con FACTURAS_ASINCRONAS=1 arranca los escritores al crear la app (si este proceso toma el turno).
+    Bajo gunicorn lo hace post_worker_init de gunicorn.conf.py, ya dentro del worker: con --preload la
+    app se crea en el master, que no debe quedarse con el turno ni con hilos que no pasan al fork.
+    """
+    if ACTIVA and not os.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        cola.iniciar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Escritores de la cola de facturas asíncronas.')
+    parser.add_argument('--escritores', type=int, default=max(ESCRITORES, 1))
+    parser.add_argument('--estado', action='store_true', help='muestra cuántas hay en cada estado y sale')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    if args.estado:
+        print(json.dumps(cola.estadisticas(), indent=2))
+        return
+    cola.iniciar(args.escritores, exclusivo=False)
+    print(f'{args.escritores} escritores sobre {cola.ruta} (Ctrl+C para salir)')
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(cola.estadisticas()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
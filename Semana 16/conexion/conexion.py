@@ -1,21 +1,215 @@
-# clase de conexion a BD sin sqlalchemy 
+# clase de conexion a BD sin sqlalchemy
+import os
+import queue
+import threading
+import time
+
 import mysql.connector
 from mysql.connector import Error
 
-# conexion a la base de datos
+from conexion import consultas_lentas
+from conexion.instrumentacion import ConexionInstrumentada
+
+# --- Configuración (variables de entorno con valores por defecto para desarrollo) ---
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', 'password'),
+    'database': os.environ.get('DB_NAME', 'inventario'),
+    # cursores con buffer por defecto: varias consultas pueden compartir la misma conexión
+    'buffered': True,
+}
+POOL_TAMANO = int(os.environ.get('DB_POOL_SIZE', 5))          # conexiones por proceso (worker)
+POOL_RECICLAR = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # segundos de vida máxima
+POOL_ESPERA = float(os.environ.get('DB_POOL_TIMEOUT', 10))    # segundos esperando una conexión libre
+
+# huellas de consultas + log de lentas con EXPLAIN (CONSULTA_LENTA_MS); 0 lo desactiva
+if os.environ.get('CONSULTAS_LENTAS', '1') == '1':
+    consultas_lentas.instalar(DB_CONFIG)
+
+
+class PoolAgotado(Error):
+    """No hubo conexión libre dentro del tiempo de espera."""
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones MySQL por proceso.
+    - Reutiliza conexiones en una cola (LIFO) en vez de abrir una por petición.
+    - Verifica la conexión (ping) al entregarla y recicla las que superan su vida máxima.
+    - Nunca tiene más de `tamano` conexiones abiertas a la vez.
+    """
+    def __init__(self, tamano=POOL_TAMANO, reciclar=POOL_RECICLAR, espera=POOL_ESPERA, **config):
+        self.tamano = tamano
+        self.reciclar = reciclar
+        self.espera = espera
+        self.config = config or DB_CONFIG
+        self._libres = queue.LifoQueue()
+        self._creada_en = {}              # id(conn) -> time.monotonic() de creación
+        self._lock = threading.Lock()
+        self._abiertas = 0
+        self._en_uso = 0
+        self._stats = {'creadas': 0, 'entregas': 0, 'esperas': 0, 'agotado': 0,
+                       'recicladas': 0, 'descartadas': 0}
+
+    def _crear(self):
+        # envuelta: cada consulta se cronometra para las métricas (ver instrumentacion.py)
+        conn = ConexionInstrumentada(mysql.connector.connect(**self.config))
+        self._creada_en[id(conn)] = time.monotonic()
+        self._stats['creadas'] += 1
+        return conn
+
+    def _descartar(self, conn):
+        self._creada_en.pop(id(conn), None)
+        try:
+            conn.close()
+        except Error:
+            pass
+        with self._lock:
+            self._abiertas -= 1
+
+    def _vencida(self, conn):
+        return time.monotonic() - self._creada_en.get(id(conn), 0) > self.reciclar
+
+    def obtener(self):
+        """Entrega una conexión sana: libre, nueva (si hay cupo) o esperando a que se devuelva una."""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    hay_cupo = self._abiertas < self.tamano
+                    if hay_cupo:
+                        self._abiertas += 1
+                if hay_cupo:
+                    try:
+                        conn = self._crear()
+                    except Exception:
+                        with self._lock:
+                            self._abiertas -= 1
+                        raise
+                else:
+                    self._stats['esperas'] += 1
+                    try:
+                        conn = self._libres.get(timeout=self.espera)
+                    except queue.Empty:
+                        self._stats['agotado'] += 1
+                        raise PoolAgotado(msg=f'Pool agotado: {self.tamano} conexiones en uso.')
+
+            # health-check y reciclaje
+            if self._vencida(conn):
+                self._stats['recicladas'] += 1
+                self._descartar(conn)
+                continue
+            if not conn.is_connected():   # is_connected() hace un ping al servidor
+                self._stats['descartadas'] += 1
+                self._descartar(conn)
+                continue
+
+            with self._lock:
+                self._en_uso += 1
+            self._stats['entregas'] += 1
+            return conn
+
+    def devolver(self, conn, descartar=False):
+        """
+        Regresa la conexión al pool (deshaciendo cualquier transacción pendiente).
+        Con descartar=True se cierra (p. ej. un cursor sin buffer que quedó a medio leer).
+        """
+        with self._lock:
+            self._en_uso -= 1
+        if descartar:
+            self._stats['descartadas'] += 1
+            self._descartar(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Error:
+            # conexión rota o con resultados sin leer: no se reutiliza
+            self._stats['descartadas'] += 1
+            self._descartar(conn)
+            return
+        if self._vencida(conn):
+            self._stats['recicladas'] += 1
+            self._descartar(conn)
+            return
+        self._libres.put(conn)
 
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'tamano': self.tamano,
+                'abiertas': self._abiertas,
+                'en_uso': self._en_uso,
+                'libres': self._libres.qsize(),
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """Pool del proceso actual. Se crea de forma perezosa y se rehace tras un fork (gunicorn)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = PoolConexiones()
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _g_actual():
+    # import perezoso: los scripts (reset.py) usan este módulo sin Flask
+    try:
+        from flask import g, has_app_context
+    except ImportError:
+        return None
+    return g if has_app_context() else None
+
+
+# conexion a la base de datos
 def conexion():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="password",
-        database="inventario"
-    )
+    """
+    Dentro de una petición Flask devuelve SIEMPRE la misma conexión (una por petición, guardada en `g`);
+    fuera de Flask (scripts) entrega una conexión del pool.
+    """
+    g = _g_actual()
+    if g is None:
+        return obtener_pool().obtener()
+    if 'db_conn' not in g:
+        g.db_conn = obtener_pool().obtener()
+    return g.db_conn
 
 # cerrar conexion a la base de datos
 def cerrar_conexion(conn):
-    if conn.is_connected():
-        conn.close()
-        print("Conexion a la base de datos cerrada.")
+    """Devuelve la conexión al pool. La conexión de la petición se libera en el teardown."""
+    if conn is None:
+        return
+    g = _g_actual()
+    if g is not None and g.get('db_conn') is conn:
+        return
+    obtener_pool().devolver(conn)
+
+
+def liberar_conexion_peticion(exc=None):
+    g = _g_actual()
+    conn = g.pop('db_conn', None) if g is not None else None
+    if conn is not None:
+        obtener_pool().devolver(conn)
+
+
+def estadisticas_pool():
+    return obtener_pool().estadisticas()
+
+
+def init_app(app):
+    """Registra la liberación de la conexión al terminar cada petición."""
+    app.teardown_appcontext(liberar_conexion_peticion)
 
 # probar conexion a la base de datos
@@ -0,0 +1,203 @@
+"""
+Huellas de consultas y registro de consultas lentas (oyente de instrumentacion.py).
+- Cada SQL se normaliza a una huella: literales y %s -> ?, listas IN (...) y filas VALUES (...)
+  colapsadas (también los CASE WHEN de Factura.crear), espacios unificados.
+  Así `WHERE id IN (%s,%s,%s)` y `IN (%s,%s)` cuentan como la misma consulta.
+- Por huella se acumulan ejecuciones, tiempo total, máximo y filas; cada proceso vuelca su
+  acumulado a CONSULTAS_DIR/huellas_<pid>.json (reporte_consultas.py los suma).
+- Las que superan CONSULTA_LENTA_MS van a CONSULTAS_DIR/lentas_<pid>.log (JSON por línea,
+  rotativo). Un hilo aparte corre EXPLAIN con su propia conexión (una vez por huella cada
+  EXPLAIN_CADA segundos) y lo agrega al mismo log; la petición no espera el plan.
+Los parámetros nunca se escriben en el log (pueden ser hashes de contraseñas o datos de clientes).
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from conexion import instrumentacion
+
+DIRECTORIO = os.environ.get('CONSULTAS_DIR', os.path.join(tempfile.gettempdir(), 'inventario_consultas'))
+UMBRAL = float(os.environ.get('CONSULTA_LENTA_MS', 200)) / 1000
+INTERVALO = float(os.environ.get('CONSULTAS_INTERVALO', 10))   # segundos entre volcados de huellas
+EXPLAIN_CADA = float(os.environ.get('EXPLAIN_CADA', 600))
+LOG_BYTES = int(os.environ.get('CONSULTAS_LOG_BYTES', 10 * 1024 * 1024))
+LOG_COPIAS = 5
+
+_COMENTARIOS = re.compile(r'/\*.*?\*/|--[^\n]*', re.S)
+_CADENAS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_MARCADORES = re.compile(r'%s|%\(\w+\)s')
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_FILAS = re.compile(r'(values\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+', re.I)
+_CASOS = re.compile(r'(when \? then \?)(?:\s+when \? then \?)+', re.I)
+_ESPACIOS = re.compile(r'\s+')
+_EXPLICABLES = ('select', 'update', 'delete')
+
+
+@lru_cache(maxsize=4096)
+def normalizar(sql):
+    """SQL -> texto normalizado (la cache evita repetir las regex: casi todo el SQL es constante)."""
+    s = _COMENTARIOS.sub(' ', sql)
+    s = _CADENAS.sub('?', s)
+    s = _MARCADORES.sub('?', s)
+    s = _NUMEROS.sub('?', s)
+    s = _LISTAS.sub('(...)', s)
+    s = _FILAS.sub(r'\1', s)
+    s = _CASOS.sub(r'\1 ...', s)
+    return _ESPACIOS.sub(' ', s).strip().lower()
+
+
+def huella(sql):
+    """(id corto, sql normalizado)."""
+    normal = normalizar(sql)
+    return hashlib.sha1(normal.encode('utf-8')).hexdigest()[:16], normal
+
+
+class Huellas:
+    """{id: [sql_normalizado, ejecuciones, segundos_total, segundos_max, filas, lentas]} de este proceso."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.datos = {}
+        self.ultimo_volcado = time.monotonic()
+        self.pid = os.getpid()
+
+    def registrar(self, id_, normal, segundos, filas, lenta):
+        with self._lock:
+            if self.pid != os.getpid():
+                # proceso hijo (fork): lo acumulado pertenece al padre y ya está en su archivo
+                self.datos, self.pid = {}, os.getpid()
+            d = self.datos.get(id_)
+            if d is None:
+                d = self.datos[id_] = [normal, 0, 0.0, 0.0, 0, 0]
+            d[1] += 1
+            d[2] += segundos
+            d[3] = max(d[3], segundos)
+            d[4] += max(filas or 0, 0)
+            d[5] += lenta
+
+    def volcar(self):
+        with self._lock:
+            copia = {k: list(v) for k, v in self.datos.items()}
+            self.ultimo_volcado = time.monotonic()
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        ruta = os.path.join(DIRECTORIO, f'huellas_{os.getpid()}.json')
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(copia, f)
+        os.replace(ruta + '.tmp', ruta)
+
+
+huellas = Huellas()
+_log = None
+_log_pid = None
+_pendientes = queue.Queue(maxsize=100)
+_explicadas = {}    # id -> monotonic del último EXPLAIN
+_config = None
+_hilo = None
+
+
+def _logger():
+    """Logger con archivo propio por proceso: varios procesos rotando el mismo archivo lo corrompen."""
+    global _log, _log_pid
+    if _log is None or _log_pid != os.getpid():
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        _log = logging.getLogger(f'consultas_lentas.{os.getpid()}')
+        _log.propagate = False
+        _log.setLevel(logging.INFO)
+        manejador = RotatingFileHandler(os.path.join(DIRECTORIO, f'lentas_{os.getpid()}.log'),
+                                        maxBytes=LOG_BYTES, backupCount=LOG_COPIAS, encoding='utf-8')
+        manejador.setFormatter(logging.Formatter('%(message)s'))
+        _log.addHandler(manejador)
+        _log_pid = os.getpid()
+    return _log
+
+
+def _escribir(registro):
+    registro.setdefault('ts', time.strftime('%Y-%m-%dT%H:%M:%S'))
+    registro.setdefault('pid', os.getpid())
+    _logger().info(json.dumps(registro, default=str, ensure_ascii=False))
+
+
+def _pedir_explain(id_, sql, params):
+    if not sql.lstrip().lower().startswith(_EXPLICABLES):
+        return
+    if params is None and _MARCADORES.search(sql):
+        return   # executemany: no hay un juego de parámetros para el plan
+    ahora = time.monotonic()
+    if ahora - _explicadas.get(id_, -EXPLAIN_CADA) < EXPLAIN_CADA:
+        return
+    _explicadas[id_] = ahora
+    _asegurar_hilo()
+    try:
+        _pendientes.put_nowait((id_, sql, params))
+    except queue.Full:
+        pass   # se pierde este plan; habrá otro cuando vuelva a ser lenta
+
+
+def _al_consultar(sql, params, segundos, filas):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    id_, normal = huella(sql)
+    lenta = segundos >= UMBRAL
+    huellas.registrar(id_, normal, segundos, filas, lenta)
+    if lenta:
+        _escribir({'tipo': 'lenta', 'huella': id_, 'ms': round(segundos * 1000, 1),
+                   'filas': filas, 'sql': normal})
+        _pedir_explain(id_, sql, params)
+    if time.monotonic() - huellas.ultimo_volcado >= INTERVALO:
+        try:
+            huellas.volcar()
+        except OSError:
+            pass
+
+
+# --- EXPLAIN asíncrono ---
+def _explicar():
+    import mysql.connector   # conexión propia y sin instrumentar: no compite con el pool ni se mide a sí misma
+    conn = None
+    while True:
+        id_, sql, params = _pendientes.get()
+        try:
+            if conn is None or not conn.is_connected():
+                conn = mysql.connector.connect(**_config)
+            cur = conn.cursor(dictionary=True)
+            try:
+                cur.execute('EXPLAIN ' + sql, params)
+                plan = cur.fetchall()
+            finally:
+                cur.close()
+            conn.rollback()
+            _escribir({'tipo': 'explain', 'huella': id_, 'plan': plan})
+        except Exception as e:
+            _escribir({'tipo': 'explain', 'huella': id_, 'error': str(e)})
+            conn = None
+
+
+def _asegurar_hilo():
+    global _hilo
+    if _hilo is None or not _hilo.is_alive():   # tras un fork el hilo del padre no existe en el hijo
+        _hilo = threading.Thread(target=_explicar, name='explain-consultas-lentas', daemon=True)
+        _hilo.start()
+
+
+def _volcar_al_salir():
+    try:
+        huellas.volcar()
+    except OSError:
+        pass
+
+
+def instalar(config):
+    """Engancha el registro a todas las conexiones del pool. `config`: parámetros para la conexión de EXPLAIN."""
+    global _config
+    _config = dict(config)
+    instrumentacion.agregar_oyente(_al_consultar)
+    atexit.register(_volcar_al_salir)
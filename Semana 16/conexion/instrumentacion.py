@@ -0,0 +1,72 @@
+"""
+Envoltorios delgados sobre la conexión y los cursores de mysql.connector.
+El pool envuelve cada conexión al crearla; cada execute/executemany se cronometra y se avisa
+a los oyentes registrados con agregar_oyente(fn), donde fn(sql, params, segundos, filas).
+Todo lo demás (commit, rollback, fetch*, is_connected, ...) se delega tal cual.
+"""
+import time
+
+_oyentes = []
+
+
+def agregar_oyente(fn):
+    """Registra fn(sql, params, segundos, filas). Un error en un oyente no afecta a la consulta."""
+    if fn not in _oyentes:
+        _oyentes.append(fn)
+
+
+def quitar_oyente(fn):
+    if fn in _oyentes:
+        _oyentes.remove(fn)
+
+
+def _avisar(sql, params, segundos, filas):
+    for fn in _oyentes:
+        try:
+            fn(sql, params, segundos, filas)
+        except Exception:
+            pass
+
+
+class CursorInstrumentado:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params, *args, **kwargs)
+        finally:
+            if _oyentes:
+                _avisar(sql, params, time.perf_counter() - t0, self._cursor.rowcount)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+        finally:
+            if _oyentes:
+                _avisar(sql, None, time.perf_counter() - t0, self._cursor.rowcount)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionInstrumentada:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
@@ -0,0 +1,126 @@
+"""
+Exportación de tablas en CSV / NDJSON sin cargar todo en memoria.
+- Cursor sin buffer (buffered=False): las filas se leen del socket a medida que se envían.
+- Generador que produce bloques de texto (y opcionalmente gzip al vuelo) para un Response de Flask.
+La memoria usada es la de un lote (LOTE filas), no la de la tabla completa.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, timedelta
+
+from conexion.conexion import obtener_pool
+
+LOTE = 1000                 # filas por fetchmany
+TAMANO_BLOQUE = 64 * 1024   # caracteres acumulados antes de enviar un bloque
+
+# tabla -> (consulta, columna de fecha para filtrar por rango o None, ORDER BY)
+CONSULTAS = {
+    'productos': (
+        "SELECT id_producto, nombre, cantidad, precio FROM productos",
+        None, "id_producto",
+    ),
+    'clientes': (
+        "SELECT id_cliente, nombre, apellido, email, telefono, direccion, fecha_registro FROM clientes",
+        "fecha_registro", "id_cliente",
+    ),
+    # una fila por línea de detalle, con los datos de la factura y del cliente
+    'facturas': (
+        "SELECT f.id_factura, f.fecha, f.estado, f.subtotal, f.iva, f.total, "
+        "       c.id_cliente, c.nombre, c.apellido, c.email, "
+        "       d.id_detalle, d.id_producto, d.cantidad, d.precio_unitario, d.subtotal AS subtotal_linea "
+        "FROM facturas f "
+        "JOIN clientes c ON f.id_cliente = c.id_cliente "
+        "JOIN factura_detalle d ON d.id_factura = f.id_factura",
+        "f.fecha", "f.fecha, f.id_factura, d.id_detalle",   # sigue el índice idx_fecha
+    ),
+}
+FORMATOS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def rango_fechas(args):
+    """?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (ambos inclusive). Lanza ValueError si el formato es inválido."""
+    desde = args.get('desde') or None
+    hasta = args.get('hasta') or None
+    desde = date.fromisoformat(desde) if desde else None
+    hasta = date.fromisoformat(hasta) if hasta else None
+    return desde, hasta
+
+
+def _consulta(tabla, desde, hasta):
+    sql, col_fecha, orden = CONSULTAS[tabla]
+    condiciones, params = [], []
+    if col_fecha and desde:
+        condiciones.append(f"{col_fecha} >= %s")
+        params.append(desde)
+    if col_fecha and hasta:
+        condiciones.append(f"{col_fecha} < %s")
+        params.append(hasta + timedelta(days=1))
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    return sql + f" ORDER BY {orden}", params
+
+
+def filas(tabla, desde=None, hasta=None):
+    """Genera primero los nombres de columna y luego cada fila, leyendo del servidor por lotes."""
+    sql, params = _consulta(tabla, desde, hasta)
+    pool = obtener_pool()
+    conn = pool.obtener()   # conexión propia: el generador sigue corriendo después de la vista
+    completo = False
+    cur = None
+    try:
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql, params)
+        yield cur.column_names
+        while True:
+            lote = cur.fetchmany(LOTE)
+            if not lote:
+                break
+            yield from lote
+        completo = True
+    finally:
+        if completo and cur is not None:
+            cur.close()
+        # si el cliente cortó la descarga quedan filas sin leer: la conexión no se reutiliza
+        pool.devolver(conn, descartar=not completo)
+
+
+def _lineas(tabla, formato, desde, hasta):
+    it = filas(tabla, desde, hasta)
+    columnas = next(it)
+    if formato == 'csv':
+        buf = io.StringIO()
+        escritor = csv.writer(buf)
+        escritor.writerow(columnas)
+        for fila in it:
+            escritor.writerow(fila)
+            if buf.tell() >= TAMANO_BLOQUE:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+    else:
+        bloque, largo = [], 0
+        for fila in it:
+            linea = json.dumps(dict(zip(columnas, fila)), default=str, ensure_ascii=False) + '\n'
+            bloque.append(linea)
+            largo += len(linea)
+            if largo >= TAMANO_BLOQUE:
+                yield ''.join(bloque)
+                bloque, largo = [], 0
+        yield ''.join(bloque)
+
+
+def exportar(tabla, formato, desde=None, hasta=None, comprimir=False):
+    """Generador de bytes listo para Response(...). Con comprimir=True produce un .gz al vuelo."""
+    if not comprimir:
+        for texto in _lineas(tabla, formato, desde, hasta):
+            yield texto.encode('utf-8')
+        return
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 -> formato gzip
+    for texto in _lineas(tabla, formato, desde, hasta):
+        datos = gz.compress(texto.encode('utf-8'))
+        if datos:
+            yield datos
+    yield gz.flush()
@@ -0,0 +1,90 @@
+"""
+Cache de fragmentos HTML (cuerpo de las tablas de los listados) por proceso.
+- Clave: (vista, parámetros de la URL: q, cursor, por_pagina, versión de las tablas). Un cambio en
+  productos/clientes/facturas mueve su versión (versiones.tocar en las rutas que escriben) y las
+  entradas viejas dejan de usarse; se van por LRU.
+- Límite en bytes (FRAGMENTOS_MAX_BYTES), no en cantidad: una página de 100 filas pesa mucho más que una de 5.
+- Una visita repetida no hace SQL ni renderiza la tabla: sólo el marco de la página.
+- El token CSRF de cada fila depende de la sesión: se renderiza con una marca aleatoria del proceso
+  y se reemplaza por el token real al servir.
+Se guarda también la paginación (cursores) para armar los enlaces sin volver a consultar.
+"""
+import os
+import secrets
+import sys
+import threading
+from collections import OrderedDict
+
+from flask import render_template, request
+from flask_wtf.csrf import generate_csrf
+from markupsafe import Markup
+
+import versiones
+
+MAX_BYTES = int(os.environ.get('FRAGMENTOS_MAX_BYTES', 32 * 1024 * 1024))
+_MARCA_CSRF = f'csrf-{secrets.token_hex(16)}'
+
+
+class CacheFragmentos:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()   # clave -> (html, meta, bytes)
+        self._bytes = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0], entrada[1]
+
+    def guardar(self, clave, html, meta):
+        tamano = sys.getsizeof(html)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._datos[clave] = (html, meta, tamano)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                _, (_, _, liberados) = self._datos.popitem(last=False)
+                self._bytes -= liberados
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {'entradas': len(self._datos), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos, 'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / total, 3) if total else None}
+
+
+cache = CacheFragmentos()
+
+
+def tabla(vista, tablas, calcular):
+    """
+    HTML de la tabla de un listado y su metadato (p. ej. la Pagina sin filas).
+    `calcular()` consulta y devuelve (plantilla, contexto, meta); sólo se llama si no está en cache.
+    """
+    # la versión se lee antes de consultar: si alguien escribe en medio, la próxima visita usa otra clave
+    clave = (vista, tuple(sorted(request.args.items(multi=True))), versiones.version(*tablas))
+    entrada = cache.obtener(clave)
+    if entrada is None:
+        plantilla, contexto, meta = calcular()
+        html = render_template(plantilla, csrf_token=lambda: _MARCA_CSRF, **contexto)
+        cache.guardar(clave, html, meta)
+        entrada = html, meta
+    html, meta = entrada
+    return Markup(html.replace(_MARCA_CSRF, generate_csrf())), meta
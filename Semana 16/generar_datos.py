@@ -0,0 +1,312 @@
+"""
+Generador de datos sintéticos para el esquema de basedatos/inventario.sql
+(productos, clientes, facturas, factura_detalle, pagos), pensado para millones de filas.
+
+    python generar_datos.py --productos 100000 --clientes 500000 --facturas 3000000
+    python generar_datos.py --facturas 3300000 --lineas 1-5 --procesos 8 --modo infile
+    python generar_datos.py --semilla 7 --dias 730 --procesos 4
+
+- Determinista: cada fila sale de (semilla, tabla, id) con un mezclador splitmix64, sin estado
+  compartido. La misma semilla y --hasta producen los mismos datos sin importar procesos ni lotes.
+- Ids explícitos a partir de MAX(id)+1 de cada tabla, así las tablas se cargan en paralelo
+  y las FK cuadran por construcción (la factura y su detalle calculan las mismas líneas).
+- id_detalle = base + n_factura * LINEAS_MAX + k: deja huecos pero no necesita orden entre lotes.
+- Cada lote (LOTE filas) es una tarea de un ProcessPoolExecutor con conexión propia,
+  foreign_key_checks/unique_checks apagados en la sesión y un commit por lote. El Plan llega
+  una sola vez a cada proceso (initializer), no con cada tarea.
+- --modo insert: INSERT multi-fila de FILAS_POR_INSERT filas. --modo infile: archivo temporal
+  + LOAD DATA LOCAL INFILE (requiere local_infile=ON en el servidor); suele ser 2-3x más rápido.
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+from conexion.conexion import DB_CONFIG
+from modelos.model_factura import IVA
+import versiones
+
+LOTE = 50000
+FILAS_POR_INSERT = 2000
+LINEAS_MAX = 10
+_MASCARA = (1 << 64) - 1
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Jorge', 'Lucía', 'Pedro', 'Sofía', 'Diego', 'Valeria',
+           'Andrés', 'Camila', 'Fernando', 'Daniela', 'Carlos', 'Gabriela', 'Miguel', 'Paula', 'Javier']
+APELLIDOS = ['Zambrano', 'García', 'López', 'Pérez', 'Torres', 'Ramírez', 'Flores', 'Vera', 'Mendoza', 'Castro',
+             'Ortiz', 'Morales', 'Suárez', 'Romero', 'Cedeño', 'Vargas', 'Reyes', 'Andrade', 'Salazar', 'Molina']
+CIUDADES = ['Quito', 'Guayaquil', 'Cuenca', 'Puyo', 'Ambato', 'Manta', 'Loja', 'Tena', 'Ibarra', 'Riobamba']
+TIPOS = ['Camiseta', 'Pantalón', 'Zapato', 'Laptop', 'Mouse', 'Teclado', 'Monitor', 'Silla', 'Mesa', 'Lámpara',
+         'Cuaderno', 'Mochila', 'Audífonos', 'Cable', 'Cargador', 'Botella', 'Chaqueta', 'Gorra', 'Reloj', 'Parlante']
+ATRIBUTOS = ['Básico', 'Pro', 'Deluxe', 'Eco', 'Mini', 'Max', 'Plus', 'Lite', 'Clásico', 'Sport']
+MARCAS = ['Andina', 'Amazonas', 'Pacífico', 'Cóndor', 'Volcán', 'Galápagos', 'Cotopaxi', 'Chimborazo']
+METODOS_PAGO = ['EFECTIVO', 'TARJETA', 'TRANSFERENCIA']
+
+COLUMNAS = {
+    'productos': ('id_producto', 'nombre', 'cantidad', 'precio'),
+    'clientes': ('id_cliente', 'nombre', 'apellido', 'email', 'telefono', 'direccion', 'fecha_registro'),
+    'facturas': ('id_factura', 'id_cliente', 'fecha', 'subtotal', 'iva', 'total', 'estado'),
+    'factura_detalle': ('id_detalle', 'id_factura', 'id_producto', 'cantidad', 'precio_unitario', 'subtotal'),
+    'pagos': ('id_pago', 'id_factura', 'metodo', 'monto', 'fecha'),
+}
+_SAL = {'productos': 1, 'clientes': 2, 'facturas': 3, 'precios': 4}
+
+
+class Azar:
+    """Secuencia splitmix64 sembrada por (semilla, tabla, n): barata de crear, una por fila."""
+    __slots__ = ('estado',)
+
+    def __init__(self, semilla, sal, n):
+        self.estado = (semilla * 0x9E3779B97F4A7C15 + sal * 0xBF58476D1CE4E5B9 + n) & _MASCARA
+
+    def _siguiente(self):
+        self.estado = (self.estado + 0x9E3779B97F4A7C15) & _MASCARA
+        z = self.estado
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASCARA
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASCARA
+        return z ^ (z >> 31)
+
+    def u(self):
+        return (self._siguiente() >> 11) / 2.0 ** 53   # [0, 1)
+
+    def entero(self, a, b):
+        return a + self._siguiente() % (b - a + 1)
+
+    def elegir(self, opciones):
+        return opciones[self._siguiente() % len(opciones)]
+
+
+class Plan:
+    """Parámetros compartidos por todas las tareas (se envía a cada proceso)."""
+    def __init__(self, semilla, bases, totales, lineas, dias, stock, hasta, productos_existentes, clientes_existentes):
+        self.semilla = semilla
+        self.bases = bases                # tabla -> primer id a generar
+        self.totales = totales            # tabla -> filas a generar
+        self.lineas = lineas              # (mín, máx) líneas por factura
+        self.dias = dias
+        self.stock = stock
+        self.hasta = hasta                # fecha de la factura más reciente
+        # si no se generan productos/clientes las facturas usan los ids que ya existen
+        self.productos_existentes = productos_existentes
+        self.clientes_existentes = clientes_existentes
+
+    # --- productos ---
+    def precio(self, id_producto):
+        # secuencia propia: el detalle de una factura lo calcula sin generar el producto entero
+        a = Azar(self.semilla, _SAL['precios'], id_producto)
+        return round(min(2000.0, 2 + 40 * -math.log(1 - a.u())), 2)   # muchos baratos, pocos caros
+
+    def fila_producto(self, id_):
+        a = Azar(self.semilla, _SAL['productos'], id_)
+        nombre = f'{a.elegir(TIPOS)} {a.elegir(ATRIBUTOS)} {a.elegir(MARCAS)} {id_}'
+        return id_, nombre, a.entero(*self.stock), self.precio(id_)
+
+    def _id_producto(self, a):
+        if self.totales['productos']:
+            return self.bases['productos'] + a.entero(0, self.totales['productos'] - 1)
+        return a.elegir(self.productos_existentes)
+
+    # --- clientes ---
+    def fila_cliente(self, id_):
+        a = Azar(self.semilla, _SAL['clientes'], id_)
+        nombre, apellido = a.elegir(NOMBRES), a.elegir(APELLIDOS)
+        email = f'{nombre}.{apellido}.{id_}@ejemplo.com'.lower()
+        telefono = f'09{a.entero(10000000, 99999999)}'
+        direccion = f'{a.elegir(CIUDADES)}, calle {a.entero(1, 200)}'
+        registro = self.hasta - timedelta(seconds=int(86400 * self.dias * 2 * a.u()))
+        return id_, nombre, apellido, email, telefono, direccion, registro
+
+    # --- facturas, detalle y pagos (misma secuencia por factura) ---
+    def factura(self, n):
+        """n = índice de la factura (0..total-1). Devuelve (cabecera, líneas, pago o None)."""
+        id_factura = self.bases['facturas'] + n
+        a = Azar(self.semilla, _SAL['facturas'], id_factura)
+        if self.totales['clientes']:
+            id_cliente = self.bases['clientes'] + a.entero(0, self.totales['clientes'] - 1)
+        else:
+            id_cliente = a.elegir(self.clientes_existentes)
+        # fechas crecientes con el id (como en producción) con algo de ruido
+        total_f = max(1, self.totales['facturas'])
+        fecha = self.hasta - timedelta(seconds=int(86400 * self.dias * (1 - (n + a.u()) / total_f)))
+        productos = {}
+        for _ in range(a.entero(*self.lineas)):
+            productos.setdefault(self._id_producto(a), a.entero(1, 5))
+        lineas, subtotal = [], 0.0
+        for k, (pid, cant) in enumerate(productos.items()):
+            precio = self.precio(pid) if self.totales['productos'] else round(2 + 100 * a.u(), 2)
+            linea = round(precio * cant, 2)
+            subtotal += linea
+            lineas.append((self.bases['factura_detalle'] + n * LINEAS_MAX + k, id_factura, pid, cant, precio, linea))
+        subtotal = round(subtotal, 2)
+        iva = round(subtotal * IVA, 2)
+        r = a.u()
+        estado = 'PAGADA' if r < 0.85 else ('PENDIENTE' if r < 0.97 else 'ANULADA')
+        cabecera = (id_factura, id_cliente, fecha, subtotal, iva, round(subtotal + iva, 2), estado)
+        pago = None
+        if estado == 'PAGADA':
+            pago = (self.bases['pagos'] + n, id_factura, a.elegir(METODOS_PAGO), round(subtotal + iva, 2),
+                    fecha + timedelta(minutes=a.entero(0, 120)))
+        return cabecera, lineas, pago
+
+    def filas(self, tabla, inicio, fin):
+        if tabla == 'productos':
+            return [self.fila_producto(self.bases['productos'] + i) for i in range(inicio, fin)]
+        if tabla == 'clientes':
+            return [self.fila_cliente(self.bases['clientes'] + i) for i in range(inicio, fin)]
+        salida = []
+        for n in range(inicio, fin):
+            cabecera, lineas, pago = self.factura(n)
+            if tabla == 'facturas':
+                salida.append(cabecera)
+            elif tabla == 'factura_detalle':
+                salida.extend(lineas)
+            elif pago is not None:
+                salida.append(pago)
+        return salida
+
+
+# --- carga ---
+def _conectar(modo):
+    config = dict(DB_CONFIG, allow_local_infile=(modo == 'infile'))
+    conn = mysql.connector.connect(**config)
+    cur = conn.cursor()
+    # las FK cuadran por construcción; sin estas comprobaciones InnoDB carga mucho más rápido
+    cur.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+    cur.close()
+    return conn
+
+
+def _insertar(cur, tabla, filas):
+    columnas = COLUMNAS[tabla]
+    marcas = '(' + ','.join(['%s'] * len(columnas)) + ')'
+    for i in range(0, len(filas), FILAS_POR_INSERT):
+        parte = filas[i:i + FILAS_POR_INSERT]
+        cur.execute(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES " + ','.join([marcas] * len(parte)),
+                    [v for f in parte for v in f])
+
+
+def _cargar_archivo(cur, tabla, filas):
+    # los textos generados no tienen tabuladores, saltos ni barras: no hace falta escapar
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8', newline='') as f:
+        for fila in filas:
+            f.write('\t'.join('\\N' if v is None else str(v) for v in fila) + '\n')
+        ruta = f.name
+    try:
+        cur.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE {tabla} CHARACTER SET utf8mb4 "
+                    f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(COLUMNAS[tabla])})", (ruta,))
+    finally:
+        os.unlink(ruta)
+
+
+_plan = None
+
+
+def _iniciar(plan):
+    global _plan
+    _plan = plan
+
+
+def cargar_lote(tabla, inicio, fin, modo):
+    """Tarea de un proceso: genera las filas [inicio, fin) de la tabla y las carga en una transacción."""
+    filas = _plan.filas(tabla, inicio, fin)
+    conn = _conectar(modo)
+    cur = conn.cursor()
+    try:
+        if filas:
+            (_cargar_archivo if modo == 'infile' else _insertar)(cur, tabla, filas)
+        conn.commit()
+        return tabla, len(filas)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _siguiente_id(cur, tabla, columna):
+    cur.execute(f"SELECT COALESCE(MAX({columna}), 0) + 1 FROM {tabla}")
+    return cur.fetchone()[0]
+
+
+def _ids(cur, tabla, columna):
+    cur.execute(f"SELECT {columna} FROM {tabla}")
+    return [f[0] for f in cur.fetchall()]
+
+
+def preparar(productos, clientes, facturas, lineas=(1, 5), dias=365, stock=(0, 500), semilla=42, hasta=None):
+    """Lee los ids actuales y arma el Plan (una sola conexión, antes de repartir tareas)."""
+    if lineas[1] > LINEAS_MAX:
+        raise ValueError(f'Como máximo {LINEAS_MAX} líneas por factura.')
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    try:
+        bases = {t: _siguiente_id(cur, t, c[0]) for t, c in COLUMNAS.items()}
+        # sólo hacen falta si no se generan: con las FK apagadas un id inventado quedaría huérfano
+        productos_existentes = _ids(cur, 'productos', 'id_producto') if facturas and not productos else []
+        clientes_existentes = _ids(cur, 'clientes', 'id_cliente') if facturas and not clientes else []
+    finally:
+        cur.close()
+        conn.close()
+    if facturas and not productos and not productos_existentes:
+        raise ValueError('No hay productos para las facturas: genera también --productos.')
+    if facturas and not clientes and not clientes_existentes:
+        raise ValueError('No hay clientes para las facturas: genera también --clientes.')
+    totales = {'productos': productos, 'clientes': clientes, 'facturas': facturas,
+               'factura_detalle': facturas, 'pagos': facturas}   # las tres últimas se recorren por factura
+    hasta = datetime.combine(hasta or date.today(), datetime.min.time())
+    return Plan(semilla, bases, totales, lineas, dias, stock, hasta, productos_existentes, clientes_existentes)
+
+
+def generar(productos=0, clientes=0, facturas=0, lineas=(1, 5), dias=365, stock=(0, 500), semilla=42, hasta=None,
+            procesos=None, modo='insert', informar=print):
+    plan = preparar(productos, clientes, facturas, lineas, dias, stock, semilla, hasta)
+    tareas = [(tabla, i, min(i + LOTE, total))
+              for tabla, total in plan.totales.items() for i in range(0, total, LOTE)]
+    # intercaladas: todas las tablas avanzan a la vez en vez de una detrás de otra
+    tareas.sort(key=lambda t: t[1])
+    hechas = {t: 0 for t in COLUMNAS}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=procesos or os.cpu_count(), initializer=_iniciar, initargs=(plan,)) as pool:
+        futuros = [pool.submit(cargar_lote, tabla, inicio, fin, modo) for tabla, inicio, fin in tareas]
+        for futuro in as_completed(futuros):
+            tabla, n = futuro.result()
+            hechas[tabla] += n
+            total = sum(hechas.values())
+            informar(f'{tabla:16} +{n:7d}   total {total:10d} filas   {total / (time.perf_counter() - t0):9.0f} filas/s')
+    versiones.tocar_todo()   # páginas, autocompletar y reportes de la app en esta máquina
+    return hechas
+
+
+def _rango(texto):
+    a, _, b = texto.partition('-')
+    return int(a), int(b or a)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos para la BD inventario.')
+    parser.add_argument('--productos', type=int, default=0)
+    parser.add_argument('--clientes', type=int, default=0)
+    parser.add_argument('--facturas', type=int, default=0, help='cada factura genera su detalle y, si está pagada, su pago')
+    parser.add_argument('--lineas', type=_rango, default=(1, 5), help='líneas por factura, p. ej. 1-5')
+    parser.add_argument('--stock', type=_rango, default=(0, 500), help='cantidad inicial de productos, p. ej. 0-500')
+    parser.add_argument('--dias', type=int, default=365, help='las facturas se reparten en los N días previos a --hasta')
+    parser.add_argument('--hasta', type=date.fromisoformat, default=None, help='AAAA-MM-DD (por defecto hoy)')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--modo', choices=('insert', 'infile'), default='insert')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    hechas = generar(args.productos, args.clientes, args.facturas, args.lineas, args.dias, args.stock,
+                     args.semilla, args.hasta, args.procesos, args.modo)
+    print(f'\nListo en {time.perf_counter() - t0:.1f} s: '
+          + ', '.join(f'{t}={n}' for t, n in hechas.items()))
+    if hechas['facturas']:
+        print('Las facturas cargadas no pasan por los resúmenes de ventas: ejecuta python reconstruir_resumen.py')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Configuración de gunicorn (se lee sola al correr `gunicorn app:app` desde esta carpeta).
+
+El master publica su pid en INVENTARIO_MAESTRO antes de levantar los workers: así el catálogo
+compartido (catalogo_compartido.py) sabe de qué ejecución es el segmento, sin adivinarlo con
+os.getppid(), y el master lo borra al terminar.
+
+Métricas (metricas.py): el master vacía METRICAS_DIR al arrancar y pliega en terminados.json el
+archivo de cada worker que termina, para que /metrics no pierda ni duplique sus contadores.
+
+Reportes (analitica.py): el master borra las columnas compartidas de la ejecución anterior; la
+primera consulta de /reportes las vuelve a cargar una sola vez para todos los workers.
+
+Cola de facturas (cola_facturas.py): con FACTURAS_ASINCRONAS=1 cada worker intenta arrancar los
+escritores al terminar de cargar la app; sólo el que toma el lock de escritor los corre.
+"""
+import os
+
+
+def on_starting(server):
+    os.environ['INVENTARIO_MAESTRO'] = str(os.getpid())
+    import metricas
+    metricas.limpiar()
+    import analitica
+    analitica.limpiar()
+
+
+def child_exit(server, worker):
+    import metricas
+    metricas.plegar(worker.pid)
+
+
+def on_exit(server):
+    import catalogo_compartido
+    catalogo_compartido.eliminar_segmento()
+
+
+def post_worker_init(worker):
+    import cola_facturas
+    if cola_facturas.ACTIVA:
+        cola_facturas.cola.iniciar()
@@ -0,0 +1,290 @@
+"""
+Importación masiva del catálogo de productos desde CSV, NDJSON o JSON (lista de objetos).
+
+    python importacion.py datos/datos.json
+    python importacion.py catalogo.csv --lote 5000 --por-transaccion 50000 --rechazados rechazados.csv
+
+- El archivo se lee en streaming (csv.DictReader, una línea por objeto en NDJSON, y para JSON un
+  decodificador incremental de la lista): la memoria es la de un lote, no la del archivo.
+- Cada lote se valida (nombre, cantidad >= 0, precio >= 0) y las filas válidas se insertan con un
+  solo INSERT ... VALUES (...), (...) AS nuevo ON DUPLICATE KEY UPDATE sobre el índice único `nombre`:
+  un producto existente queda con la cantidad y el precio del archivo.
+- Commit cada POR_TRANSACCION filas: una falla deja confirmado lo anterior y se informa hasta dónde llegó.
+Columnas/claves reconocidas: nombre, cantidad, precio (las demás, como id_producto, se ignoran).
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import time
+
+from mysql.connector import Error
+
+LOTE = 5000                 # filas por INSERT
+POR_TRANSACCION = 50000     # filas por commit
+MAX_RECHAZOS_DETALLE = 1000
+LARGO_NOMBRE = 120
+FORMATOS = ('csv', 'ndjson', 'json')
+_BLOQUE = 64 * 1024
+MAX_ELEMENTO = 1024 * 1024   # caracteres de un solo objeto JSON
+
+
+def formato_de(nombre_archivo):
+    ext = os.path.splitext(nombre_archivo)[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson'}.get(ext, ext) if ext in FORMATOS + ('jsonl',) else None
+
+
+# --- lectura en streaming: producen (número de fila/línea, dict) ---
+def leer_csv(texto):
+    for n, fila in enumerate(csv.DictReader(texto), start=2):   # la 1 es el encabezado
+        yield n, fila
+
+
+def leer_ndjson(texto):
+    for n, linea in enumerate(texto, start=1):
+        if linea.strip():
+            try:
+                yield n, json.loads(linea)
+            except ValueError as e:
+                yield n, ValueError(f'JSON inválido: {e}')
+
+
+def leer_json(texto):
+    """Elementos de una lista JSON de nivel superior sin cargar el archivo completo."""
+    decodificador = json.JSONDecoder()
+    buffer, pos, n = '', 0, 0
+    espera = 'inicio'        # inicio -> elemento -> separador -> elemento ...
+    while True:
+        pos = _saltar(buffer, pos)
+        if pos >= len(buffer):
+            mas = texto.read(_BLOQUE)
+            if not mas:
+                if espera == 'inicio':
+                    return   # archivo vacío
+                raise ValueError('JSON incompleto: falta "]"')
+            buffer, pos = buffer[pos:] + mas, 0
+            continue
+        c = buffer[pos]
+        if espera == 'inicio':
+            if c != '[':
+                raise ValueError('Se esperaba una lista JSON de productos: [{...}, {...}]')
+            pos, espera = pos + 1, 'primero'
+        elif espera == 'separador':
+            if c == ']':
+                return
+            if c != ',':
+                raise ValueError(f'Se esperaba "," o "]" después del elemento {n}')
+            pos, espera = pos + 1, 'elemento'
+        elif c == ']' and espera == 'primero':
+            return
+        else:
+            try:
+                objeto, pos = decodificador.raw_decode(buffer, pos)
+            except ValueError:
+                # elemento cortado al final del bloque: se lee más (con un tope por elemento)
+                mas = texto.read(_BLOQUE)
+                if not mas or len(buffer) - pos > MAX_ELEMENTO:
+                    raise ValueError(f'JSON inválido cerca del elemento {n + 1}')
+                buffer, pos = buffer[pos:] + mas, 0
+                continue
+            n += 1
+            espera = 'separador'
+            yield n, objeto
+
+
+def _saltar(buffer, pos):
+    while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+LECTORES = {'csv': leer_csv, 'ndjson': leer_ndjson, 'json': leer_json}
+
+
+# --- validación ---
+def _entero(valor):
+    if isinstance(valor, bool):
+        raise ValueError
+    if isinstance(valor, int):
+        return valor
+    numero = float(str(valor).strip())
+    if not numero.is_integer():
+        raise ValueError
+    return int(numero)
+
+
+def validar(fila):
+    """(nombre, cantidad, precio) o lanza ValueError con el motivo."""
+    if isinstance(fila, Exception):
+        raise fila
+    if not isinstance(fila, dict):
+        raise ValueError('se esperaba un objeto con nombre, cantidad y precio')
+    nombre = ' '.join(str(fila.get('nombre') or '').split())
+    if not nombre:
+        raise ValueError('nombre vacío')
+    if len(nombre) > LARGO_NOMBRE:
+        raise ValueError(f'nombre de más de {LARGO_NOMBRE} caracteres')
+    try:
+        cantidad = _entero(fila.get('cantidad'))
+    except (TypeError, ValueError):
+        raise ValueError(f"cantidad inválida: {fila.get('cantidad')!r}")
+    if cantidad < 0:
+        raise ValueError('cantidad negativa')
+    try:
+        precio = float(str(fila.get('precio')).strip().replace(',', '.'))
+    except (TypeError, ValueError):
+        raise ValueError(f"precio inválido: {fila.get('precio')!r}")
+    if not math.isfinite(precio) or precio < 0:
+        raise ValueError(f"precio inválido: {fila.get('precio')!r}")
+    return nombre, cantidad, round(precio, 2)
+
+
+class Reporte:
+    def __init__(self):
+        self.leidas = 0
+        self.validas = 0
+        self.nuevas = 0
+        self.confirmadas = 0          # filas válidas ya en transacciones confirmadas
+        self.rechazadas = 0
+        self.rechazos = []            # (fila, motivo, datos), hasta MAX_RECHAZOS_DETALLE
+        self.error = None
+        self.segundos = 0.0
+
+    @property
+    def filas_por_s(self):
+        return self.leidas / self.segundos if self.segundos else 0.0
+
+    def rechazar(self, n, motivo, datos):
+        self.rechazadas += 1
+        if len(self.rechazos) < MAX_RECHAZOS_DETALLE:
+            self.rechazos.append((n, motivo, datos))
+
+    def como_dict(self):
+        return {'leidas': self.leidas, 'validas': self.validas, 'nuevas': self.nuevas,
+                'actualizadas': self.validas - self.nuevas if not self.error else None,
+                'confirmadas': self.confirmadas, 'rechazadas': self.rechazadas,
+                'segundos': round(self.segundos, 3), 'filas_por_s': round(self.filas_por_s),
+                'error': self.error}
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for item in filas:
+        lote.append(item)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _upsert(cur, validas):
+    valores = ', '.join(['(%s, %s, %s)'] * len(validas))
+    cur.execute(f"""
+        INSERT INTO productos (nombre, cantidad, precio) VALUES {valores} AS nuevo
+        ON DUPLICATE KEY UPDATE cantidad = nuevo.cantidad, precio = nuevo.precio
+    """, [v for fila in validas for v in fila])
+
+
+def _contar(cur):
+    cur.execute("SELECT COUNT(*) FROM productos")
+    return cur.fetchone()[0]
+
+
+def importar(conn, texto, formato, lote=LOTE, por_transaccion=POR_TRANSACCION, informar=None):
+    """
+    Importa desde `texto` (archivo de texto abierto) con la conexión `conn` y devuelve un Reporte.
+    `nuevas` sale de contar productos antes y después (aproximado si otros insertan a la vez).
+    """
+    reporte = Reporte()
+    t0 = time.perf_counter()
+    cur = conn.cursor()
+    pendientes = 0
+    try:
+        antes = _contar(cur)
+        for filas in _lotes(LECTORES[formato](texto), lote):
+            validas = []
+            for n, fila in filas:
+                try:
+                    validas.append(validar(fila))
+                except ValueError as e:
+                    reporte.rechazar(n, str(e), fila if isinstance(fila, dict) else None)
+            reporte.leidas += len(filas)
+            if validas:
+                _upsert(cur, validas)
+                reporte.validas += len(validas)
+                pendientes += len(validas)
+            if pendientes >= por_transaccion:
+                conn.commit()
+                reporte.confirmadas, pendientes = reporte.validas, 0
+            if informar:
+                informar(reporte.leidas, time.perf_counter() - t0)
+        conn.commit()
+        reporte.confirmadas = reporte.validas
+        reporte.nuevas = _contar(cur) - antes
+    except (Error, ValueError, UnicodeDecodeError) as e:
+        conn.rollback()
+        reporte.error = f'{e} (confirmadas {reporte.confirmadas} filas válidas; el resto no se guardó)'
+    finally:
+        cur.close()
+        reporte.segundos = time.perf_counter() - t0
+    return reporte
+
+
+def abrir_texto(binario):
+    """Envuelve un archivo binario (subido o local) como texto UTF-8, aceptando BOM."""
+    return io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+
+
+def guardar_rechazos(reporte, ruta):
+    with open(ruta, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['fila', 'motivo', 'datos'])
+        for n, motivo, datos in reporte.rechazos:
+            escritor.writerow([n, motivo, json.dumps(datos, ensure_ascii=False, default=str) if datos else ''])
+
+
+def main():
+    import mysql.connector
+    from conexion.conexion import DB_CONFIG
+    import versiones
+
+    parser = argparse.ArgumentParser(description='Importa productos desde CSV / NDJSON / JSON.')
+    parser.add_argument('archivo')
+    parser.add_argument('--formato', choices=FORMATOS, help='por defecto, según la extensión')
+    parser.add_argument('--lote', type=int, default=LOTE, help='filas por INSERT')
+    parser.add_argument('--por-transaccion', type=int, default=POR_TRANSACCION, help='filas por commit')
+    parser.add_argument('--rechazados', help='CSV donde escribir las filas rechazadas')
+    args = parser.parse_args()
+
+    formato = args.formato or formato_de(args.archivo)
+    if formato is None:
+        parser.error('No se reconoce el formato: usa --formato csv|ndjson|json')
+
+    def informar(leidas, segundos):
+        print(f'\r{leidas:10d} filas   {leidas / segundos:9.0f} filas/s', end='', flush=True)
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        with open(args.archivo, 'rb') as binario:
+            reporte = importar(conn, abrir_texto(binario), formato, args.lote, args.por_transaccion, informar)
+    finally:
+        conn.close()
+    if reporte.confirmadas:
+        versiones.tocar('productos')   # listados y autocompletar de la app en esta máquina
+    print()
+    for clave, valor in reporte.como_dict().items():
+        print(f'{clave:13} {valor}')
+    for n, motivo, _ in reporte.rechazos[:20]:
+        print(f'  fila {n}: {motivo}')
+    if args.rechazados and reporte.rechazos:
+        guardar_rechazos(reporte, args.rechazados)
+        print(f'Rechazos en {args.rechazados}')
+    if reporte.error:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,67 +1,188 @@
+import os
+
+from busqueda import IndiceOrdenado, IndiceTrigramas
+from catalogo_compartido import CatalogoCompartido, ProductoCache
+
+from modelos.model_producto import AjustesProducto
 from models import db, Producto
 
+# 1 = catálogo en memoria compartida entre workers; 0 = diccionario por proceso
+COMPARTIDO = os.environ.get('INVENTARIO_COMPARTIDO', '1') == '1'
+
+
 class Inventario:
     """
-    - Usa un diccionario {id_producto: Producto} para accesos O(1).
+    - Usa un diccionario {id_producto: ProductoCache} para accesos O(1).
     - Mantiene un set con nombres en minúsculas para validar duplicados rápidamente.
     - Devuelve listas ordenadas usando list/tuplas según convenga.
+    - Índice de trigramas sobre el nombre para buscar subcadenas sin recorrer todo el dict.
+    - Lista ordenada por nombre (bisect) mantenida en cada escritura: listar es un corte, no un sorted().
+    - Con `catalogo` (CatalogoCompartido) los datos viven en memoria compartida: antes de cada
+      operación se leen sólo los slots que otros workers escribieron (registro de cambios del segmento)
+      y se actualizan los índices de a un producto, sin recargar de la BD ni rehacerlos.
     """
-    def __init__(self, productos_dict=None):
-        self.productos = productos_dict or {}  # dict[int, Producto]
-        self.nombres = set(p.nombre.lower() for p in self.productos.values())
+    def __init__(self, productos_dict=None, catalogo=None):
+        self.catalogo = catalogo
+        self._posicion = None   # posición del registro de cambios del catálogo ya aplicada
+        self._slot_de = {}      # id_producto -> slot del catálogo compartido
+        self._id_en = {}        # slot -> id_producto
+        if catalogo is None:
+            self._reconstruir(ProductoCache(*p.to_tuple()) for p in (productos_dict or {}).values())
+        else:
+            self._cargar_compartido()
 
     @classmethod
-    def cargar_desde_bd(cls):
+    def cargar_desde_bd(cls, compartido=COMPARTIDO):
+        if compartido:
+            # sólo el primer worker lee la BD; el resto se une al segmento ya cargado
+            catalogo = CatalogoCompartido().abrir(lambda: [p.to_tuple() for p in Producto.query.all()],
+                                                  Producto.query.count)
+            return cls(catalogo=catalogo)
         productos = Producto.query.all()              # -> list[Producto]
         productos_dict = {p.id_producto: p for p in productos} # dict por id_producto
         return cls(productos_dict)
 
+    # --- estructuras locales ---
+    def _reconstruir(self, productos):
+        productos = {p.id_producto: p for p in productos}
+        indice = IndiceTrigramas()
+        for p in productos.values():
+            indice.agregar(p.id_producto, p.nombre)
+        self.productos = productos  # dict[int, ProductoCache]
+        self.nombres = set(p.nombre.lower() for p in productos.values())
+        self.indice = indice
+        self.orden = IndiceOrdenado((p.id_producto, p.nombre) for p in productos.values())
+
+    def _poner(self, p: ProductoCache):
+        """Alta o modificación en las estructuras locales, tocando sólo este producto."""
+        anterior = self.productos.get(p.id_producto)
+        if anterior is None:
+            self.indice.agregar(p.id_producto, p.nombre)
+            self.orden.agregar(p.id_producto, p.nombre)
+        elif anterior.nombre != p.nombre:
+            self.nombres.discard(anterior.nombre.lower())
+            self.indice.actualizar(p.id_producto, p.nombre)
+            self.orden.actualizar(p.id_producto, p.nombre)
+        self.nombres.add(p.nombre.lower())
+        self.productos[p.id_producto] = p
+
+    def _sacar(self, id_producto: int):
+        p = self.productos.pop(id_producto, None)
+        if p is not None:
+            self.nombres.discard(p.nombre.lower())
+            self.indice.quitar(id_producto)
+            self.orden.quitar(id_producto)
+
+    def _cargar_compartido(self):
+        self._posicion, registros = self.catalogo.registros()
+        self._id_en = {slot: p.id_producto for slot, p in registros}
+        self._slot_de = {id_: slot for slot, id_ in self._id_en.items()}
+        self._reconstruir(p for _, p in registros)
+
+    def _sincronizar(self):
+        """Aplica los productos que cambiaron en el catálogo compartido desde la última vez."""
+        if self.catalogo is None or self.catalogo.posicion == self._posicion:
+            return
+        cambios = self.catalogo.cambios(self._posicion)
+        if cambios is None:
+            # más cambios de los que guarda el registro (o el segmento se recargó): copia completa
+            self._cargar_compartido()
+            return
+        self._posicion, escritos = cambios
+        for slot, _ in escritos:
+            anterior = self._id_en.pop(slot, None)
+            if anterior is not None and self._slot_de.get(anterior) == slot:
+                del self._slot_de[anterior]
+                self._sacar(anterior)
+        for slot, p in escritos:
+            if p is not None:
+                self._slot_de[p.id_producto] = slot
+                self._id_en[slot] = p.id_producto
+                self._poner(p)
+
+    def _publicar(self, p: Producto):
+        # los demás workers lo ven en su próximo _sincronizar; este lo aplica también (es idempotente)
+        if self.catalogo is not None:
+            self.catalogo.guardar(p.id_producto, p.nombre, p.cantidad, p.precio)
+        self._poner(ProductoCache(*p.to_tuple()))
+
+    def _retirar(self, id_producto: int):
+        if self.catalogo is not None:
+            self.catalogo.quitar(id_producto)
+        self._sacar(id_producto)
+
     # --- CRUD ---
     def agregar(self, nombre: str, cantidad: int, precio: float) -> Producto:
+        self._sincronizar()
         if nombre.lower() in self.nombres:
             raise ValueError('Ya existe un producto con ese nombre.')
         p = Producto(nombre=nombre.strip(), cantidad=int(cantidad), precio=float(precio))
         db.session.add(p)
         db.session.commit()
-        self.productos[p.id_producto] = p
-        self.nombres.add(p.nombre.lower())
+        self._publicar(p)
         return p
 
     def eliminar(self, id_producto: int) -> bool:
-        p = self.productos.get(id_producto) or Producto.query.get(id_producto)
+        p = Producto.query.get(id_producto)
         if not p:
             return False
         db.session.delete(p)
         db.session.commit()
-        self.productos.pop(id_producto, None)
-        self.nombres.discard(p.nombre.lower())
+        self._retirar(id_producto)
         return True
 
     def actualizar(self, id_producto: int, nombre=None, cantidad=None, precio=None) -> Producto | None:
-        p = self.productos.get(id_producto) or Producto.query.get(id_producto)
+        self._sincronizar()
+        p = Producto.query.get(id_producto)
         if not p:
             return None
         if nombre is not None:
             nuevo = nombre.strip()
             if nuevo.lower() != p.nombre.lower() and nuevo.lower() in self.nombres:
                 raise ValueError('Ya existe otro producto con ese nombre.')
-            self.nombres.discard(p.nombre.lower())
             p.nombre = nuevo
-            self.nombres.add(p.nombre.lower())
         if cantidad is not None:
             p.cantidad = int(cantidad)
         if precio is not None:
             p.precio = float(precio)
         db.session.commit()
-        self.productos[p.id_producto] = p
+        self._publicar(p)
         return p
 
+    def ajustar_lote(self, ajustes, modo='sumar'):
+        """
+        Ajusta stock/precio de muchos productos en una transacción: [(id_producto, cantidad|None, precio|None)],
+        deltas con modo 'sumar' o valores nuevos con 'fijar'. El SQL (tabla temporal + UPDATE ... JOIN, validado
+        sobre las filas bloqueadas) es el de AjustesProducto, sobre la conexión de la sesión; después se
+        actualizan en bloque el cache y el catálogo compartido (un lock para todo el lote). El nombre no
+        cambia, así que los índices de nombres no se tocan. Sólo con MySQL.
+        """
+        if db.session.get_bind().dialect.name != 'mysql':
+            raise ValueError('Los ajustes masivos usan SQL de MySQL: configura SQLALCHEMY_DATABASE_URI con mysql.')
+        self._sincronizar()
+        try:
+            filas = AjustesProducto.ajustar_lote(db.session.connection().connection, ajustes, modo)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        nuevos = [ProductoCache(id_, nombre, int(cantidad), float(precio)) for id_, nombre, cantidad, precio in filas]
+        if self.catalogo is not None:
+            self.catalogo.guardar_lote(nuevos)
+        for p in nuevos:
+            self._poner(p)
+        return nuevos
+
     # --- Consultas con colecciones ---
     def buscar_por_nombre(self, q: str):
-        q = q.lower()
-        # list comprehension: filtra del dict de cache
-        return sorted([p for p in self.productos.values() if q in p.nombre.lower()],
-                      key=lambda x: x.nombre)
+        self._sincronizar()
+        # índice de trigramas: ya devuelve los ids ordenados por relevancia (prefijos primero)
+        return [self.productos[i] for i in self.indice.buscar(q)]
+
+    def buscar_por_prefijo(self, prefijo: str, limite=None):
+        self._sincronizar()
+        return [self.productos[i] for i in self.orden.prefijo(prefijo, limite)]
 
-    def listar_todos(self):
-        return sorted(self.productos.values(), key=lambda x: x.nombre)
+    def listar_todos(self, inicio=0, limite=None):
+        self._sincronizar()
+        return [self.productos[i] for i in self.orden.ids(inicio, limite)]
@@ -0,0 +1,264 @@
+"""
+Métricas por petición con salida en formato Prometheus (/metrics).
+Por endpoint y método se miden: tiempo total, tiempo en MySQL, número de consultas,
+tiempo renderizando plantillas y tamaño de la respuesta, en histogramas de buckets fijos.
+
+Varios workers de gunicorn: cada proceso acumula en memoria y vuelca su estado a
+METRICAS_DIR/proceso_<pid>_<azar>.json (como mucho cada METRICAS_INTERVALO segundos y al salir;
+el sufijo evita que un pid reutilizado pise el archivo de otro worker). /metrics suma esos archivos
+y terminados.json: el master de gunicorn (gunicorn.conf.py) pliega ahí los de cada worker que
+termina (child_exit), así los contadores no retroceden, y vacía el directorio al arrancar (on_starting).
+Se mide en teardown_request: las peticiones que lanzan una excepción también cuentan, con estado 500.
+Las respuestas en streaming (exportar) no tienen tamaño conocido y no se cuentan en ese histograma.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+from conexion import instrumentacion
+
+DIRECTORIO = os.environ.get('METRICAS_DIR', os.path.join(tempfile.gettempdir(), 'inventario_metricas'))
+INTERVALO = float(os.environ.get('METRICAS_INTERVALO', 5))
+IGNORAR = {'static', 'metrics'}
+
+SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# nombre -> (ayuda, buckets)
+HISTOGRAMAS = {
+    'http_request_duration_seconds': ('Tiempo total de la petición.', SEGUNDOS),
+    'http_request_db_seconds': ('Tiempo en consultas a MySQL por petición.', SEGUNDOS),
+    'http_request_db_queries': ('Consultas a MySQL por petición.', CONSULTAS),
+    'http_request_template_seconds': ('Tiempo renderizando plantillas por petición.', SEGUNDOS),
+    'http_response_size_bytes': ('Tamaño del cuerpo de la respuesta.', BYTES),
+}
+CONTADOR = 'http_requests_total'
+
+
+class Registro:
+    """
+    Histogramas de un proceso: {nombre: {"endpoint|metodo": [conteo por bucket..., +Inf, suma, cuenta]}}.
+    Los conteos no son acumulados; se acumulan al exponer.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histogramas = {nombre: {} for nombre in HISTOGRAMAS}
+        self.contador = {}   # "endpoint|metodo|estado" -> n
+
+    def observar(self, nombre, clave, valor):
+        buckets = HISTOGRAMAS[nombre][1]
+        with self._lock:
+            fila = self.histogramas[nombre].get(clave)
+            if fila is None:
+                fila = self.histogramas[nombre][clave] = [0] * (len(buckets) + 3)
+            fila[bisect_left(buckets, valor)] += 1
+            fila[-2] += valor
+            fila[-1] += 1
+
+    def contar(self, clave):
+        with self._lock:
+            self.contador[clave] = self.contador.get(clave, 0) + 1
+
+    def instantanea(self):
+        with self._lock:
+            return {'histogramas': {n: {k: list(v) for k, v in h.items()} for n, h in self.histogramas.items()},
+                    'contador': dict(self.contador)}
+
+
+registro = Registro()
+_ultimo_volcado = 0.0
+_volcado_lock = threading.Lock()
+_archivo = (None, None)   # (pid, nombre): se rehace tras un fork
+TERMINADOS = 'terminados.json'
+
+
+def _ruta_propia():
+    global _archivo
+    if _archivo[0] != os.getpid():
+        _archivo = (os.getpid(), f'proceso_{os.getpid()}_{os.urandom(4).hex()}.json')
+    return os.path.join(DIRECTORIO, _archivo[1])
+
+
+def _escribir(ruta, datos):
+    tmp = f'{ruta}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(datos, f)
+    os.replace(tmp, ruta)
+
+
+def _leer(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None   # archivo borrado o de otro formato
+
+
+def volcar():
+    """Escribe el estado de este proceso (reemplazo atómico del archivo)."""
+    global _ultimo_volcado
+    with _volcado_lock:
+        os.makedirs(DIRECTORIO, exist_ok=True)
+        _escribir(_ruta_propia(), registro.instantanea())
+        _ultimo_volcado = time.monotonic()
+
+
+def _volcar_si_toca(forzar=False):
+    if forzar or time.monotonic() - _ultimo_volcado >= INTERVALO:
+        try:
+            volcar()
+        except OSError:
+            pass
+
+
+def _sumar(total, datos):
+    for nombre, filas in datos.get('histogramas', {}).items():
+        destino = total['histogramas'].setdefault(nombre, {})
+        for clave, fila in filas.items():
+            if clave in destino:
+                destino[clave] = [a + b for a, b in zip(destino[clave], fila)]
+            else:
+                destino[clave] = list(fila)
+    for clave, n in datos.get('contador', {}).items():
+        total['contador'][clave] = total['contador'].get(clave, 0) + n
+
+
+def _vacio():
+    return {'histogramas': {n: {} for n in HISTOGRAMAS}, 'contador': {}}
+
+
+def combinar():
+    """Suma terminados.json y los archivos de los procesos vivos (incluido el actual, recién volcado)."""
+    volcar()
+    total = _vacio()
+    terminados = _leer(os.path.join(DIRECTORIO, TERMINADOS)) or {}
+    _sumar(total, terminados)
+    plegados = set(terminados.get('archivos', ()))   # ya sumados, a punto de borrarse
+    for ruta in glob.glob(os.path.join(DIRECTORIO, 'proceso_*.json')):
+        if os.path.basename(ruta) not in plegados:
+            datos = _leer(ruta)
+            if datos is not None:
+                _sumar(total, datos)
+    return total
+
+
+def plegar(pid):
+    """
+    Suma los archivos del proceso `pid` (ya terminado) a terminados.json y los borra. Sólo desde el
+    master de gunicorn (child_exit): un único escritor. terminados.json anota los archivos plegados
+    antes de borrarlos, así /metrics nunca los cuenta dos veces.
+    """
+    rutas = glob.glob(os.path.join(DIRECTORIO, f'proceso_{pid}_*.json'))
+    if not rutas:
+        return
+    ruta_total = os.path.join(DIRECTORIO, TERMINADOS)
+    total = _leer(ruta_total) or _vacio()
+    plegados = {a for a in total.get('archivos', ()) if os.path.exists(os.path.join(DIRECTORIO, a))}
+    for ruta in rutas:
+        datos = _leer(ruta)
+        if datos is not None and os.path.basename(ruta) not in plegados:
+            _sumar(total, datos)
+        plegados.add(os.path.basename(ruta))
+    total['archivos'] = sorted(plegados)
+    _escribir(ruta_total, total)
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def limpiar():
+    """Vacía METRICAS_DIR (al arrancar el master: los contadores empiezan de cero con cada despliegue)."""
+    for ruta in glob.glob(os.path.join(DIRECTORIO, '*.json')) + glob.glob(os.path.join(DIRECTORIO, '*.tmp')):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def _etiquetas(clave, nombres):
+    return ','.join(f'{n}="{v}"' for n, v in zip(nombres, clave.split('|')))
+
+
+def exponer():
+    """Texto en formato de exposición de Prometheus (0.0.4)."""
+    total = combinar()
+    lineas = [f'# HELP {CONTADOR} Peticiones atendidas.', f'# TYPE {CONTADOR} counter']
+    for clave, n in sorted(total['contador'].items()):
+        lineas.append(f'{CONTADOR}{{{_etiquetas(clave, ("endpoint", "method", "status"))}}} {n}')
+    for nombre, (ayuda, buckets) in HISTOGRAMAS.items():
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+        for clave, fila in sorted(total['histogramas'].get(nombre, {}).items()):
+            etiquetas = _etiquetas(clave, ('endpoint', 'method'))
+            acumulado = 0
+            for le, conteo in zip(list(buckets) + ['+Inf'], fila[:-2]):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{{{etiquetas},le="{le}"}} {acumulado}')
+            lineas.append(f'{nombre}_sum{{{etiquetas}}} {fila[-2]}')
+            lineas.append(f'{nombre}_count{{{etiquetas}}} {fila[-1]}')
+    return '\n'.join(lineas) + '\n'
+
+
+# --- enganches de Flask y de la conexión ---
+def _al_consultar(sql, params, segundos, filas):
+    if has_request_context() and 'metricas' in g:
+        g.metricas['db'] += segundos
+        g.metricas['consultas'] += 1
+
+
+def _antes_de_plantilla(sender, template, context, **extra):
+    if 'metricas' in g:
+        g.metricas['inicio_plantilla'] = time.perf_counter()
+
+
+def _plantilla_lista(sender, template, context, **extra):
+    if 'metricas' in g and g.metricas.get('inicio_plantilla') is not None:
+        g.metricas['plantilla'] += time.perf_counter() - g.metricas.pop('inicio_plantilla')
+
+
+def _antes():
+    if request.endpoint in IGNORAR:
+        return
+    g.metricas = {'inicio': time.perf_counter(), 'db': 0.0, 'consultas': 0, 'plantilla': 0.0}
+
+
+def _despues(response):
+    # sólo anota la respuesta; se registra en _al_terminar, que corre también si la petición lanzó
+    if 'metricas' in g:
+        g.metricas['estado'] = response.status_code
+        g.metricas['bytes'] = None if response.is_streamed else response.calculate_content_length() or 0
+    return response
+
+
+def _al_terminar(error):
+    m = g.pop('metricas', None)
+    if m is None:
+        return
+    clave = f'{request.endpoint or "sin_ruta"}|{request.method}'
+    registro.observar('http_request_duration_seconds', clave, time.perf_counter() - m['inicio'])
+    registro.observar('http_request_db_seconds', clave, m['db'])
+    registro.observar('http_request_db_queries', clave, m['consultas'])
+    registro.observar('http_request_template_seconds', clave, m['plantilla'])
+    if error is None and m.get('bytes') is not None:
+        registro.observar('http_response_size_bytes', clave, m['bytes'])
+    registro.contar(f'{clave}|{500 if error is not None else m.get("estado", 500)}')
+    _volcar_si_toca()
+
+
+def init_app(app):
+    app.before_request(_antes)
+    app.after_request(_despues)
+    app.teardown_request(_al_terminar)
+    before_render_template.connect(_antes_de_plantilla, app)
+    template_rendered.connect(_plantilla_lista, app)
+    instrumentacion.agregar_oyente(_al_consultar)
+    atexit.register(_volcar_si_toca, forzar=True)
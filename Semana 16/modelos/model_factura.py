@@ -0,0 +1,204 @@
+# modelos/model_factura.py
+import random
+import time
+
+from mysql.connector import Error
+
+from modelos.model_idempotencia import ClavesIdempotencia
+from modelos.model_ventas import Ventas
+
+IVA = 0.12
+REINTENTOS = 5
+ESPERA_BASE = 0.01     # segundos; el tope de la espera se duplica en cada reintento
+ESPERA_MAX = 0.5
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+
+# contadores del proceso (se muestran en /estadisticas)
+reintentos = {'deadlock': 0, 'espera': 0, 'agotados': 0}
+
+
+class StockInsuficiente(ValueError):
+    def __init__(self, faltantes):
+        # faltantes: [(id_producto, nombre, disponible, pedido)]
+        self.faltantes = faltantes
+        super().__init__('Stock insuficiente: ' + ', '.join(
+            f'{nombre} (disponible {disponible}, pedido {pedido})' for _, nombre, disponible, pedido in faltantes))
+
+
+class Factura:
+    """
+    Creación de facturas con operaciones por conjuntos: el número de consultas
+    no depende de la cantidad de líneas.
+      1. SELECT ... FOR UPDATE de stock y precios con IN (...), en orden de id_producto
+      2. UPDATE condicional de stock con CASE (cantidad >= pedido)
+      3. INSERT de la cabecera
+      4. INSERT multi-fila del detalle
+      5. resúmenes diarios de ventas (Ventas.sumar_factura, con lo calculado en memoria)
+    registrar() agrega el commit y los reintentos ante deadlocks; crear_una_vez() y registrar_una_vez(),
+    una clave de idempotencia. Para registrar muchas en una transacción, ver cola_facturas.py.
+    """
+
+    @staticmethod
+    def agrupar_lineas(productos, cantidades):
+        """Convierte las listas del formulario en {id_producto: cantidad} (suma productos repetidos)."""
+        lineas = {}
+        for pid, cant in zip(productos, cantidades):
+            pid, cant = int(pid), int(cant)
+            if cant <= 0:
+                raise ValueError('Las cantidades deben ser mayores a cero.')
+            lineas[pid] = lineas.get(pid, 0) + cant
+        if not lineas:
+            raise ValueError('La factura no tiene productos.')
+        return lineas
+
+    @staticmethod
+    def crear(conn, id_cliente, lineas, estado='PAGADA'):
+        """
+        Inserta la factura dentro de la transacción de `conn` (no hace commit).
+        `lineas` es {id_producto: cantidad}. Devuelve el id_factura.
+        Lanza StockInsuficiente (con el stock previo al descuento) si algún producto no alcanza, antes de
+        escribir nada; quien llama hace rollback, como con cualquier otro error.
+        """
+        ids = sorted(lineas)
+        marcas = ', '.join(['%s'] * len(ids))
+        cur = conn.cursor()
+        try:
+            # 1) bloquea las filas de productos en orden de id (el mismo en todas las transacciones,
+            #    sin ciclos de espera) y lee stock y precio antes de tocarlos
+            cur.execute(f"SELECT id_producto, nombre, cantidad, precio FROM productos "
+                        f"WHERE id_producto IN ({marcas}) ORDER BY id_producto FOR UPDATE", ids)
+            filas = {pid: (nombre, cantidad, float(precio)) for pid, nombre, cantidad, precio in cur.fetchall()}
+            Factura._validar_stock(ids, filas, lineas)
+            precios = {pid: precio for pid, (_, _, precio) in filas.items()}
+
+            # 2) descuento condicional: con las filas bloqueadas siempre alcanza; el cantidad >= pedido
+            #    es la garantía atómica contra la sobreventa si alguien cambia el stock fuera de este camino
+            casos = ' '.join(['WHEN %s THEN %s'] * len(ids))
+            pares = [v for pid in ids for v in (pid, lineas[pid])]
+            cur.execute(f"UPDATE productos SET cantidad = cantidad - CASE id_producto {casos} END "
+                        f"WHERE id_producto IN ({marcas}) AND cantidad >= CASE id_producto {casos} END",
+                        pares + ids + pares)
+            if cur.rowcount != len(ids):
+                raise ValueError('El stock cambió mientras se registraba la factura; intente de nuevo.')
+
+            detalle = []
+            subtotal = 0
+            for pid in ids:
+                st = round(precios[pid] * lineas[pid], 2)
+                subtotal += st
+                detalle.append((pid, lineas[pid], precios[pid], st))
+            subtotal = round(subtotal, 2)
+            iva = round(subtotal * IVA, 2)
+            total = round(subtotal + iva, 2)
+
+            # 3) cabecera; la fecha se pide al servidor (su zona horaria) para saber el día del resumen
+            cur.execute("SELECT NOW()")
+            fecha = cur.fetchone()[0]
+            cur.execute("INSERT INTO facturas (id_cliente, fecha, subtotal, iva, total, estado) "
+                        "VALUES (%s,%s,%s,%s,%s,%s)", (id_cliente, fecha, subtotal, iva, total, estado))
+            id_factura = cur.lastrowid
+
+            # 4) detalle: un solo INSERT con todas las filas
+            filas = ', '.join(['(%s,%s,%s,%s,%s)'] * len(detalle))
+            params = [v for pid, cant, precio, st in detalle for v in (id_factura, pid, cant, precio, st)]
+            cur.execute("INSERT INTO factura_detalle (id_factura, id_producto, cantidad, precio_unitario, subtotal) "
+                        f"VALUES {filas}", params)
+
+            # 5) resúmenes de ventas, en la misma transacción y sin releer facturas/detalle
+            if estado != 'ANULADA':
+                Ventas.sumar_factura(cur, fecha.date(), id_cliente, detalle, subtotal, iva, total)
+            return id_factura
+        finally:
+            cur.close()
+
+    @staticmethod
+    def _validar_stock(ids, filas, lineas):
+        """filas: {id_producto: (nombre, cantidad, precio)} leídas antes del descuento."""
+        faltantes = [pid for pid in ids if pid not in filas]
+        if faltantes:
+            raise ValueError(f'Producto(s) inexistente(s): {faltantes}')
+        cortos = [(pid, nombre, cantidad, lineas[pid]) for pid, (nombre, cantidad, _) in filas.items()
+                  if cantidad < lineas[pid]]
+        if cortos:
+            raise StockInsuficiente(cortos)
+
+    @staticmethod
+    def registrar(conn, id_cliente, lineas, estado='PAGADA', intentos=REINTENTOS):
+        """
+        crear + commit, reintentando si MySQL elige esta transacción como víctima de un deadlock (1213)
+        o se agota la espera de un lock (1205): rollback y espera aleatoria creciente (full jitter).
+        Devuelve el id_factura; StockInsuficiente y demás errores no se reintentan.
+        """
+        return Factura.con_reintentos(conn, lambda: Factura.crear(conn, id_cliente, lineas, estado), intentos)
+
+    @staticmethod
+    def crear_una_vez(conn, id_usuario, clave, id_cliente, lineas, estado='PAGADA'):
+        """
+        crear() con clave de idempotencia, dentro de la transacción de `conn` (no hace commit).
+        Devuelve (id_factura, repetida); lanza ClaveReutilizada si cambiaron los datos.
+        """
+        huella = ClavesIdempotencia.huella(id_cliente, lineas, estado)
+        cur = conn.cursor()
+        try:
+            anterior = ClavesIdempotencia.reservar(cur, id_usuario, clave, huella)
+            if anterior is not None:
+                return anterior, True
+            id_factura = Factura.crear(conn, id_cliente, lineas, estado)
+            ClavesIdempotencia.asociar(cur, id_usuario, clave, id_factura)
+            return id_factura, False
+        finally:
+            cur.close()
+
+    @staticmethod
+    def registrar_una_vez(conn, id_usuario, clave, id_cliente, lineas, estado='PAGADA', intentos=REINTENTOS):
+        """
+        registrar() con clave de idempotencia: la clave se guarda en la misma transacción que la factura.
+        Un doble clic o un reintento con la misma clave devuelve el id_factura original sin descontar
+        stock de nuevo. Devuelve (id_factura, repetida); lanza ClaveReutilizada si cambiaron los datos.
+        """
+        return Factura.con_reintentos(
+            conn, lambda: Factura.crear_una_vez(conn, id_usuario, clave, id_cliente, lineas, estado), intentos)
+
+    @staticmethod
+    def con_reintentos(conn, operacion, intentos=REINTENTOS):
+        """operacion() + commit con los reintentos de registrar(); devuelve lo que devuelva operacion()."""
+        for intento in range(intentos):
+            try:
+                resultado = operacion()
+                conn.commit()
+                return resultado
+            except Error as e:
+                conn.rollback()
+                if e.errno not in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT):
+                    raise
+                clave = 'deadlock' if e.errno == ER_LOCK_DEADLOCK else 'espera'
+                reintentos[clave] += 1
+                if intento == intentos - 1:
+                    reintentos['agotados'] += 1
+                    raise
+                time.sleep(random.uniform(0, min(ESPERA_MAX, ESPERA_BASE * 2 ** intento)))
+
+    @staticmethod
+    def eliminar(conn, id_factura):
+        """Resta la factura de los resúmenes y la borra con su detalle (no hace commit). True si existía."""
+        cur = conn.cursor()
+        try:
+            # sólo las filas de esta factura (por PK / id_factura), la cabecera con lock: dos
+            # eliminaciones simultáneas de la misma factura no restan dos veces
+            cur.execute("SELECT DATE(fecha), id_cliente, subtotal, iva, total, estado FROM facturas "
+                        "WHERE id_factura = %s FOR UPDATE", (id_factura,))
+            cabecera = cur.fetchone()
+            if cabecera is None:
+                return False
+            dia, id_cliente, subtotal, iva, total, estado = cabecera
+            cur.execute("SELECT id_producto, cantidad, precio_unitario, subtotal FROM factura_detalle "
+                        "WHERE id_factura = %s", (id_factura,))
+            detalle = cur.fetchall()
+            if estado != 'ANULADA':
+                Ventas.sumar_factura(cur, dia, id_cliente, detalle, subtotal, iva, total, signo=-1)
+            cur.execute("DELETE FROM factura_detalle WHERE id_factura = %s", (id_factura,))
+            cur.execute("DELETE FROM facturas WHERE id_factura = %s", (id_factura,))
+            return cur.rowcount > 0
+        finally:
+            cur.close()
@@ -0,0 +1,101 @@
+# modelos/model_idempotencia.py
+import hashlib
+import itertools
+import json
+import os
+import re
+
+from mysql.connector import Error
+
+HORAS = int(os.environ.get('IDEMPOTENCIA_HORAS', 24))   # vigencia de una clave
+LIMPIAR_CADA = 1000     # registros por proceso entre limpiezas de claves vencidas
+LIMITE_LIMPIEZA = 5000  # filas por DELETE (no bloquear la tabla mucho tiempo)
+ER_DUP_ENTRY = 1062
+_FORMATO = re.compile(r'[!-~]{1,64}')   # ASCII visible, sin espacios (UUID, token_urlsafe, ...)
+
+_usos = itertools.count(1)
+
+
+class ClaveReutilizada(ValueError):
+    """La clave ya se usó (y sigue vigente) con otro cliente u otras líneas."""
+
+
+class ClavesIdempotencia:
+    """
+    Tabla claves_idempotencia (basedatos/migraciones/004_claves_idempotencia.sql).
+    reservar() y asociar() van dentro de la transacción que crea la factura (sin commit aquí):
+    si la factura no se confirma, la clave tampoco queda y se puede volver a intentar.
+    Dos envíos simultáneos con la misma clave: el segundo INSERT espera el lock de la fila del
+    primero y, cuando éste confirma, falla por clave duplicada y lee su id_factura.
+    """
+
+    @staticmethod
+    def validar(clave):
+        clave = (clave or '').strip()
+        if not _FORMATO.fullmatch(clave):
+            raise ValueError('Clave de idempotencia inválida (1 a 64 caracteres ASCII, sin espacios).')
+        return clave
+
+    @staticmethod
+    def huella(id_cliente, lineas, estado):
+        datos = json.dumps([int(id_cliente), sorted(lineas.items()), estado], separators=(',', ':'))
+        return hashlib.sha256(datos.encode()).hexdigest()
+
+    @staticmethod
+    def reservar(cur, id_usuario, clave, huella):
+        """
+        None si la clave es nueva (o estaba vencida) y queda reservada hasta el commit;
+        el id_factura original si ya se usó con los mismos datos. Lanza ClaveReutilizada.
+        """
+        try:
+            cur.execute("INSERT INTO claves_idempotencia (id_usuario, clave, huella) VALUES (%s, %s, %s)",
+                        (id_usuario, clave, huella))
+            return None
+        except Error as e:
+            if e.errno != ER_DUP_ENTRY:
+                raise
+        # lectura con lock: ve la fila confirmada por la otra petición aunque la transacción ya tenga snapshot
+        cur.execute("""
+            SELECT huella, id_factura, creada < NOW() - INTERVAL %s HOUR
+            FROM claves_idempotencia WHERE id_usuario = %s AND clave = %s
+            FOR UPDATE
+        """, (HORAS, id_usuario, clave))
+        fila = cur.fetchone()
+        if fila is None:
+            # la borró una limpieza entre el INSERT y el SELECT
+            return ClavesIdempotencia.reservar(cur, id_usuario, clave, huella)
+        huella_anterior, id_factura, vencida = fila
+        if vencida:
+            cur.execute("""
+                UPDATE claves_idempotencia SET huella = %s, id_factura = NULL, creada = NOW()
+                WHERE id_usuario = %s AND clave = %s
+            """, (huella, id_usuario, clave))
+            return None
+        if huella_anterior != huella:
+            raise ClaveReutilizada('La clave de idempotencia ya se usó con otros datos.')
+        return id_factura
+
+    @staticmethod
+    def asociar(cur, id_usuario, clave, id_factura):
+        cur.execute("UPDATE claves_idempotencia SET id_factura = %s WHERE id_usuario = %s AND clave = %s",
+                    (id_factura, id_usuario, clave))
+
+    @staticmethod
+    def limpiar(conn, horas=HORAS, limite=LIMITE_LIMPIEZA):
+        """Borra (y confirma) hasta `limite` claves vencidas; devuelve cuántas."""
+        cur = conn.cursor()
+        try:
+            cur.execute("DELETE FROM claves_idempotencia WHERE creada < NOW() - INTERVAL %s HOUR LIMIT %s",
+                        (horas, limite))
+            borradas = cur.rowcount
+            conn.commit()
+            return borradas
+        finally:
+            cur.close()
+
+    @staticmethod
+    def limpiar_si_toca(conn):
+        """Llamar después de cada registro: una de cada LIMPIAR_CADA veces limpia las vencidas."""
+        if next(_usos) % LIMPIAR_CADA == 0:
+            return ClavesIdempotencia.limpiar(conn)
+        return 0
@@ -1,9 +1,78 @@
 # models/model_login.py
-from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import seguridad
+import versiones
 from flask_login import UserMixin
 from conexion.conexion import conexion, cerrar_conexion
 from mysql.connector import Error
 
+
+class CacheUsuarios:
+    """
+    Cache LRU con TTL para user_loader: evita un SELECT a `usuarios` en cada petición autenticada.
+    - OrderedDict {id_usuario: (expira_en, Usuario)}; el más reciente al final.
+    - Tamaño acotado: al llenarse descarta el menos usado.
+    - `version()` es un contador compartido entre procesos (versiones.actual('usuarios')) que sube con
+      cada escritura en `usuarios`: si cambió desde la última búsqueda, se vacía la cache entera
+      (las escrituras son raras). El TTL queda como respaldo para cambios hechos a mano en la BD.
+    """
+    def __init__(self, max_items=1000, ttl=300, version=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.version = version
+        self._vista = None
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, id_usuario):
+        ahora = time.monotonic()
+        vista = self.version() if self.version is not None else None
+        with self._lock:
+            if vista != self._vista:
+                self._datos.clear()
+                self._vista = vista
+            item = self._datos.get(id_usuario)
+            if item is None or item[0] < ahora:
+                if item is not None:
+                    del self._datos[id_usuario]
+                self.misses += 1
+                return None
+            self._datos.move_to_end(id_usuario)
+            self.hits += 1
+            return item[1]
+
+    def guardar(self, usuario):
+        with self._lock:
+            self._datos[usuario.id_usuario] = (time.monotonic() + self.ttl, usuario)
+            self._datos.move_to_end(usuario.id_usuario)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, id_usuario=None):
+        with self._lock:
+            if id_usuario is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(id_usuario, None)
+
+    def estadisticas(self):
+        with self._lock:
+            return {'items': len(self._datos), 'max_items': self.max_items, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+cache_usuarios = CacheUsuarios(
+    max_items=int(os.environ.get('USER_CACHE_SIZE', 1000)),
+    ttl=int(os.environ.get('USER_CACHE_TTL', 300)),
+    version=lambda: versiones.actual('usuarios'),
+)
+
 class Usuario(UserMixin):
     def __init__(self, id, nombre, email, password):
         # Flask-Login usa .id (string)
@@ -16,10 +85,32 @@ class Usuario(UserMixin):
         return str(self.id_usuario)
 
     def verificar_password(self, password_plano: str) -> bool:
-        return check_password_hash(self.password_hash, password_plano)
+        return seguridad.verificar(self.password_hash, password_plano)
 
     @staticmethod
     def obtener_por_id(id_usuario: int):
+        return Usuario.cargar_por_id(id_usuario, usar_cache=False)
+
+    @staticmethod
+    def cargar_por_id(id_usuario: int, usar_cache: bool = True):
+        """Para user_loader: primero la cache en memoria, luego la BD."""
+        if usar_cache:
+            user = cache_usuarios.obtener(id_usuario)
+            if user is not None:
+                return user
+        user = Usuario._select_por_id(id_usuario)
+        if user is not None:
+            cache_usuarios.guardar(user)
+        return user
+
+    @staticmethod
+    def invalidar_cache(id_usuario: int = None):
+        """Llamar después del commit de cualquier escritura en `usuarios` (avisa también a los demás procesos)."""
+        cache_usuarios.invalidar(id_usuario)
+        versiones.tocar('usuarios')
+
+    @staticmethod
+    def _select_por_id(id_usuario: int):
         conn = conexion()
         cur = conn.cursor(dictionary=True)
         try:
@@ -52,34 +143,52 @@ class Usuario(UserMixin):
             try: cur.close()
             finally: cerrar_conexion(conn)
 
+    @staticmethod
+    def actualizar_password(id_usuario: int, password_hash: str) -> bool:
+        """Guarda un hash ya calculado (re-hash al iniciar sesión o cambio de clave)."""
+        conn = conexion()
+        cur = conn.cursor()
+        try:
+            cur.execute("UPDATE usuarios SET password = %s WHERE id_usuario = %s", (password_hash, id_usuario))
+            conn.commit()
+            Usuario.invalidar_cache(id_usuario)
+            return True
+        except Error as e:
+            print(f"Error al actualizar password: {e}")
+            return False
+        finally:
+            try: cur.close()
+            finally: cerrar_conexion(conn)
+
     @staticmethod
     def crear_usuario(email: str, password_plano: str, nombre: str):
-        """Crea usuario usando PBKDF2-SHA256 (600k)."""
+        """Crea usuario usando PBKDF2 (seguridad.METODO). Puede lanzar seguridad.HashSaturado."""
+        # el hash primero: la conexión del pool no queda ociosa mientras corre el PBKDF2
+        password_hash = seguridad.generar_hash(password_plano)
         conn = conexion()
         cur = conn.cursor()
+        cur2 = None
         try:
-            password_hash = generate_password_hash(
-                password_plano,
-                method='pbkdf2:sha256:600000',
-                salt_length=16
-            )
             cur.execute(
                 "INSERT INTO usuarios (nombre, email, password) VALUES (%s, %s, %s)",
                 (nombre, email, password_hash)
             )
             conn.commit()
             # devolver instancia
-            cur.close()
             cur2 = conn.cursor(dictionary=True)
             cur2.execute("SELECT id_usuario, nombre, email, password FROM usuarios WHERE email=%s", (email,))
             row = cur2.fetchone()
-            return Usuario(row['id_usuario'], row['nombre'], row['email'], row['password']) if row else None
+            if not row:
+                return None
+            Usuario.invalidar_cache(row['id_usuario'])
+            return Usuario(row['id_usuario'], row['nombre'], row['email'], row['password'])
         except Error as e:
             print(f"Error al crear usuario: {e}")
             return None
         finally:
             try:
-                cur2.close()
-            except Exception:
-                pass
-            cerrar_conexion(conn)
+                cur.close()
+                if cur2 is not None:
+                    cur2.close()
+            finally:
+                cerrar_conexion(conn)
@@ -0,0 +1,125 @@
+# modelos/model_producto.py
+import math
+
+MODOS = ('sumar', 'fijar')
+LOTE = 5000   # filas por INSERT en la tabla temporal
+
+
+class AjustesProducto:
+    """
+    Ajustes masivos de stock y precio con SQL por conjuntos:
+      1. los ajustes se cargan en una tabla TEMPORARY (INSERT multi-fila por lotes);
+      2. SELECT ... JOIN ... FOR UPDATE bloquea los productos y valida (inexistentes, negativos);
+      3. un solo UPDATE productos JOIN tabla temporal aplica todo.
+    Dentro de la transacción de `conn` (no hace commit aquí): o se aplican todos o ninguno.
+    """
+
+    @staticmethod
+    def validar_ajustes(items):
+        """
+        [{id_producto, cantidad?, precio?}] -> [(id_producto, cantidad|None, precio|None)].
+        Con modo 'sumar' cantidad/precio son deltas; con 'fijar', valores nuevos. Lanza ValueError.
+        """
+        ajustes, errores = [], []
+        for n, item in enumerate(items, start=1):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError('se esperaba un objeto')
+                id_producto = int(item['id_producto'])
+                cantidad = item.get('cantidad')
+                precio = item.get('precio')
+                cantidad = None if cantidad in (None, '') else int(cantidad)
+                precio = None if precio in (None, '') else round(float(precio), 2)
+                if precio is not None and not math.isfinite(precio):
+                    raise ValueError('precio inválido')
+                if cantidad is None and precio is None:
+                    raise ValueError('sin cantidad ni precio')
+                ajustes.append((id_producto, cantidad, precio))
+            except (KeyError, TypeError, ValueError) as e:
+                errores.append(f'ajuste {n}: {e}')
+        if errores:
+            raise ValueError('; '.join(errores[:20]) + (f' (y {len(errores) - 20} más)' if len(errores) > 20 else ''))
+        return ajustes
+
+    @staticmethod
+    def ajustar_lote(conn, ajustes, modo='sumar'):
+        """
+        Aplica [(id_producto, cantidad|None, precio|None)] y devuelve las filas resultantes
+        [(id_producto, nombre, cantidad, precio)] para actualizar caches. Ids repetidos se suman ('sumar')
+        o gana el último ('fijar').
+        """
+        if modo not in MODOS:
+            raise ValueError(f'Modo inválido: {modo}')
+        if not ajustes:
+            return []
+        cur = conn.cursor()
+        try:
+            # las conexiones del pool se reutilizan: la tabla temporal puede quedar de un uso anterior
+            cur.execute("DROP TEMPORARY TABLE IF EXISTS ajustes_productos")
+            cur.execute("""
+                CREATE TEMPORARY TABLE ajustes_productos (
+                    id_producto INT PRIMARY KEY,
+                    cantidad INT NULL,
+                    precio DOUBLE NULL
+                )
+            """)
+            if modo == 'sumar':
+                repetidos = """cantidad = IF(nuevo.cantidad IS NULL, ajustes_productos.cantidad,
+                                              COALESCE(ajustes_productos.cantidad, 0) + nuevo.cantidad),
+                               precio = IF(nuevo.precio IS NULL, ajustes_productos.precio,
+                                           COALESCE(ajustes_productos.precio, 0) + nuevo.precio)"""
+            else:
+                repetidos = """cantidad = COALESCE(nuevo.cantidad, ajustes_productos.cantidad),
+                               precio = COALESCE(nuevo.precio, ajustes_productos.precio)"""
+            for i in range(0, len(ajustes), LOTE):
+                lote = ajustes[i:i + LOTE]
+                valores = ', '.join(['(%s, %s, %s)'] * len(lote))
+                cur.execute(f"""
+                    INSERT INTO ajustes_productos (id_producto, cantidad, precio) VALUES {valores} AS nuevo
+                    ON DUPLICATE KEY UPDATE {repetidos}
+                """, [v for ajuste in lote for v in ajuste])
+
+            if modo == 'sumar':
+                nueva_cantidad = "p.cantidad + COALESCE(a.cantidad, 0)"
+                nuevo_precio = "ROUND(p.precio + COALESCE(a.precio, 0), 2)"
+            else:
+                nueva_cantidad = "COALESCE(a.cantidad, p.cantidad)"
+                nuevo_precio = "ROUND(COALESCE(a.precio, p.precio), 2)"
+
+            cur.execute("""
+                SELECT a.id_producto FROM ajustes_productos a
+                LEFT JOIN productos p ON p.id_producto = a.id_producto
+                WHERE p.id_producto IS NULL
+                ORDER BY a.id_producto LIMIT 20
+            """)
+            faltantes = [f[0] for f in cur.fetchall()]
+            if faltantes:
+                raise ValueError(f'Producto(s) inexistente(s): {faltantes}')
+
+            # bloquea las filas a modificar (en orden de id) y valida con los valores vigentes
+            cur.execute(f"""
+                SELECT p.id_producto, {nueva_cantidad}, {nuevo_precio}
+                FROM productos p
+                JOIN ajustes_productos a ON a.id_producto = p.id_producto
+                ORDER BY p.id_producto
+                FOR UPDATE OF p
+            """)
+            negativos = [f'#{id_} (cantidad {c}, precio {pr})' for id_, c, pr in cur.fetchall() if c < 0 or pr < 0]
+            if negativos:
+                raise ValueError('Quedarían valores negativos: ' + ', '.join(negativos[:20]))
+
+            cur.execute(f"""
+                UPDATE productos p
+                JOIN ajustes_productos a ON a.id_producto = p.id_producto
+                SET p.cantidad = {nueva_cantidad}, p.precio = {nuevo_precio}
+            """)
+            cur.execute("""
+                SELECT p.id_producto, p.nombre, p.cantidad, p.precio
+                FROM productos p
+                JOIN ajustes_productos a ON a.id_producto = p.id_producto
+            """)
+            filas = cur.fetchall()
+            cur.execute("DROP TEMPORARY TABLE ajustes_productos")
+            return filas
+        finally:
+            cur.close()
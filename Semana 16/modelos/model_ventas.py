@@ -0,0 +1,220 @@
+# modelos/model_ventas.py
+from datetime import date, timedelta
+
+
+class Ventas:
+    """
+    Resúmenes diarios de ventas (basedatos/migraciones/003_resumen_ventas.sql):
+      ventas_diarias_producto (dia, id_producto): unidades, ingresos, iva, facturas
+      ventas_diarias_cliente  (dia, id_cliente):  facturas, unidades, subtotal, iva, total
+    Se mantienen dentro de la transacción que crea/elimina facturas (sin commit aquí):
+    - sumar_factura: la factura ya está calculada en memoria; INSERT ... VALUES ... ON DUPLICATE KEY
+      UPDATE sin leer facturas ni factura_detalle. Un INSERT ... SELECT tomaría locks compartidos
+      (next-key) sobre las tablas de hechos y los checkouts concurrentes se bloquearían entre sí.
+    - acumular: INSERT ... SELECT ... ON DUPLICATE KEY UPDATE por tabla, suma (signo=1) o resta
+      (signo=-1) las facturas que cumplen una condición. Para reconstruir por rangos (fuera de las peticiones).
+    - quitar_cliente: el mismo upsert por filas que sumar_factura, con las facturas del cliente leídas sin locks.
+    El IVA por producto es la parte proporcional del IVA de su factura.
+    Las filas que quedan en cero al eliminar se limpian en la siguiente reconstrucción.
+    """
+
+    @staticmethod
+    def _por_producto(detalle, subtotal, iva):
+        """{id_producto: (unidades, ingresos, iva)} de una factura: `detalle` es [(id_producto, cantidad, precio, subtotal)]."""
+        por_producto = {}
+        for pid, cantidad, _, st in detalle:
+            unidades, ingresos = por_producto.get(pid, (0, 0))
+            por_producto[pid] = (unidades + cantidad, ingresos + float(st))
+        subtotal, iva = float(subtotal), float(iva)
+        return {pid: (unidades, round(ingresos, 2), round(ingresos * iva / subtotal, 2) if subtotal else 0)
+                for pid, (unidades, ingresos) in por_producto.items()}
+
+    @staticmethod
+    def _sumar_productos(cur, filas, lote=500):
+        """Upsert de filas (dia, id_producto, unidades, ingresos, iva, facturas), ya ordenadas por clave."""
+        for i in range(0, len(filas), lote):
+            tramo = filas[i:i + lote]
+            valores = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(tramo))
+            cur.execute(f"""
+                INSERT INTO ventas_diarias_producto (dia, id_producto, unidades, ingresos, iva, facturas)
+                VALUES {valores} AS nuevo
+                ON DUPLICATE KEY UPDATE
+                    unidades = ventas_diarias_producto.unidades + nuevo.unidades,
+                    ingresos = ventas_diarias_producto.ingresos + nuevo.ingresos,
+                    iva = ventas_diarias_producto.iva + nuevo.iva,
+                    facturas = ventas_diarias_producto.facturas + nuevo.facturas
+            """, [v for fila in tramo for v in fila])
+
+    @staticmethod
+    def sumar_factura(cur, dia, id_cliente, detalle, subtotal, iva, total, signo=1):
+        """
+        Suma (signo=1) o resta (signo=-1) una factura: `detalle` es [(id_producto, cantidad, precio, subtotal)].
+        Las filas por producto se escriben en orden de id_producto, el mismo orden en que Factura.crear
+        bloquea los productos.
+        """
+        por_producto = Ventas._por_producto(detalle, subtotal, iva)
+        subtotal, iva, total = float(subtotal), float(iva), float(total)
+        Ventas._sumar_productos(cur, [(dia, pid, signo * unidades, signo * ingresos, signo * iva_producto, signo)
+                                      for pid, (unidades, ingresos, iva_producto) in sorted(por_producto.items())])
+
+        unidades = sum(u for u, _, _ in por_producto.values())
+        cur.execute("""
+            INSERT INTO ventas_diarias_cliente (dia, id_cliente, facturas, unidades, subtotal, iva, total)
+            VALUES (%s, %s, %s, %s, %s, %s, %s) AS nuevo
+            ON DUPLICATE KEY UPDATE
+                facturas = ventas_diarias_cliente.facturas + nuevo.facturas,
+                unidades = ventas_diarias_cliente.unidades + nuevo.unidades,
+                subtotal = ventas_diarias_cliente.subtotal + nuevo.subtotal,
+                iva = ventas_diarias_cliente.iva + nuevo.iva,
+                total = ventas_diarias_cliente.total + nuevo.total
+        """, (dia, id_cliente, signo, signo * unidades, signo * subtotal, signo * iva, signo * total))
+
+    @staticmethod
+    def acumular(cur, condicion, params, signo=1):
+        """`condicion` filtra facturas con alias `f` (p. ej. "f.id_factura = %s")."""
+        cur.execute(f"""
+            INSERT INTO ventas_diarias_producto (dia, id_producto, unidades, ingresos, iva, facturas)
+            SELECT * FROM (
+                SELECT DATE(f.fecha) AS n_dia, d.id_producto AS n_producto,
+                       %s * SUM(d.cantidad) AS n_unidades,
+                       %s * SUM(d.subtotal) AS n_ingresos,
+                       %s * COALESCE(SUM(ROUND(d.subtotal * f.iva / NULLIF(f.subtotal, 0), 2)), 0) AS n_iva,
+                       %s * COUNT(DISTINCT d.id_factura) AS n_facturas
+                FROM facturas f
+                JOIN factura_detalle d ON d.id_factura = f.id_factura
+                WHERE {condicion} AND f.estado <> 'ANULADA'
+                GROUP BY DATE(f.fecha), d.id_producto
+            ) AS nuevo
+            ON DUPLICATE KEY UPDATE
+                unidades = unidades + n_unidades,
+                ingresos = ingresos + n_ingresos,
+                iva = iva + n_iva,
+                facturas = facturas + n_facturas
+        """, [signo] * 4 + list(params))
+
+        cur.execute(f"""
+            INSERT INTO ventas_diarias_cliente (dia, id_cliente, facturas, unidades, subtotal, iva, total)
+            SELECT * FROM (
+                SELECT DATE(f.fecha) AS n_dia, f.id_cliente AS n_cliente,
+                       %s * COUNT(*) AS n_facturas,
+                       %s * COALESCE(SUM((SELECT SUM(d.cantidad) FROM factura_detalle d
+                                          WHERE d.id_factura = f.id_factura)), 0) AS n_unidades,
+                       %s * SUM(f.subtotal) AS n_subtotal,
+                       %s * SUM(f.iva) AS n_iva,
+                       %s * SUM(f.total) AS n_total
+                FROM facturas f
+                WHERE {condicion} AND f.estado <> 'ANULADA'
+                GROUP BY DATE(f.fecha), f.id_cliente
+            ) AS nuevo
+            ON DUPLICATE KEY UPDATE
+                facturas = facturas + n_facturas,
+                unidades = unidades + n_unidades,
+                subtotal = subtotal + n_subtotal,
+                iva = iva + n_iva,
+                total = total + n_total
+        """, [signo] * 5 + list(params))
+
+    @staticmethod
+    def quitar_cliente(cur, id_cliente):
+        """
+        Antes de borrar un cliente (ON DELETE CASCADE se lleva sus facturas sin pasar por aquí).
+        Se bloquea sólo la fila del cliente (una factura nueva suya espera por la FK) y sus facturas se
+        leen con SELECT simples, sin locks sobre facturas/factura_detalle; se restan con el mismo upsert
+        por filas que sumar_factura, acumuladas por (día, producto). False si el cliente no existe.
+        """
+        cur.execute("SELECT id_cliente FROM clientes WHERE id_cliente = %s FOR UPDATE", (id_cliente,))
+        if cur.fetchone() is None:
+            return False
+        cur.execute("""
+            SELECT id_factura, DATE(fecha), subtotal, iva FROM facturas
+            WHERE id_cliente = %s AND estado <> 'ANULADA'
+        """, (id_cliente,))
+        facturas = {id_: (dia, subtotal, iva) for id_, dia, subtotal, iva in cur.fetchall()}
+        if facturas:
+            cur.execute("""
+                SELECT d.id_factura, d.id_producto, d.cantidad, d.precio_unitario, d.subtotal
+                FROM factura_detalle d
+                JOIN facturas f ON f.id_factura = d.id_factura
+                WHERE f.id_cliente = %s AND f.estado <> 'ANULADA'
+            """, (id_cliente,))
+            detalles = {}
+            for id_factura, *linea in cur.fetchall():
+                detalles.setdefault(id_factura, []).append(linea)
+            acumulado = {}
+            for id_factura, (dia, subtotal, iva) in facturas.items():
+                for pid, fila in Ventas._por_producto(detalles.get(id_factura, ()), subtotal, iva).items():
+                    unidades, ingresos, iva_producto, n = acumulado.get((dia, pid), (0, 0, 0, 0))
+                    acumulado[(dia, pid)] = (unidades + fila[0], ingresos + fila[1], iva_producto + fila[2], n + 1)
+            Ventas._sumar_productos(cur, [(dia, pid, -u, -round(i, 2), -round(v, 2), -n)
+                                          for (dia, pid), (u, i, v, n) in sorted(acumulado.items())])
+        cur.execute("DELETE FROM ventas_diarias_cliente WHERE id_cliente = %s", (id_cliente,))
+        return True
+
+    @staticmethod
+    def reconstruir(conn, desde=None, hasta=None, dias_por_tramo=31, informar=print):
+        """
+        Recalcula los resúmenes de [desde, hasta] (fechas inclusive; por defecto todo) por tramos:
+        borra y vuelve a sumar cada tramo en su propia transacción para no bloquear por mucho tiempo.
+        """
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT DATE(MIN(fecha)), DATE(MAX(fecha)) FROM facturas")
+            minimo, maximo = cur.fetchone()
+            if minimo is None:
+                return 0
+            desde = max(desde or minimo, minimo)
+            hasta = min(hasta or maximo, maximo)
+            tramos = 0
+            inicio = desde
+            while inicio <= hasta:
+                fin = min(inicio + timedelta(days=dias_por_tramo), hasta + timedelta(days=1))
+                for tabla in ('ventas_diarias_producto', 'ventas_diarias_cliente'):
+                    cur.execute(f"DELETE FROM {tabla} WHERE dia >= %s AND dia < %s", (inicio, fin))
+                # idx_fecha (fecha, id_factura) acota el recorrido al tramo
+                Ventas.acumular(cur, "f.fecha >= %s AND f.fecha < %s", (inicio, fin))
+                conn.commit()
+                tramos += 1
+                informar(f'{inicio} .. {fin - timedelta(days=1)} listo')
+                inicio = fin
+            return tramos
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    # --- lecturas para reportes: O(días), no O(líneas de detalle) ---
+    @staticmethod
+    def por_dia(cur, desde: date, hasta: date):
+        cur.execute("""
+            SELECT dia, SUM(facturas) AS facturas, SUM(unidades) AS unidades,
+                   SUM(subtotal) AS subtotal, SUM(iva) AS iva, SUM(total) AS total
+            FROM ventas_diarias_cliente
+            WHERE dia BETWEEN %s AND %s
+            GROUP BY dia ORDER BY dia
+        """, (desde, hasta))
+        return cur.fetchall()
+
+    @staticmethod
+    def top_productos(cur, desde: date, hasta: date, limite=10):
+        cur.execute("""
+            SELECT v.id_producto, p.nombre, SUM(v.unidades) AS unidades, SUM(v.ingresos) AS ingresos
+            FROM ventas_diarias_producto v
+            JOIN productos p ON p.id_producto = v.id_producto
+            WHERE v.dia BETWEEN %s AND %s
+            GROUP BY v.id_producto, p.nombre
+            ORDER BY ingresos DESC LIMIT %s
+        """, (desde, hasta, int(limite)))
+        return cur.fetchall()
+
+    @staticmethod
+    def top_clientes(cur, desde: date, hasta: date, limite=10):
+        cur.execute("""
+            SELECT v.id_cliente, c.nombre, c.apellido, SUM(v.facturas) AS facturas, SUM(v.total) AS total
+            FROM ventas_diarias_cliente v
+            JOIN clientes c ON c.id_cliente = v.id_cliente
+            WHERE v.dia BETWEEN %s AND %s
+            GROUP BY v.id_cliente, c.nombre, c.apellido
+            ORDER BY total DESC LIMIT %s
+        """, (desde, hasta, int(limite)))
+        return cur.fetchall()
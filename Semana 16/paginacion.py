@@ -0,0 +1,139 @@
+"""
+Paginación por cursor (keyset) para los listados.
+En vez de OFFSET, cada página pide las filas posteriores (o anteriores) a la última
+clave vista, así la consulta usa el índice del orden y cuesta lo mismo en la página 1 que en la 1000.
+
+`orden` describe la clave de ordenamiento como lista de tuplas
+(expresion_sql, 'ASC'|'DESC', campo_en_la_fila, params_de_la_expresion).
+La combinación de columnas debe ser única (por eso se termina con el id).
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+POR_PAGINA = 25
+MAX_POR_PAGINA = 100
+
+Pagina = namedtuple('Pagina', 'items siguiente anterior por_pagina')
+
+
+def tamano_pagina(args, defecto=POR_PAGINA):
+    try:
+        n = int(args.get('por_pagina', defecto))
+    except (TypeError, ValueError):
+        n = defecto
+    return max(1, min(n, MAX_POR_PAGINA))
+
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _de_json(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+    return valor
+
+
+def codificar_cursor(valores) -> str:
+    crudo = json.dumps([_a_json(v) for v in valores], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve la lista de valores o None si el cursor no es válido (se vuelve a la primera página)."""
+    if not token:
+        return None
+    try:
+        crudo = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        valores = json.loads(crudo)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list):
+        return None
+    return [_de_json(v) for v in valores]
+
+
+def _condicion(orden, cursor, atras):
+    """(a op x) OR (a = x AND b op y) OR ... respetando la dirección de cada columna."""
+    partes, params = [], []
+    for i, (expr, direccion, _, expr_params) in enumerate(orden):
+        sube = (direccion == 'ASC') != atras
+        igualdades = []
+        for j in range(i):
+            igualdades.append(f"{orden[j][0]} = %s")
+            params.extend(orden[j][3])
+            params.append(cursor[j])
+        igualdades.append(f"{expr} {'>' if sube else '<'} %s")
+        params.extend(expr_params)
+        params.append(cursor[i])
+        partes.append('(' + ' AND '.join(igualdades) + ')')
+    return '(' + ' OR '.join(partes) + ')', params
+
+
+def consulta_keyset(select_from, where, params, orden, cursor=None, atras=False, limite=POR_PAGINA):
+    """Arma SELECT ... WHERE ... ORDER BY ... LIMIT limite+1 (la fila extra indica si hay más)."""
+    condiciones = [where] if where else []
+    params = list(params)
+    if cursor is not None:
+        cond, cond_params = _condicion(orden, cursor, atras)
+        condiciones.append(cond)
+        params.extend(cond_params)
+    sql = select_from
+    if condiciones:
+        sql += ' WHERE ' + ' AND '.join(condiciones)
+    columnas = []
+    for expr, direccion, _, expr_params in orden:
+        if atras:
+            direccion = 'DESC' if direccion == 'ASC' else 'ASC'
+        columnas.append(f"{expr} {direccion}")
+        params.extend(expr_params)
+    sql += ' ORDER BY ' + ', '.join(columnas) + ' LIMIT %s'
+    params.append(limite + 1)
+    return sql, params
+
+
+def paginar(cur, select_from, where, params, orden, args):
+    """
+    Ejecuta la consulta de una página según ?despues= / ?antes= / ?por_pagina= y devuelve Pagina.
+    `cur` debe ser un cursor dictionary=True.
+    """
+    limite = tamano_pagina(args)
+    antes = decodificar_cursor(args.get('antes'))
+    despues = decodificar_cursor(args.get('despues'))
+    if antes is not None and len(antes) != len(orden):
+        antes = None
+    if despues is not None and len(despues) != len(orden):
+        despues = None
+    atras = antes is not None
+    cursor = antes if atras else despues
+
+    sql, sql_params = consulta_keyset(select_from, where, params, orden, cursor, atras, limite)
+    cur.execute(sql, sql_params)
+    filas = cur.fetchall()
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    if atras:
+        filas.reverse()
+
+    def clave(fila):
+        return codificar_cursor([fila[campo] for _, _, campo, _ in orden])
+
+    siguiente = anterior = None
+    if filas:
+        if (hay_mas and not atras) or (atras and cursor is not None):
+            siguiente = clave(filas[-1])
+        if (hay_mas and atras) or (not atras and cursor is not None):
+            anterior = clave(filas[0])
+    return Pagina(filas, siguiente, anterior, limite)
@@ -0,0 +1,33 @@
+"""
+Llena o recalcula las tablas de resumen de ventas (ventas_diarias_producto / ventas_diarias_cliente)
+desde facturas y factura_detalle. Necesario tras aplicar 003_resumen_ventas.sql o una carga masiva.
+
+    python reconstruir_resumen.py                                  # todo el historial
+    python reconstruir_resumen.py --desde 2025-01-01 --hasta 2025-03-31
+"""
+import argparse
+import time
+from datetime import date
+
+from conexion.conexion import conexion, cerrar_conexion
+from modelos.model_ventas import Ventas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstruye los resúmenes diarios de ventas.')
+    parser.add_argument('--desde', type=date.fromisoformat, default=None, help='AAAA-MM-DD')
+    parser.add_argument('--hasta', type=date.fromisoformat, default=None, help='AAAA-MM-DD (inclusive)')
+    parser.add_argument('--dias-por-tramo', type=int, default=31, help='días por transacción')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    conn = conexion()
+    try:
+        tramos = Ventas.reconstruir(conn, args.desde, args.hasta, args.dias_por_tramo)
+    finally:
+        cerrar_conexion(conn)
+    print(f'{tramos} tramo(s) reconstruidos en {time.perf_counter() - t0:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
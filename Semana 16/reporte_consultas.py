@@ -0,0 +1,89 @@
+"""
+Ranking de consultas por huella a partir de lo que registran los workers (conexion/consultas_lentas.py).
+
+    python reporte_consultas.py                     # top 20 por tiempo total
+    python reporte_consultas.py --top 50 --orden promedio
+    python reporte_consultas.py --plan              # agrega el último EXPLAIN de cada huella
+    python reporte_consultas.py --dir /ruta/a/CONSULTAS_DIR
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+
+DIRECTORIO = os.environ.get('CONSULTAS_DIR', os.path.join(tempfile.gettempdir(), 'inventario_consultas'))
+ORDENES = {
+    'total': lambda d: d['total'],
+    'promedio': lambda d: d['total'] / d['n'],
+    'max': lambda d: d['max'],
+    'n': lambda d: d['n'],
+    'lentas': lambda d: d['lentas'],
+}
+
+
+def cargar_huellas(directorio):
+    """Suma los huellas_<pid>.json de todos los procesos."""
+    total = {}
+    for ruta in glob.glob(os.path.join(directorio, 'huellas_*.json')):
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for id_, (sql, n, segundos, maximo, filas, lentas) in datos.items():
+            d = total.setdefault(id_, {'sql': sql, 'n': 0, 'total': 0.0, 'max': 0.0, 'filas': 0, 'lentas': 0})
+            d['n'] += n
+            d['total'] += segundos
+            d['max'] = max(d['max'], maximo)
+            d['filas'] += filas
+            d['lentas'] += lentas
+    return total
+
+
+def ultimos_planes(directorio):
+    """{huella: plan} con el EXPLAIN más reciente de los logs de consultas lentas."""
+    planes = {}
+    for ruta in sorted(glob.glob(os.path.join(directorio, 'lentas_*.log*')), key=os.path.getmtime):
+        with open(ruta, encoding='utf-8', errors='replace') as f:
+            for linea in f:
+                try:
+                    r = json.loads(linea)
+                except ValueError:
+                    continue
+                if r.get('tipo') == 'explain' and 'plan' in r:
+                    planes[r['huella']] = r['plan']
+    return planes
+
+
+def _plan_corto(plan):
+    return '; '.join(f"{p.get('table')}: type={p.get('type')} key={p.get('key')} rows={p.get('rows')}"
+                     + (f" ({p['Extra']})" if p.get('Extra') else '') for p in plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Consultas ordenadas por costo.')
+    parser.add_argument('--dir', default=DIRECTORIO)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--orden', choices=ORDENES, default='total')
+    parser.add_argument('--plan', action='store_true', help='mostrar el último EXPLAIN capturado')
+    args = parser.parse_args()
+
+    huellas = cargar_huellas(args.dir)
+    if not huellas:
+        print(f'No hay datos en {args.dir}')
+        return
+    planes = ultimos_planes(args.dir) if args.plan else {}
+    tiempo_total = sum(d['total'] for d in huellas.values()) or 1
+
+    print(f"{'huella':16}  {'total s':>9}  {'%':>5}  {'n':>8}  {'prom ms':>8}  {'max ms':>8}  {'lentas':>6}  sql")
+    ranking = sorted(huellas.items(), key=lambda kv: ORDENES[args.orden](kv[1]), reverse=True)
+    for id_, d in ranking[:args.top]:
+        print(f"{id_:16}  {d['total']:9.3f}  {100 * d['total'] / tiempo_total:5.1f}  {d['n']:8d}  "
+              f"{1000 * d['total'] / d['n']:8.2f}  {1000 * d['max']:8.2f}  {d['lentas']:6d}  {d['sql'][:120]}")
+        if id_ in planes:
+            print(f"{'':18}EXPLAIN: {_plan_corto(planes[id_])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 # reset_password.py
 from conexion.conexion import conexion, cerrar_conexion
+from modelos.model_login import Usuario
+from seguridad import METODO, LARGO_SAL
 from werkzeug.security import generate_password_hash
 
 UID = 8
@@ -8,16 +10,18 @@ NUEVA_CLAVE = "12345"  # <-- cámbiala a la que quieras
 def main():
     nuevo_hash = generate_password_hash(
         NUEVA_CLAVE,
-        method='pbkdf2:sha256:600000',
-        salt_length=16
+        method=METODO,
+        salt_length=LARGO_SAL
     )
     print("Nuevo hash:", nuevo_hash)
 
     conn = conexion()
     cur = conn.cursor()
     try:
-        cur.execute("UPDATE usuarios SET password=%s WHERE id=%s", (nuevo_hash, UID))
+        cur.execute("UPDATE usuarios SET password=%s WHERE id_usuario=%s", (nuevo_hash, UID))
         conn.commit()
+        # cache de user_loader: sube el contador 'usuarios' de versiones.py y los workers la vacían en la próxima petición
+        Usuario.invalidar_cache(UID)
         print(f"Contraseña actualizada para id={UID}")
     finally:
         cur.close()
@@ -0,0 +1,124 @@
+"""
+Hash de contraseñas (PBKDF2) fuera del worker web.
+- generate/check_password_hash corren en un pool de procesos acotado (HASH_WORKERS).
+- Hay un tope de tareas en curso + en cola (HASH_MAX_QUEUE): si se llena se rechaza
+  al instante con HashSaturado (la vista responde 503) en vez de bloquear al worker.
+  saturado() permite rechazar antes de pedir una conexión del pool de BD.
+- Se mide la latencia de cada llamada (cola + cálculo).
+- METODO es el costo configurado; necesita_rehash() detecta hashes guardados con otro costo
+  para re-hashearlos en el próximo login.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METODO = os.environ.get('PASSWORD_METHOD', 'pbkdf2:sha256:600000')
+LARGO_SAL = 16
+PROCESOS = int(os.environ.get('HASH_WORKERS', 2))
+MAX_COLA = int(os.environ.get('HASH_MAX_QUEUE', 8))
+ESPERA = float(os.environ.get('HASH_TIMEOUT', 5))   # segundos máximos esperando un resultado
+
+
+class HashSaturado(RuntimeError):
+    """El pool de hashing está lleno o no respondió a tiempo."""
+
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+_cupos = threading.BoundedSemaphore(MAX_COLA)
+_latencias = deque(maxlen=1000)   # segundos de las últimas llamadas
+_stats = {'llamadas': 0, 'rechazadas': 0, 'vencidas': 0, 'en_curso': 0}
+
+
+def _pool():
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                # spawn: no se hace fork de un worker con hilos
+                _executor = ProcessPoolExecutor(max_workers=PROCESOS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _descartar_pool():
+    global _executor
+    with _lock:
+        viejo, _executor = _executor, None
+    if viejo is not None:
+        viejo.shutdown(wait=False, cancel_futures=True)
+
+
+def _liberar(_futuro):
+    with _lock:
+        _stats['en_curso'] -= 1
+    _cupos.release()
+
+
+def saturado():
+    """True si no queda cupo: la vista puede responder 503 antes de tocar la BD (orientativo, sin reservar)."""
+    with _lock:
+        return _stats['en_curso'] >= MAX_COLA
+
+
+def _ejecutar(fn, *args):
+    if not _cupos.acquire(blocking=False):
+        with _lock:
+            _stats['rechazadas'] += 1
+        raise HashSaturado('Demasiadas solicitudes de autenticación en curso.')
+    with _lock:
+        _stats['llamadas'] += 1
+        _stats['en_curso'] += 1
+    t0 = time.perf_counter()
+    try:
+        futuro = _pool().submit(fn, *args)
+    except Exception:
+        _liberar(None)
+        raise
+    futuro.add_done_callback(_liberar)   # el cupo se devuelve cuando el proceso termina, no antes
+    try:
+        return futuro.result(timeout=ESPERA)
+    except BrokenProcessPool:
+        _descartar_pool()   # un proceso murió: la próxima llamada crea un pool nuevo
+        raise
+    except TimeoutError:
+        with _lock:
+            _stats['vencidas'] += 1
+        raise HashSaturado('El cálculo del hash no terminó a tiempo.')
+    finally:
+        _latencias.append(time.perf_counter() - t0)
+
+
+def generar_hash(password_plano: str) -> str:
+    return _ejecutar(generate_password_hash, password_plano, METODO, LARGO_SAL)
+
+
+def verificar(password_hash: str, password_plano: str) -> bool:
+    return _ejecutar(check_password_hash, password_hash, password_plano)
+
+
+def necesita_rehash(password_hash: str) -> bool:
+    """True si el hash se generó con un método/costo distinto al configurado."""
+    return password_hash.split('$', 1)[0] != METODO
+
+
+def estadisticas():
+    with _lock:
+        datos = dict(_stats)
+        lat = sorted(_latencias)
+    datos.update({'procesos': PROCESOS, 'max_cola': MAX_COLA, 'metodo': METODO})
+    if lat:
+        datos.update({
+            'latencia_ms_p50': round(lat[len(lat) // 2] * 1000, 1),
+            'latencia_ms_p95': round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 1),
+            'latencia_ms_max': round(lat[-1] * 1000, 1),
+        })
+    return datos
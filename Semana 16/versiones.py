@@ -0,0 +1,190 @@
+"""
+Versiones de tablas compartidas entre workers, para GET condicional (ETag / Last-Modified).
+- Un archivo pequeño mapeado en memoria (VERSIONES_ARCHIVO) guarda, por tabla, un contador y la
+  hora del último cambio. Las rutas que escriben llaman tocar('productos', ...) DESPUÉS del commit.
+- La época (aleatoria, se fija al crear el archivo) entra en el ETag: si el archivo se borra
+  (reinicio de la máquina) los contadores vuelven a 0 pero los ETag viejos ya no coinciden.
+- @condicional('productos', ...) calcula el ETag sin tocar MySQL ni Jinja y responde 304 si el
+  navegador ya tiene esa versión. Las páginas son personales (usuario, token CSRF): se marcan
+  `Cache-Control: private, no-cache` y `Vary: Cookie` para que ningún proxy las comparta.
+Los cambios hechos fuera de la aplicación (scripts, consola SQL) no mueven las versiones por sí
+solos: los scripts del repo llaman tocar(); a mano, `python -c "import versiones; versiones.tocar_todo()"`.
+El contador de 'usuarios' no se usa para ETag: lo revisa la cache de user_loader (modelos/model_login.py)
+en cada búsqueda, para que un cambio hecho en otro proceso (otro worker, reset.py) se vea enseguida.
+"""
+import glob
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:   # Windows: sin bloqueo entre procesos (desarrollo con un solo proceso)
+    fcntl = None
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+TABLAS = ('productos', 'clientes', 'facturas', 'usuarios')
+ARCHIVO = os.environ.get('VERSIONES_ARCHIVO', os.path.join(tempfile.gettempdir(), 'inventario_versiones.bin'))
+# la página guardada en el navegador trae un token CSRF (válido 1 h por defecto en Flask-WTF):
+# el ETag cambia cada FRANJA segundos para no revalidar páginas con tokens vencidos
+FRANJA = int(os.environ.get('VERSIONES_FRANJA', 1800))
+
+_MARCA = b'VERSION1'
+_CABECERA = struct.Struct('<8sQ')     # marca, época
+_RANURA = struct.Struct('<QQ')        # versión, último cambio (ns desde 1970)
+_TAMANO = _CABECERA.size + _RANURA.size * len(TABLAS)
+
+
+class Versiones:
+    def __init__(self, ruta=ARCHIVO):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._mapa = None
+
+    def _abrir(self):
+        # por proceso: flock se comparte entre padre e hijo si el descriptor viene de un fork
+        if self._pid != os.getpid():
+            fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                self._bloquear(fd)
+                if os.fstat(fd).st_size < _TAMANO:
+                    os.ftruncate(fd, _TAMANO)
+                mapa = mmap.mmap(fd, _TAMANO)
+                if mapa[:len(_MARCA)] != _MARCA:
+                    mapa[:] = bytes(_TAMANO)
+                    _CABECERA.pack_into(mapa, 0, _MARCA, int.from_bytes(os.urandom(8), 'little'))
+                self._desbloquear(fd)
+            except Exception:
+                os.close(fd)
+                raise
+            self._fd, self._mapa, self._pid = fd, mapa, os.getpid()
+        return self._mapa
+
+    @staticmethod
+    def _bloquear(fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+
+    @staticmethod
+    def _desbloquear(fd):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def tocar(self, *tablas):
+        ahora = time.time_ns()
+        with self._lock:
+            mapa = self._abrir()
+            self._bloquear(self._fd)
+            try:
+                for tabla in tablas:
+                    pos = _CABECERA.size + _RANURA.size * TABLAS.index(tabla)
+                    version, _ = _RANURA.unpack_from(mapa, pos)
+                    _RANURA.pack_into(mapa, pos, version + 1, ahora)
+            finally:
+                self._desbloquear(self._fd)
+
+    def actual(self, tabla):
+        """Versión de una tabla sin flock (lectura alineada de 8 bytes): para consultarla en cada petición."""
+        with self._lock:
+            mapa = self._abrir()
+        return _RANURA.unpack_from(mapa, _CABECERA.size + _RANURA.size * TABLAS.index(tabla))[0]
+
+    def leer(self, *tablas):
+        """(época, [versión por tabla], último cambio en ns de cualquiera de ellas)."""
+        with self._lock:
+            mapa = self._abrir()
+            self._bloquear(self._fd)
+            try:
+                _, epoca = _CABECERA.unpack_from(mapa, 0)
+                ranuras = [_RANURA.unpack_from(mapa, _CABECERA.size + _RANURA.size * TABLAS.index(t))
+                           for t in tablas]
+            finally:
+                self._desbloquear(self._fd)
+        return epoca, [v for v, _ in ranuras], max((c for _, c in ranuras), default=0)
+
+
+_versiones = Versiones()
+
+
+def tocar(*tablas):
+    _versiones.tocar(*tablas)
+
+
+def tocar_todo():
+    _versiones.tocar(*TABLAS)
+
+
+def actual(tabla):
+    return _versiones.actual(tabla)
+
+
+def version(*tablas):
+    """Valor comparable que cambia cuando cambia cualquiera de las tablas."""
+    epoca, numeros, _ = _versiones.leer(*tablas)
+    return (epoca, *numeros)
+
+
+_codigo = {}
+
+
+def _version_codigo(app):
+    # una plantilla o vista nueva cambia el HTML sin cambiar los datos; mismo valor en todos los workers
+    if app.name not in _codigo:
+        archivos = glob.glob(os.path.join(app.root_path, '*.py'))
+        archivos += glob.glob(os.path.join(app.root_path, app.template_folder or 'templates', '**', '*.html'),
+                              recursive=True)
+        _codigo[app.name] = int(max((os.path.getmtime(a) for a in archivos), default=0))
+    return _codigo[app.name]
+
+
+def condicional(*tablas):
+    """
+    Decorador para vistas GET de sólo lectura que dependen únicamente de `tablas` y del usuario.
+    Va debajo de @login_required. Si hay mensajes flash pendientes se sirve la página sin validadores.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return vista(*args, **kwargs)
+
+            epoca, numeros, cambio_ns = _versiones.leer(*tablas)
+            ahora = time.time()
+            franja = int(ahora) // FRANJA
+            usuario = current_user.get_id() if current_user.is_authenticated else '-'
+            clave = f'{epoca}:{numeros}:{usuario}:{franja}:{_version_codigo(current_app)}'
+            etag = hashlib.sha1(clave.encode()).hexdigest()[:20]
+            modificado = max(cambio_ns // 10**9, franja * FRANJA)
+            ultima = datetime.fromtimestamp(modificado, timezone.utc)
+
+            if request.if_none_match:
+                vigente = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since:
+                # con resolución de segundos sólo es seguro si ese segundo ya pasó
+                vigente = modificado < int(ahora) and request.if_modified_since >= ultima
+            else:
+                vigente = False
+
+            if vigente:
+                resp = current_app.response_class(status=304)
+            else:
+                resp = make_response(vista(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag, weak=True)
+            resp.last_modified = ultima
+            resp.headers['Cache-Control'] = 'private, no-cache'
+            resp.vary.add('Cookie')
+            return resp
+        return envoltura
+    return decorador